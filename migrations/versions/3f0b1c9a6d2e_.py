@@ -0,0 +1,36 @@
+"""add ride_request table
+
+Revision ID: 3f0b1c9a6d2e
+Revises: 8d765457e23b
+Create Date: 2026-10-18 15:20:41.503127
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f0b1c9a6d2e'
+down_revision = '8d765457e23b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('ride_request',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('num_passengers', sa.Integer(), nullable=False),
+    sa.Column('start_latitude', sa.Float(), nullable=False),
+    sa.Column('start_longitude', sa.Float(), nullable=False),
+    sa.Column('end_latitude', sa.Float(), nullable=False),
+    sa.Column('end_longitude', sa.Float(), nullable=False),
+    sa.Column('on_campus', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('ride_id', sa.Integer(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('ride_request')
@@ -0,0 +1,29 @@
+"""add ride queue indexes
+
+Revision ID: 5e59693c7f12
+Revises: c6f3b55f1532
+Create Date: 2026-10-18 10:12:41.503117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e59693c7f12'
+down_revision = 'c6f3b55f1532'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # ride queue filtered by location, ordered/paged by id
+    op.create_index('ix_ride_on_campus_id', 'ride', ['on_campus', 'id'], unique=False)
+    # rides owned by a user, optionally within a pickup time window
+    op.create_index('ix_ride_user_id_pickup_time', 'ride', ['user_id', 'pickup_time'], unique=False)
+    # rides within a pickup time window
+    op.create_index('ix_ride_pickup_time', 'ride', ['pickup_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ride_pickup_time', table_name='ride')
+    op.drop_index('ix_ride_user_id_pickup_time', table_name='ride')
+    op.drop_index('ix_ride_on_campus_id', table_name='ride')
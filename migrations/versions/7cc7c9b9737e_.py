@@ -0,0 +1,35 @@
+"""add vehicle table and ride vehicle_id
+
+Revision ID: 7cc7c9b9737e
+Revises: 5e59693c7f12
+Create Date: 2026-10-18 12:41:55.730194
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7cc7c9b9737e'
+down_revision = '5e59693c7f12'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('vehicle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.add_column('ride', sa.Column('vehicle_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_ride_vehicle_id', 'ride', 'vehicle', ['vehicle_id'], ['id'])
+    # last ride in each vehicle's queue
+    op.create_index('ix_ride_vehicle_id_id', 'ride', ['vehicle_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ride_vehicle_id_id', table_name='ride')
+    op.drop_constraint('fk_ride_vehicle_id', 'ride', type_='foreignkey')
+    op.drop_column('ride', 'vehicle_id')
+    op.drop_table('vehicle')
@@ -0,0 +1,26 @@
+"""index vehicle queues by pickup time
+
+Revision ID: 8d765457e23b
+Revises: 7cc7c9b9737e
+Create Date: 2026-10-18 13:27:09.118520
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8d765457e23b'
+down_revision = '7cc7c9b9737e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # queues are ordered by pickup time since rides can be inserted
+    # in the middle of a queue, so look up queue tails by pickup time
+    op.create_index('ix_ride_vehicle_id_pickup_time', 'ride', ['vehicle_id', 'pickup_time'], unique=False)
+    op.drop_index('ix_ride_vehicle_id_id', table_name='ride')
+
+
+def downgrade():
+    op.create_index('ix_ride_vehicle_id_id', 'ride', ['vehicle_id', 'id'], unique=False)
+    op.drop_index('ix_ride_vehicle_id_pickup_time', table_name='ride')
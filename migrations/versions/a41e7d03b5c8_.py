@@ -0,0 +1,22 @@
+"""add ride leg_time
+
+Revision ID: a41e7d03b5c8
+Revises: 3f0b1c9a6d2e
+Create Date: 2026-10-18 16:02:55.671342
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a41e7d03b5c8'
+down_revision = '3f0b1c9a6d2e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('ride', sa.Column('leg_time', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('ride', 'leg_time')
@@ -0,0 +1,22 @@
+"""add ride eta_estimated
+
+Revision ID: b7d2e5a9c431
+Revises: e2c94b7f8a10
+Create Date: 2026-10-18 18:24:37.118905
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e5a9c431'
+down_revision = 'e2c94b7f8a10'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('ride', sa.Column('eta_estimated', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('ride', 'eta_estimated')
@@ -0,0 +1,29 @@
+"""add ride_event table
+
+Revision ID: c6f3b55f1532
+Revises: 42d0257c0704
+Create Date: 2026-10-18 09:58:06.412735
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c6f3b55f1532'
+down_revision = '42d0257c0704'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('ride_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event', sa.String(length=32), nullable=False),
+    sa.Column('ride_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('ride_event')
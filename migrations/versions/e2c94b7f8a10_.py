@@ -0,0 +1,34 @@
+"""add distance matrix leg cache tables
+
+Revision ID: e2c94b7f8a10
+Revises: a41e7d03b5c8
+Create Date: 2026-10-18 17:11:08.402215
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e2c94b7f8a10'
+down_revision = 'a41e7d03b5c8'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('distance_matrix_leg',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('duration', sa.Integer(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_table('distance_matrix_address',
+    sa.Column('key', sa.String(length=32), nullable=False),
+    sa.Column('address', sa.String(length=255), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('distance_matrix_address')
+    op.drop_table('distance_matrix_leg')
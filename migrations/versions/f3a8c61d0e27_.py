@@ -0,0 +1,22 @@
+"""add ride eta_refine_attempts
+
+Revision ID: f3a8c61d0e27
+Revises: b7d2e5a9c431
+Create Date: 2026-10-18 21:07:52.604318
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c61d0e27'
+down_revision = 'b7d2e5a9c431'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('ride', sa.Column('eta_refine_attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('ride', 'eta_refine_attempts')
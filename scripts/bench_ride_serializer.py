@@ -0,0 +1,80 @@
+import sys, os, argparse, timeit
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear import app
+from steerclear.models import Ride
+from steerclear.api.views import ride_fields
+from steerclear.api.serializers import serialize_ride_row, serialize_rides
+from flask_restful import marshal
+from datetime import datetime, timedelta
+
+"""
+make_rides
+----------
+Returns :n: transient Ride objects and the equivalent
+list of column tuples a core select would return
+"""
+def make_rides(n):
+    rides = []
+    rows = []
+    start = datetime(2015, 6, 13, 1, 2, 3)
+    for i in xrange(n):
+        pickup_time = start + timedelta(0, i * 60)
+        values = (
+            i + 1, 3, 37.2735, -76.7196, 37.2809, -76.7197,
+            pickup_time, 239, pickup_time + timedelta(0, 239),
+            u'2006 Brooks Street, Williamsburg, VA 23185, USA',
+            u'1234 Richmond Road, Williamsburg, VA 23185, USA',
+            i % 2 == 0, i % 10 == 0
+        )
+        rows.append(values)
+        rides.append(Ride(
+            id=values[0], num_passengers=values[1],
+            start_latitude=values[2], start_longitude=values[3],
+            end_latitude=values[4], end_longitude=values[5],
+            pickup_time=values[6], travel_time=values[7], dropoff_time=values[8],
+            pickup_address=values[9], dropoff_address=values[10], on_campus=values[11],
+            eta_estimated=values[12]
+        ))
+    return rides, rows
+
+"""
+report
+------
+Times :func: and prints the best total and per row time
+"""
+def report(name, func, n, repeat):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print '%-28s %8.1f ms total %8.2f us/row' % (name, best * 1000, best * 1e6 / n)
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark ride list serialization')
+    parser.add_argument('-n', dest='n', type=int, default=10000, help='number of rides')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=5)
+    parser.add_argument('--db', dest='db', action='store_true', default=False,
+                        help='also benchmark end to end against the rides in the configured db')
+    args = parser.parse_args()
+
+    rides, rows = make_rides(args.n)
+    if marshal(rides[0].as_dict(), ride_fields) != serialize_ride_row(rows[0]):
+        print 'serialize_ride_row does not match marshal'
+        sys.exit(1)
+    print 'serializing %d rides' % args.n
+    report('as_dict + marshal', lambda: marshal(map(Ride.as_dict, rides), ride_fields), args.n, args.repeat)
+    report('serialize_ride_row', lambda: map(serialize_ride_row, rows), args.n, args.repeat)
+
+    if args.db:
+        with app.app_context():
+            query = Ride.query.order_by(Ride.id)
+            n = query.count()
+            if n == 0:
+                print 'no rides in the db'
+                return
+            print 'serializing %d rides from the db' % n
+            report('orm query + marshal', lambda: marshal(map(Ride.as_dict, query.all()), ride_fields), n, args.repeat)
+            report('core select + serialize', lambda: serialize_rides(query), n, args.repeat)
+
+if __name__ == '__main__':
+    main()
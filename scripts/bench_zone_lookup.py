@@ -0,0 +1,64 @@
+import sys, os, argparse, time, timeit
+import numpy as np
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear import app, db, zone_registry
+from steerclear.models import Ride
+from steerclear.utils.zone_raster import ZoneRaster
+
+"""
+report
+------
+Times :func: over :n: points and prints the best total and per point time
+"""
+def report(name, func, n, repeat):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print '  %-24s %8.1f ms total %8.3f us/point' % (name, best * 1000, best * 1e6 / n)
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark zone lookups of the pickup locations in the ride table')
+    parser.add_argument('--cell-size', dest='cell_sizes', type=float, nargs='+', default=[0.002, 0.001, 0.0005, 0.0002],
+                        help='raster cell sizes in degrees to benchmark')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        rows = db.session.query(Ride.start_latitude, Ride.start_longitude).all()
+    if not rows:
+        print 'no rides in the db'
+        return
+    points = np.array(rows, dtype=np.float64)
+    x, y = points[:, 1], points[:, 0]
+    pairs = zip(x.tolist(), y.tolist())
+    n = len(pairs)
+
+    index = zone_registry.index
+    expected = index.lookup_many(x, y)
+    print 'looking up %d pickup locations in %d zones' % (n, index.zones)
+    for zone, column in zip(zone_registry.zones, expected.T):
+        print '  %-24s %5.1f%% of pickups' % (zone.name, column.mean() * 100)
+    print 'exact lookup'
+    report('lookup', lambda: [index.lookup(a, b) for a, b in pairs], n, args.repeat)
+    report('lookup_many', lambda: index.lookup_many(x, y), n, args.repeat)
+
+    for cell_size in args.cell_sizes:
+        start = time.time()
+        raster = ZoneRaster(index, cell_size)
+        built = time.time() - start
+        stats = raster.stats()
+        print 'raster of %g degree cells (%d x %d, %.1f%% boundary cells, built in %.1f ms)' % (
+            cell_size, stats['rows'], stats['columns'], stats['boundary_cells'] * 100, built * 1000)
+        print '  %-24s %8.1f%%' % ('hit rate', raster.hits(x, y).mean() * 100)
+        report('lookup', lambda: [raster.lookup(a, b) for a, b in pairs], n, args.repeat)
+        report('lookup_many', lambda: raster.lookup_many(x, y), n, args.repeat)
+
+        # the raster never changes an answer
+        if not (raster.lookup_many(x, y) == expected).all() or \
+                any(raster.lookup(a, b) != index.lookup(a, b) for a, b in pairs):
+            print '  raster answers differ from the exact lookup'
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import sys, os, json
+import xml.etree.cElementTree as ElementTree
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear.utils.polygon import SteerClearGISClient
+from steerclear.utils.eta_estimate import haversine_matrix
+
+STEERCLEAR_DIRNAME = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/steerclear'
+RADIUS_FILENAME = STEERCLEAR_DIRNAME + '/static/shapefiles/steerclear-radius/steerclear-radius.shp'
+DEFAULT_OUTPUT_FILENAME = STEERCLEAR_DIRNAME + '/static/road_graph/road_graph.json'
+
+# default speed in miles per hour of each drivable osm highway type
+SPEEDS = {
+    'motorway': 55, 'motorway_link': 35,
+    'trunk': 45, 'trunk_link': 30,
+    'primary': 35, 'primary_link': 25,
+    'secondary': 30, 'secondary_link': 25,
+    'tertiary': 25, 'tertiary_link': 20,
+    'unclassified': 25, 'residential': 25,
+    'living_street': 10, 'service': 15
+}
+
+# meters per second in a mile per hour
+MPH = 0.44704
+
+"""
+way_speed
+---------
+Returns the speed in meters per second of an osm way,
+using its maxspeed tag if it is set in mph
+"""
+def way_speed(tags):
+    maxspeed = tags.get('maxspeed', '')
+    if maxspeed.endswith(' mph') and maxspeed[:-4].isdigit():
+        return int(maxspeed[:-4]) * MPH
+    return SPEEDS[tags['highway']] * MPH
+
+"""
+build_road_graph
+----------------
+Builds a road graph (see steerclear/utils/road_graph.py) from an
+osm xml extract. Keeps every drivable way that has at least one
+node inside the steerclear radius polygon
+"""
+def build_road_graph(osm_filename, gis_client):
+    coordinates = {}
+    ways = []
+    for event, element in ElementTree.iterparse(osm_filename):
+        if element.tag == 'node':
+            coordinates[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+        elif element.tag == 'way':
+            tags = dict((tag.get('k'), tag.get('v')) for tag in element.findall('tag'))
+            if tags.get('highway') in SPEEDS:
+                refs = [nd.get('ref') for nd in element.findall('nd')]
+                ways.append((refs, tags))
+        if element.tag in ('node', 'way', 'relation'):
+            element.clear()
+
+    nodes, names, edges = [], [], []
+    node_indices, name_indices = {}, {}
+
+    def node_index(ref):
+        if ref not in node_indices:
+            node_indices[ref] = len(nodes)
+            nodes.append(coordinates[ref])
+        return node_indices[ref]
+
+    for refs, tags in ways:
+        refs = [ref for ref in refs if ref in coordinates]
+        if not any(gis_client.is_in_polygon(coordinates[ref]) for ref in refs):
+            continue
+
+        name = tags.get('name')
+        if name is not None and name not in name_indices:
+            name_indices[name] = len(names)
+            names.append(name)
+
+        # reversed oneways are stored in their driving direction
+        oneway = tags.get('oneway') in ('yes', 'true', '1', '-1') or tags.get('junction') == 'roundabout'
+        if tags.get('oneway') == '-1':
+            refs.reverse()
+
+        speed = way_speed(tags)
+        for a, b in zip(refs, refs[1:]):
+            meters = float(haversine_matrix([coordinates[a]], [coordinates[b]])[0, 0])
+            edges.append([
+                node_index(a), node_index(b),
+                round(meters / speed, 1), round(meters, 1),
+                1 if oneway else 0, name_indices.get(name)
+            ])
+
+    return {'nodes': nodes, 'names': names, 'edges': edges}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print 'usage: python scripts/build_road_graph.py <osm xml file> [output file]'
+        sys.exit(1)
+
+    output_filename = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_OUTPUT_FILENAME
+    graph = build_road_graph(sys.argv[1], SteerClearGISClient(RADIUS_FILENAME))
+
+    output_dirname = os.path.dirname(output_filename)
+    if output_dirname and not os.path.isdir(output_dirname):
+        os.makedirs(output_dirname)
+    with open(output_filename, 'w') as f:
+        json.dump(graph, f, separators=(',', ':'))
+
+    print 'wrote %d nodes and %d edges to %s' % (len(graph['nodes']), len(graph['edges']), output_filename)
@@ -0,0 +1,32 @@
+import sys, os, argparse
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear import app, dm_client, radius_zone
+from steerclear.utils.travel_time_grid import TravelTimeGrid, open_travel_time_grid, \
+    create_travel_time_grid, update_travel_time_grid
+
+DEFAULT_DIRNAME = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/steerclear/static/travel_time_grid'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='build the travel time grid of the steerclear radius')
+    parser.add_argument('--dirname', default=app.config.get('TRAVEL_TIME_GRID_DIRNAME') or DEFAULT_DIRNAME)
+    parser.add_argument('--cell-size', type=float, default=0.0025,
+                        help='size of the grid cells in degrees (0.0025 is about 250 meters)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='only recompute missing and stale cell pairs of the existing grid')
+    args = parser.parse_args()
+
+    max_age = app.config.get('TRAVEL_TIME_GRID_MAX_AGE')
+    if args.refresh and open_travel_time_grid(args.dirname) is not None:
+        grid = TravelTimeGrid(args.dirname, max_age, mode='r+')
+    else:
+        grid = create_travel_time_grid(args.dirname, radius_zone, args.cell_size, max_age)
+    print 'grid has %d cells, %d cell pairs to compute' % (grid.times.shape[0], grid.stale().sum())
+
+    # query the distance matrix backend directly, not through the leg cache
+    updated, failed = update_travel_time_grid(grid, dm_client.client)
+    print 'computed %d cell pairs, %d requests failed' % (updated, failed)
+    if failed:
+        print 'run again with --refresh to retry the failed cell pairs'
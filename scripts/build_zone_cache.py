@@ -0,0 +1,26 @@
+import sys, os, argparse
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear import app
+from steerclear.utils.zones import ZoneRegistry
+from steerclear.utils.zone_cache import zone_cache_filename, save_zone_cache
+
+STEERCLEAR_DIRNAME = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/steerclear'
+SHAPEFILES_DIRNAME = STEERCLEAR_DIRNAME + '/static/shapefiles'
+DEFAULT_DIRNAME = STEERCLEAR_DIRNAME + '/static/zone_cache'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compile the zone shapefiles into a memory mappable zone cache file')
+    parser.add_argument('--dirname', default=app.config.get('ZONE_CACHE_DIRNAME') or DEFAULT_DIRNAME)
+    args = parser.parse_args()
+
+    # compile the zones in memory and write them to the cache
+    registry = ZoneRegistry(SHAPEFILES_DIRNAME)
+    filename = zone_cache_filename(SHAPEFILES_DIRNAME, args.dirname)
+    save_zone_cache(filename, registry.sourcefilenames, registry.index.zones, *registry.index.arrays)
+
+    for zone in registry.zones:
+        print '%s: %d vertices from %s' % (zone.name, len(zone.polygon), os.path.basename(zone.shapefilename))
+    print 'compiled %d zones (%d slabs) into %s' % (len(registry.zones), len(registry.index.slabs), filename)
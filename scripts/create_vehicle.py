@@ -0,0 +1,25 @@
+import sys, os
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear import db
+from steerclear.models import Vehicle
+from sqlalchemy import exc
+
+def create_vehicle():
+	# prompt for input
+	name = raw_input('Enter Vehicle Name: ')
+
+	# create vehicle
+	vehicle = Vehicle(name=name, active=True)
+	try:
+		# attempt to add vehicle to db
+		db.session.add(vehicle)
+		db.session.commit()
+		print "Vehicle created successfully"
+	except exc.IntegrityError:
+		print "Vehicle already exists"
+
+if __name__ == '__main__':
+	create_vehicle()
@@ -0,0 +1,54 @@
+import sys, os, argparse
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear.utils.dm_server import DistanceMatrixServer, HaversineDMClient
+
+DEFAULT_ROAD_GRAPH_FILENAME = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + \
+    '/steerclear/static/road_graph/road_graph.json'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local stand-in for the google distancematrix api')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--model', choices=['haversine', 'road_graph'], default='haversine',
+                        help='how durations are computed')
+    parser.add_argument('--speed', type=float, default=6.0,
+                        help='meters per second of the haversine model')
+    parser.add_argument('--detour', type=float, default=1.3,
+                        help='road distance over straight line distance of the haversine model')
+    parser.add_argument('--road-graph', default=DEFAULT_ROAD_GRAPH_FILENAME,
+                        help='road graph file of the road_graph model (see build_road_graph.py)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every response is delayed by')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    parser.add_argument('--over-query-limit-rate', type=float, default=0.0,
+                        help='fraction of requests answered with OVER_QUERY_LIMIT')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.model == 'road_graph':
+        from steerclear.utils.road_graph import RoadGraphDMClient
+        model = RoadGraphDMClient(args.road_graph)
+    else:
+        model = HaversineDMClient(args.speed, args.detour)
+
+    server = DistanceMatrixServer(
+        (args.host, args.port),
+        model,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        over_query_limit_rate=args.over_query_limit_rate,
+        seed=args.seed
+    )
+    print 'serving the distancematrix api with the %s model' % args.model
+    print "set DISTANCEMATRIX_BASE_URL = '%s'" % server.base_url()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print 'answered %d requests, %d with errors' % (server.requests, server.errors)
+        server.server_close()
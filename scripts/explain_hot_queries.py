@@ -0,0 +1,83 @@
+import sys, os
+
+# change path to parent directory to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steerclear import app, db
+from steerclear.models import Ride
+from steerclear.api.views import ride_list_query
+from datetime import datetime, timedelta
+
+# EXPLAIN access types that mean every row of the table is read.
+# 'ALL' is a full table scan and 'index' is a full index scan
+FULL_SCAN_TYPES = set(['ALL', 'index'])
+
+"""
+hot_queries
+-----------
+Returns (name, query, allowed_types) for every hot query on the ride table.
+allowed_types are full scan access types that are fine for that query
+"""
+def hot_queries():
+    now = datetime.utcnow()
+    return [
+        # RideListAPI.get with a location filter
+        ('ride queue on campus', ride_list_query('on_campus'), set()),
+        ('ride queue off campus', ride_list_query('off_campus'), set()),
+
+        # RideListAPI.get keyset pagination
+        ('ride queue page', ride_list_query('on_campus').filter(Ride.id > 100).limit(50), set()),
+
+        # last_rides last ride in the queue. a backwards pickup
+        # time index scan that stops after the first row is fine
+        ('queue tail', Ride.query.order_by(Ride.pickup_time.desc(), Ride.id.desc()).limit(1), set(['index'])),
+
+        # last_rides last ride in a vehicle's queue
+        ('vehicle queue tail', Ride.query.filter_by(vehicle_id=1)
+            .order_by(Ride.pickup_time.desc(), Ride.id.desc()).limit(1), set()),
+
+        # identity_loaded rides owned by the current user
+        ('user rides', Ride.query.filter(Ride.user_id == 1), set()),
+
+        # time window lookups
+        ('pickup time window', Ride.query.filter(Ride.pickup_time.between(now, now + timedelta(hours=1))), set()),
+        ('user pickup time window', Ride.query.filter(Ride.user_id == 1, Ride.pickup_time >= now), set()),
+    ]
+
+"""
+explain
+-------
+Runs EXPLAIN on :query: and returns the result rows
+"""
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    return db.engine.execute('EXPLAIN ' + unicode(compiled), params).fetchall()
+
+def main():
+    if db.engine.dialect.name != 'mysql':
+        print "Error: EXPLAIN checks require the mysql database, not %s" % db.engine.dialect.name
+        sys.exit(2)
+
+    failed = False
+    for name, query, allowed_types in hot_queries():
+        for row in explain(query):
+            if row['table'] != Ride.__tablename__:
+                continue
+            full_scan = row['type'] in FULL_SCAN_TYPES and row['type'] not in allowed_types
+            print '%-4s %-24s type=%-6s key=%-28s rows=%s' % (
+                'FAIL' if full_scan else 'ok', name, row['type'], row['key'], row['rows'])
+            if full_scan:
+                failed = True
+                if row['possible_keys']:
+                    print '     optimizer chose a full scan over %s. the table may be too small,' \
+                          ' try running ANALYZE TABLE ride' % row['possible_keys']
+
+    if failed:
+        print "Error: hot queries are falling back to full scans"
+        sys.exit(1)
+    print "All hot queries use an index"
+
+if __name__ == '__main__':
+    with app.app_context():
+        main()
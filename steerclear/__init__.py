@@ -23,24 +23,88 @@ sms_client = sms.SteerClearSMSClient(
             app.config['TWILIO_NUMBER']
         )
 
-# setup google distance matrix api client
+# setup distance matrix client behind a cache of legs. either the
+# google distancematrix api or routing on a local road graph file
 from steerclear.utils.eta import SteerClearDMClient
-dm_client = SteerClearDMClient()
-
-# setup and load in shapefiles of the campus map and steerclear radius polygons
-from steerclear.utils.polygon import SteerClearGISClient
+from steerclear.utils.leg_cache import CachingDMClient
 from os import path
-steerclear_dirname = path.dirname(path.abspath(__file__))
-campus_map_filename = steerclear_dirname + '/static/shapefiles/campus_map/campus_map.shp'
-campus_gis_client = SteerClearGISClient(campus_map_filename)
+if app.config.get('DISTANCEMATRIX_BACKEND', 'google') == 'road_graph':
+    from steerclear.utils.road_graph import RoadGraphDMClient
+    road_graph_filename = app.config.get('ROAD_GRAPH_FILENAME') or \
+        path.dirname(path.abspath(__file__)) + '/static/road_graph/road_graph.json'
+    distance_matrix_client = RoadGraphDMClient(road_graph_filename)
+else:
+    # stop calling the api while it is failing or slow and
+    # estimate etas from straight line distances instead
+    from steerclear.utils.circuit_breaker import CircuitBreaker
+    from steerclear.utils.eta_estimate import HaversineEstimator
+    distance_matrix_client = SteerClearDMClient(
+        pool_maxsize=app.config.get('DISTANCEMATRIX_POOL_MAXSIZE', 10),
+        connect_timeout=app.config.get('DISTANCEMATRIX_CONNECT_TIMEOUT', 3.05),
+        read_timeout=app.config.get('DISTANCEMATRIX_READ_TIMEOUT', 10),
+        max_retries=app.config.get('DISTANCEMATRIX_MAX_RETRIES', 2),
+        coalesce_workers=app.config.get('DISTANCEMATRIX_COALESCE_WORKERS', True),
+        coalesce_grid=app.config.get('DISTANCEMATRIX_CACHE_GRID', 0.0005),
+        breaker=CircuitBreaker(
+            window=app.config.get('DISTANCEMATRIX_BREAKER_WINDOW', 20),
+            min_calls=app.config.get('DISTANCEMATRIX_BREAKER_MIN_CALLS', 5),
+            failure_ratio=app.config.get('DISTANCEMATRIX_BREAKER_FAILURE_RATIO', 0.5),
+            slow_call_seconds=app.config.get('DISTANCEMATRIX_BREAKER_SLOW_CALL_SECONDS', 3.0),
+            cooldown=app.config.get('DISTANCEMATRIX_BREAKER_COOLDOWN', 30)
+        ),
+        estimator=HaversineEstimator(app.config.get('DISTANCEMATRIX_ESTIMATE_SPEED', 6.0)),
+        fetch_threads=app.config.get('DISTANCEMATRIX_FETCH_THREADS', 4),
+        base_url=app.config.get('DISTANCEMATRIX_BASE_URL')
+    )
+
+# load the precomputed travel time grid of the service
+# area if one was built with scripts/build_travel_time_grid.py
+from steerclear.utils.travel_time_grid import open_travel_time_grid
+travel_time_grid = open_travel_time_grid(
+            app.config.get('TRAVEL_TIME_GRID_DIRNAME') or
+                path.dirname(path.abspath(__file__)) + '/static/travel_time_grid',
+            max_age=app.config.get('TRAVEL_TIME_GRID_MAX_AGE')
+        )
+
+dm_client = CachingDMClient(
+            distance_matrix_client,
+            grid=app.config.get('DISTANCEMATRIX_CACHE_GRID', 0.0005),
+            maxsize=app.config.get('DISTANCEMATRIX_CACHE_SIZE', 10000),
+            ttl=app.config.get('DISTANCEMATRIX_CACHE_TTL', 86400),
+            travel_times=travel_time_grid
+        )
 
-steerclear_radius_filename = steerclear_dirname + '/static/shapefiles/steerclear-radius/steerclear-radius.shp'
-radius_gis_client = SteerClearGISClient(steerclear_radius_filename)
+# setup versioned cache of serialized ride queue responses
+from steerclear.utils.queue_cache import RideQueueCache, RideQueueTail
+ride_queue_cache = RideQueueCache()
+ride_queue_tail = RideQueueTail()
+
+# setup pool of background threads that create ride requests made with ?async=true
+from steerclear.utils.workers import WorkerPool
+ride_worker_pool = WorkerPool(app.config.get('RIDE_WORKER_THREADS', 4))
+
+# setup and load in the zones of every shapefile, including the campus map and
+# steerclear radius polygons, memory mapped from the zone cache (rebuilt
+# whenever a shapefile changes)
+from steerclear.utils.zones import ZoneRegistry
+steerclear_dirname = path.dirname(path.abspath(__file__))
+zone_cache_dirname = app.config.get('ZONE_CACHE_DIRNAME') or steerclear_dirname + '/static/zone_cache'
+zone_registry = ZoneRegistry(
+            steerclear_dirname + '/static/shapefiles',
+            zone_cache_dirname,
+            raster_cell_size=app.config.get('ZONE_RASTER_CELL_SIZE')
+        )
+campus_zone = zone_registry.zone('campus_map')
+radius_zone = zone_registry.zone('steerclear-radius')
 
 from steerclear.api.views import api_bp
 from steerclear.driver_portal.views import driver_portal_bp
 from steerclear.login.views import login_bp
 
+# persist the distance matrix leg cache in the db
+from steerclear.api.leg_store import DBLegStore
+dm_client.store = DBLegStore(dm_client.ttl)
+
 # register all blueprints to the app
 app.register_blueprint(api_bp)
 app.register_blueprint(driver_portal_bp)
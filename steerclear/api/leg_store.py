@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from sqlalchemy import exc
+
+from steerclear import db
+from models import DistanceMatrixLeg, DistanceMatrixAddress
+
+# maximum number of keys in a single IN (...) lookup
+LEG_STORE_BATCH_SIZE = 500
+
+"""
+DBLegStore
+----------
+Persistent store of the CachingDMClient backed by the
+distance_matrix_leg and distance_matrix_address tables, so cached
+legs are shared by every uwsgi worker and survive restarts.
+Reads and writes go straight through the engine in their own
+short transactions, never through the request's db session
+"""
+class DBLegStore():
+
+    """
+    Creates a new DBLegStore
+
+    :ttl: seconds stored legs and addresses stay valid
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def get_legs(self, keys):
+        rows = self._get(DistanceMatrixLeg, DistanceMatrixLeg.duration, map(self._leg_key, keys))
+        return dict((self._parse_key(key), duration) for key, duration in rows)
+
+    def set_legs(self, items):
+        self._set(DistanceMatrixLeg, [{'key': self._leg_key(key), 'duration': value} for key, value in items])
+
+    def get_addresses(self, keys):
+        rows = self._get(DistanceMatrixAddress, DistanceMatrixAddress.address, map(self._point_key, keys))
+        return dict((self._parse_key(key), address) for key, address in rows)
+
+    def set_addresses(self, items):
+        self._set(DistanceMatrixAddress, [{'key': self._point_key(key), 'address': value} for key, value in items])
+
+    """
+    _get
+    ----
+    Returns the (key, value) rows of :model: with the given keys
+    that were stored less than ttl seconds ago
+    """
+    def _get(self, model, column, keys):
+        table = model.__table__
+        oldest = datetime.utcnow() - timedelta(0, self.ttl)
+        rows = []
+        for i in xrange(0, len(keys), LEG_STORE_BATCH_SIZE):
+            statement = db.select([table.c.key, column]) \
+                .where(table.c.key.in_(keys[i:i + LEG_STORE_BATCH_SIZE])) \
+                .where(table.c.created >= oldest)
+            rows.extend(db.engine.execute(statement).fetchall())
+        return rows
+
+    """
+    _set
+    ----
+    Replaces the rows of :model: with the given values.
+    If another worker stored the same keys first, its rows are kept
+    """
+    def _set(self, model, values):
+        table = model.__table__
+        now = datetime.utcnow()
+        for value in values:
+            value['created'] = now
+        keys = [value['key'] for value in values]
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.delete().where(table.c.key.in_(keys)))
+                connection.execute(table.insert(), values)
+        except exc.IntegrityError:
+            pass
+
+    def _leg_key(self, key):
+        (o_lat, o_long), (d_lat, d_long) = key
+        return '%d,%d,%d,%d' % (o_lat, o_long, d_lat, d_long)
+
+    def _point_key(self, key):
+        return '%d,%d' % key
+
+    """
+    _parse_key
+    ----------
+    Turns a stored key back into the grid cell key it was made from
+    """
+    def _parse_key(self, key):
+        values = map(int, key.split(','))
+        if len(values) == 4:
+            return (values[0], values[1]), (values[2], values[3])
+        return values[0], values[1]
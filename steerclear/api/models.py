@@ -1,11 +1,40 @@
-from steerclear import db
+from steerclear import db, ride_queue_cache
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+import sqlalchemy as sa
 import sqlalchemy.types as types
 from datetime import datetime
 
+"""
+Model class for the Vehicle object. Each active Vehicle has
+its own queue of Rides. If there are no active Vehicles, every
+Ride is in a single queue
+"""
+class Vehicle(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+
+    rides = db.relationship('Ride', backref='vehicle', lazy='dynamic')
+
+    def __repr__(self):
+        return "<Vehicle(ID %r, Name %r, Active %r)>" % (self.id, self.name, self.active)
+
 """
 Model class for the Ride object
 """
 class Ride(db.Model):
+    # indexes matching the ride queue's hot queries.
+    # see scripts/explain_hot_queries.py
+    __table_args__ = (
+        db.Index('ix_ride_on_campus_id', 'on_campus', 'id'),
+        db.Index('ix_ride_user_id_pickup_time', 'user_id', 'pickup_time'),
+        db.Index('ix_ride_pickup_time', 'pickup_time'),
+        db.Index('ix_ride_vehicle_id_pickup_time', 'vehicle_id', 'pickup_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     num_passengers = db.Column(db.Integer, nullable=False)
     
@@ -19,13 +48,28 @@ class Ride(db.Model):
     travel_time = db.Column(db.Integer, nullable=False)
     dropoff_time = db.Column(types.DateTime, nullable=False)
 
+    # seconds from the dropoff of the previous Ride in the queue to the
+    # pickup of this Ride. None if the vehicle was idle (or the leg is unknown)
+    leg_time = db.Column(db.Integer, nullable=True)
+
     pickup_address = db.Column(db.String(255), nullable=False)
     dropoff_address = db.Column(db.String(255), nullable=False)
 
     on_campus = db.Column(db.Boolean, nullable=False)
 
+    # True while the Ride's times and addresses are estimates made while the
+    # distance matrix api was unavailable. They are refined in the background
+    eta_estimated = db.Column(db.Boolean, nullable=False, default=False, server_default=sa.false())
+
+    # number of times the api had no route for the estimated Ride. it is no
+    # longer refined after ETA_REFINE_MAX_ATTEMPTS of them
+    eta_refine_attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # Vehicle whose queue the Ride is in. None if there are no Vehicles
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=True)
+
     def __repr__(self):
         return "<Ride(ID %r, Passengers %r, Pickup <%r, %r>, Dropoff <%r, %r>, ETP %r, Duration %r, ETD %r)>" % \
                 (
@@ -53,5 +97,173 @@ class Ride(db.Model):
             'dropoff_time': self.dropoff_time,
             'pickup_address': self.pickup_address,
             'dropoff_address': self.dropoff_address,
-            'on_campus': self.on_campus
+            'on_campus': self.on_campus,
+            'eta_estimated': self.eta_estimated
+        }
+
+"""
+Model class for the RideRequest object. A RideRequest holds a validated
+ride request whose etas are being computed in the background. Once they
+are, the Ride is created and the RideRequest points to it
+"""
+class RideRequest(db.Model):
+    # statuses of a RideRequest
+    PENDING = 'pending'
+    CREATED = 'created'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    num_passengers = db.Column(db.Integer, nullable=False)
+
+    start_latitude = db.Column(db.Float, nullable=False)
+    start_longitude = db.Column(db.Float, nullable=False)
+
+    end_latitude = db.Column(db.Float, nullable=False)
+    end_longitude = db.Column(db.Float, nullable=False)
+
+    on_campus = db.Column(db.Boolean, nullable=False)
+
+    status = db.Column(db.String(16), nullable=False, default=PENDING)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user = db.relationship('User')
+
+    # not a foreign key since the created Ride can be deleted
+    ride_id = db.Column(db.Integer, nullable=True)
+
+    created = db.Column(types.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return "<RideRequest(ID %r, Status %r, Ride %r)>" % (self.id, self.status, self.ride_id)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'ride_id': self.ride_id
         }
+
+"""
+Model class for the DistanceMatrixLeg object. Persistent tier of
+the distance matrix leg cache (see utils/leg_cache.py). The key is
+the grid cells of the origin and destination as
+'origin_lat,origin_long,destination_lat,destination_long'
+"""
+class DistanceMatrixLeg(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    duration = db.Column(db.Integer, nullable=False)
+    created = db.Column(types.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return "<DistanceMatrixLeg(Key %r, Duration %r)>" % (self.key, self.duration)
+
+"""
+Model class for the DistanceMatrixAddress object. Persistent tier of
+the distance matrix address cache. The key is the grid cell of the
+location as 'lat,long'
+"""
+class DistanceMatrixAddress(db.Model):
+    key = db.Column(db.String(32), primary_key=True)
+    address = db.Column(db.String(255), nullable=False)
+    created = db.Column(types.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return "<DistanceMatrixAddress(Key %r, Address %r)>" % (self.key, self.address)
+
+"""
+add_seconds
+-----------
+SQL expression adding a number of seconds to a datetime column,
+e.x. add_seconds(Ride.pickup_time, 60). Used to shift ride times
+inside a single bulk UPDATE
+"""
+class add_seconds(FunctionElement):
+    type = types.DateTime()
+    name = 'add_seconds'
+
+@compiles(add_seconds)
+def compile_add_seconds(element, compiler, **kw):
+    column, seconds = list(element.clauses)
+    return 'TIMESTAMPADD(SECOND, %s, %s)' % (compiler.process(seconds), compiler.process(column))
+
+# sqlite stores datetimes as 'YYYY-MM-DD HH:MM:SS.ffffff' strings. the
+# fractional seconds are carried over so shifted times still compare
+# equal to datetimes bound as parameters
+@compiles(add_seconds, 'sqlite')
+def compile_add_seconds_sqlite(element, compiler, **kw):
+    column, seconds = list(element.clauses)
+    column = compiler.process(column)
+    return "strftime('%%Y-%%m-%%d %%H:%%M:%%S', %s, %s || ' seconds') || substr(%s, 20)" % \
+        (column, compiler.process(seconds), column)
+
+"""
+Model class for the RideEvent object. RideEvents are the log of
+ride requests being created and deleted that is pushed out to
+clients listening on the ride event stream. Their ids are used
+as the event ids clients replay from when they reconnect
+"""
+class RideEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(32), nullable=False)
+
+    # not a foreign key since deleted rides still have events
+    ride_id = db.Column(db.Integer, nullable=False)
+
+    # json encoded event payload
+    data = db.Column(db.Text, nullable=False)
+    created = db.Column(types.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return "<RideEvent(ID %r, Event %r, Ride %r)>" % (self.id, self.event, self.ride_id)
+
+    """
+    as_sse
+    ------
+    Returns the RideEvent formatted as a server-sent event message
+    """
+    def as_sse(self):
+        return 'id: %d\nevent: %s\ndata: %s\n\n' % (self.id, self.event, self.data)
+
+"""
+mark_ride_queue_changed
+-----------------------
+Flags the session that flushed a Ride (or Vehicle) insert, update, or
+delete so that the ride queue version is bumped once the change is committed
+"""
+@event.listens_for(Ride, 'after_insert')
+@event.listens_for(Ride, 'after_update')
+@event.listens_for(Ride, 'after_delete')
+@event.listens_for(Vehicle, 'after_insert')
+@event.listens_for(Vehicle, 'after_update')
+@event.listens_for(Vehicle, 'after_delete')
+def mark_ride_queue_changed(mapper, connection, target):
+    object_session(target).info['ride_queue_changed'] = True
+
+"""
+mark_ride_queue_bulk_changed
+----------------------------
+Same as mark_ride_queue_changed but for bulk
+query.update() and query.delete() statements on Rides
+"""
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def mark_ride_queue_bulk_changed(context):
+    if context.mapper is not None and context.mapper.class_ is Ride:
+        context.session.info['ride_queue_changed'] = True
+
+"""
+bump_ride_queue_version
+-----------------------
+Bumps the ride queue version after a commit that changed
+the ride queue. Bumping after the commit (rather than at flush)
+guarantees that a response cached at the new version can never
+be built from data the commit had not yet made visible
+"""
+@event.listens_for(Session, 'after_commit')
+def bump_ride_queue_version(session):
+    if session.info.pop('ride_queue_changed', False):
+        ride_queue_cache.bump()
+
+@event.listens_for(Session, 'after_rollback')
+def clear_ride_queue_changed(session):
+    session.info.pop('ride_queue_changed', None)
@@ -0,0 +1,112 @@
+from steerclear import db
+from models import Ride
+
+# columns of the ride table in the order serialize_ride_row() expects them
+RIDE_COLUMNS = [
+    Ride.__table__.c.id,
+    Ride.__table__.c.num_passengers,
+    Ride.__table__.c.start_latitude,
+    Ride.__table__.c.start_longitude,
+    Ride.__table__.c.end_latitude,
+    Ride.__table__.c.end_longitude,
+    Ride.__table__.c.pickup_time,
+    Ride.__table__.c.travel_time,
+    Ride.__table__.c.dropoff_time,
+    Ride.__table__.c.pickup_address,
+    Ride.__table__.c.dropoff_address,
+    Ride.__table__.c.on_campus,
+    Ride.__table__.c.eta_estimated,
+]
+
+# day and month names used by rfc822 dates. same as email.utils.formatdate
+_DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+_MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+"""
+format_rfc822
+-------------
+Formats a naive utc datetime exactly like flask_restful's
+fields.DateTime(dt_format='rfc822') does, but without the round
+trip through utctimetuple(), timegm() and gmtime()
+"""
+def format_rfc822(dt):
+    if dt is None:
+        return None
+    return '%s, %02d %s %04d %02d:%02d:%02d -0000' % (
+        _DAY_NAMES[dt.weekday()],
+        dt.day,
+        _MONTH_NAMES[dt.month - 1],
+        dt.year,
+        dt.hour,
+        dt.minute,
+        dt.second
+    )
+
+"""
+serialize_ride_row
+------------------
+Turns a row of RIDE_COLUMNS into the same dictionary that
+marshal(ride.as_dict(), ride_fields) returns for the Ride.
+None values are handled the same way the flask_restful fields do
+"""
+def serialize_ride_row(row):
+    (ride_id, num_passengers, start_latitude, start_longitude, end_latitude,
+     end_longitude, pickup_time, travel_time, dropoff_time, pickup_address,
+     dropoff_address, on_campus, eta_estimated) = row
+    return {
+        'id': int(ride_id) if ride_id is not None else 0,
+        'num_passengers': int(num_passengers) if num_passengers is not None else 0,
+        'start_latitude': float(start_latitude) if start_latitude is not None else None,
+        'start_longitude': float(start_longitude) if start_longitude is not None else None,
+        'end_latitude': float(end_latitude) if end_latitude is not None else None,
+        'end_longitude': float(end_longitude) if end_longitude is not None else None,
+        'pickup_time': format_rfc822(pickup_time),
+        'travel_time': int(travel_time) if travel_time is not None else 0,
+        'dropoff_time': format_rfc822(dropoff_time),
+        'pickup_address': unicode(pickup_address) if pickup_address is not None else None,
+        'dropoff_address': unicode(dropoff_address) if dropoff_address is not None else None,
+        'on_campus': bool(on_campus) if on_campus is not None else None,
+        'eta_estimated': bool(eta_estimated) if eta_estimated is not None else None,
+    }
+
+"""
+ride_rows
+---------
+Executes the core select equivalent of a Ride :query: (keeping its
+filters, ordering and limit) and returns the result of RIDE_COLUMNS
+rows. No Ride objects are built and nothing goes in the identity map
+"""
+def ride_rows(query):
+    statement = query.statement.with_only_columns(RIDE_COLUMNS)
+    return db.session.execute(statement)
+
+"""
+ride_row_batches
+----------------
+Generator of lists of at most :batch_size: RIDE_COLUMNS rows of a Ride
+:query: ordered by ride id, with at most :limit: rows in all. Every
+batch is its own keyset query for the rides after the last one of the
+batch before. Drivers like MySQLdb buffer a whole result set on the
+client, so only one batch is ever held in memory
+"""
+def ride_row_batches(query, batch_size, limit=None):
+    after_id = None
+    while limit is None or limit > 0:
+        size = batch_size if limit is None else min(batch_size, limit)
+        batch_query = query if after_id is None else query.filter(Ride.id > after_id)
+        batch = ride_rows(batch_query.limit(size)).fetchall()
+        if batch:
+            yield batch
+        if len(batch) < size:
+            return
+        after_id = batch[-1][0]
+        if limit is not None:
+            limit -= len(batch)
+
+"""
+serialize_rides
+---------------
+Returns the list of serialized Rides matching a Ride :query:
+"""
+def serialize_rides(query):
+    return map(serialize_ride_row, ride_rows(query))
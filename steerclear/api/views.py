@@ -1,11 +1,25 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, Response, stream_with_context, url_for
 from flask_restful import Resource, Api, fields, marshal, abort, reqparse
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
 from flask.ext.login import login_required, current_user
 from datetime import datetime, timedelta
-from sqlalchemy import exc
+import json, os, threading, math
+from sqlalchemy import exc, func, or_, and_, not_
 
-from steerclear.utils.eta import time_between_locations
-from steerclear import sms_client, dm_client, campus_gis_client, radius_gis_client
+from steerclear.utils.eta import time_between_locations, query_matrix
+from steerclear.utils.insertion import cheapest_insertion
+from steerclear import (
+    app,
+    sms_client,
+    dm_client,
+    zone_registry,
+    campus_zone,
+    radius_zone,
+    ride_queue_cache,
+    ride_queue_tail,
+    ride_worker_pool
+)
 
 from steerclear.utils.permissions import (
     student_permission, 
@@ -15,12 +29,15 @@ from steerclear.utils.permissions import (
 
 from models import *
 from forms import *
+from serializers import ride_row_batches, serialize_ride_row, serialize_rides
 
 # set up api blueprint
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 api = Api(api_bp)
 
-# response format for Ride objects
+# response format for Ride objects. lists of Rides are
+# serialized by serializers.serialize_ride_row() instead,
+# which must be kept in sync with this
 ride_fields = {
     'id': fields.Integer(),
     'num_passengers': fields.Integer(),
@@ -34,8 +51,151 @@ ride_fields = {
     'pickup_address': fields.String(),
     'dropoff_address': fields.String(),
     'on_campus': fields.Boolean(), 
+    'eta_estimated': fields.Boolean(),
+}
+
+# response format for RideRequest objects
+ride_request_fields = {
+    'id': fields.Integer(),
+    'status': fields.String(),
+    'ride_id': fields.Integer(default=None),
 }
 
+# default and maximum number of rides returned in a single page
+# when paginating through the ride queue with ?after_id=&limit=
+RIDE_LIST_DEFAULT_LIMIT = 50
+RIDE_LIST_MAX_LIMIT = 500
+
+# number of rides queried at a time when streaming the ride queue
+RIDE_LIST_STREAM_BATCH_SIZE = 100
+
+# maximum number of rides that can be created in a single batch request
+RIDE_BATCH_MAX_SIZE = 100
+
+# seconds a ride request made with ?async=true can stay pending. a request
+# still pending after that (e.x. its worker was restarted) is failed
+RIDE_REQUEST_TIMEOUT = app.config.get('RIDE_REQUEST_TIMEOUT', 120)
+
+# seconds between attempts to replace the estimated etas of rides created
+# while the distance matrix api was unavailable with real ones
+ETA_REFINE_INTERVAL = app.config.get('ETA_REFINE_INTERVAL', 30)
+
+# number of times the api can have no route for an estimated ride before
+# it is left estimated and no longer refined
+ETA_REFINE_MAX_ATTEMPTS = app.config.get('ETA_REFINE_MAX_ATTEMPTS', 3)
+
+# whether this process has a job waiting to refine estimated etas.
+# guarded by eta_refine_lock
+eta_refine_scheduled = False
+eta_refine_lock = threading.Lock()
+
+"""
+ride_list_query
+---------------
+Returns the query for the ride queue ordered by ride id,
+filtered by the location query string value.
+:location: 'on_campus', 'off_campus', or anything else for all rides
+"""
+def ride_list_query(location):
+    query = Ride.query
+    if location == 'on_campus':
+        # only ride requests that are on campus
+        query = query.filter_by(on_campus=True)
+    elif location == 'off_campus':
+        # only ride requests that are off campus
+        query = query.filter_by(on_campus=False)
+    return query.order_by(Ride.id)
+
+"""
+stream_ride_list
+----------------
+Generator that writes out the ride queue json object row by row, at
+most :limit: rides. Rows are queried RIDE_LIST_STREAM_BATCH_SIZE at
+a time so memory use stays flat no matter how long the queue is
+"""
+def stream_ride_list(query, limit=None):
+    # read before the rides, like the body of GET /api/rides
+    last_event_id = db.session.query(func.max(RideEvent.id)).scalar() or 0
+    yield '{"last_event_id": %d, "rides": [' % last_event_id
+    first = True
+    for batch in ride_row_batches(query, RIDE_LIST_STREAM_BATCH_SIZE, limit):
+        for row in batch:
+            if not first:
+                yield ', '
+            first = False
+            yield json.dumps(serialize_ride_row(row))
+    yield ']}'
+
+# number of most recent RideEvents kept around for clients to replay
+RIDE_EVENT_RETENTION = 1000
+
+# seconds a ride event stream waits for the queue to change before checking
+# again. changes made by other uwsgi workers are seen within this interval
+RIDE_EVENT_POLL_INTERVAL = 1.0
+
+# seconds between keep-alive comments on an idle ride event stream
+RIDE_EVENT_HEARTBEAT_INTERVAL = 15.0
+
+# milliseconds EventSource clients wait before reconnecting
+RIDE_EVENT_RETRY_MS = 3000
+
+"""
+record_ride_event
+-----------------
+Adds a RideEvent to the current db session so that it is
+committed along with the ride queue change it describes.
+Every RIDE_EVENT_RETENTION events, old events are pruned
+"""
+def record_ride_event(event, ride_id, data):
+    ride_event = RideEvent(event=event, ride_id=ride_id, data=json.dumps(data))
+    db.session.add(ride_event)
+    db.session.flush()
+    if ride_event.id % RIDE_EVENT_RETENTION == 0:
+        RideEvent.query.filter(RideEvent.id <= ride_event.id - RIDE_EVENT_RETENTION).delete()
+    return ride_event
+
+"""
+stream_ride_events
+------------------
+Generator that writes out RideEvents as server-sent events.
+Starts after :last_event_id: or at the newest event if it is None.
+If events the client missed were already pruned, a reset event
+is sent so the client knows to reload the whole ride queue.
+The db is only queried when the ride queue version changes
+"""
+def stream_ride_events(last_event_id):
+    yield 'retry: %d\n\n' % RIDE_EVENT_RETRY_MS
+
+    if last_event_id is None:
+        last_event_id = db.session.query(func.max(RideEvent.id)).scalar() or 0
+    else:
+        oldest_event_id = db.session.query(func.min(RideEvent.id)).scalar()
+        if oldest_event_id is not None and last_event_id < oldest_event_id - 1:
+            yield 'event: reset\ndata: {}\n\n'
+    # end the transaction so later commits are visible to this stream
+    db.session.rollback()
+
+    version = None
+    idle = 0.0
+    while True:
+        current_version = ride_queue_cache.version()
+        if current_version != version:
+            version = current_version
+            events = RideEvent.query.filter(RideEvent.id > last_event_id).order_by(RideEvent.id).all()
+            db.session.rollback()
+            for event in events:
+                yield event.as_sse()
+                last_event_id = event.id
+            idle = 0.0
+
+        # wait for the ride queue to change, sending a
+        # keep-alive comment if the stream has been idle too long
+        if ride_queue_cache.wait(version, RIDE_EVENT_POLL_INTERVAL) == version:
+            idle += RIDE_EVENT_POLL_INTERVAL
+            if idle >= RIDE_EVENT_HEARTBEAT_INTERVAL:
+                yield ': keep-alive\n\n'
+                idle = 0.0
+
 """
 RideListAPI
 -----------
@@ -58,26 +218,76 @@ class RideListAPI(Resource):
         # parser.add_argument('location', type=str, location='args')
         # args = parser.parse_args()
         args = request.args
-        if args.get('location', '') == 'on_campus':
-            # return list of all ride requests that are on campus
-            on_campus_rides = Ride.query.filter_by(on_campus=True).all()
-            on_campus_rides = map(Ride.as_dict, on_campus_rides)
-            return {'rides': marshal(on_campus_rides, ride_fields)}, 200
-        
-        elif args.get('location', '') == 'off_campus':
-            # return list of all ride requests that are off campus
-            off_campus_rides = Ride.query.filter_by(on_campus=False).all()
-            off_campus_rides = map(Ride.as_dict, off_campus_rides)
-            return {'rides': marshal(off_campus_rides, ride_fields)}, 200
-        
+        query = ride_list_query(args.get('location', ''))
+
+        # get keyset pagination arguments or 400 if they are malformed
+        try:
+            after_id = args.get('after_id', None)
+            after_id = int(after_id) if after_id is not None else None
+            limit = args.get('limit', None)
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            abort(400)
+        if (after_id is not None and after_id < 0) or (limit is not None and limit < 1):
+            abort(400)
+
+        # only return rides that come after the cursor ride id
+        if after_id is not None:
+            query = query.filter(Ride.id > after_id)
+
+        # stream the json array of rides out row by row
+        if args.get('stream', '') == 'true':
+            if limit is not None:
+                limit = min(limit, RIDE_LIST_MAX_LIMIT)
+            return Response(
+                stream_with_context(stream_ride_list(query, limit)),
+                mimetype='application/json'
+            )
+
+        # return a single page of rides and the cursor for the next page
+        if after_id is not None or limit is not None:
+            limit = min(limit or RIDE_LIST_DEFAULT_LIMIT, RIDE_LIST_MAX_LIMIT)
+            rides = serialize_rides(query.limit(limit))
+            next_after_id = rides[-1]['id'] if len(rides) == limit else None
+            return {'rides': rides, 'next_after_id': next_after_id}, 200
+
+        # the whole ride queue is cached per location filter against the
+        # queue version, so polls of an unchanged queue never hit the db
+        location = args.get('location', '')
+        if location not in ('on_campus', 'off_campus'):
+            location = ''
+        # end the transaction the login queries started so the rides are
+        # read from a snapshot taken after the version is. otherwise a ride
+        # committed in between would be missing from the body cached under it
+        db.session.rollback()
+        version = ride_queue_cache.version()
+        etag = ride_queue_cache.etag(location, version)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
         else:
-            # return list of all ride requests
-            rides = Ride.query.all()                            # query db for Rides
-            rides = map(Ride.as_dict, rides)                    # convert all Rides to dictionaries
-            return {'rides': marshal(rides, ride_fields)}, 200  # return response
+            cached = ride_queue_cache.get(location, version)
+            if cached is None:
+                # the newest event id is read before the rides, so a client
+                # streaming the events after it never misses a change the
+                # rides do not include. it may be sent a change twice instead
+                last_event_id = db.session.query(func.max(RideEvent.id)).scalar() or 0
+                rides = serialize_rides(query)              # query db for serialized Rides
+                body = json.dumps({'rides': rides, 'last_event_id': last_event_id})
+                etag = ride_queue_cache.set(location, version, body)
+            else:
+                etag, body = cached
+            response = Response(body, mimetype='application/json')
+
+        # make clients revalidate their copy of the queue on every poll
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
 
     """
-    Create a new Ride object and place it in the queue
+    Create a new Ride object and place it in the queue.
+    With ?async=true, only the form and locations are checked before
+    returning 202 and a RideRequest. The Ride is created in the background
+    and can be picked up from GET /api/rides/requests/<ride_request_id>
     """
     def post(self):
         form = RideForm()                       # validate RideForm or 404
@@ -90,47 +300,170 @@ class RideListAPI(Resource):
 
         # check that pickup and dropoff locations are within the service radius
         # of steerclear and return an error if they are not
-        if not (radius_gis_client.is_in_polygon(pickup_loc) and radius_gis_client.is_in_polygon(dropoff_loc)):
+        pickup_zones = zone_registry.zones_at(pickup_loc)
+        if radius_zone not in pickup_zones or radius_zone not in zone_registry.zones_at(dropoff_loc):
             abort(400)
 
         # check if the pickup_location for the ride request
         # is on campus or off campus
-        on_campus = campus_gis_client.is_in_polygon(pickup_loc)
+        on_campus = campus_zone in pickup_zones
 
-        # query distance matrix api and get eta time data and addresses
-        result = query_distance_matrix_api(pickup_loc, dropoff_loc)
-        if result is None:
+        # save the ride request and compute its etas in a background thread
+        # instead of holding up this worker for the distance matrix api
+        if request.args.get('async', '') == 'true':
+            ride_request = RideRequest(
+                num_passengers=form.num_passengers.data,
+                start_latitude=form.start_latitude.data,
+                start_longitude=form.start_longitude.data,
+                end_latitude=form.end_latitude.data,
+                end_longitude=form.end_longitude.data,
+                on_campus=on_campus,
+                user=current_user
+            )
+            db.session.add(ride_request)
+            db.session.commit()
+            response = {'ride_request': marshal(ride_request.as_dict(), ride_request_fields)}
+            location = url_for('api.ride_request', ride_request_id=ride_request.id)
+            ride_worker_pool.submit(process_ride_request, ride_request.id)
+            return response, 202, {'Location': location}
+
+        # hold the queue tail lock until the new ride is committed so
+        # concurrent ride requests chain onto each other in order
+        with ride_queue_tail.lock():
+            # end the current transaction so the queue tail
+            # is read from a snapshot taken after getting the lock
+            db.session.commit()
+            new_ride = create_ride(form.num_passengers.data, pickup_loc, dropoff_loc, on_campus, current_user)
+        return {'ride': marshal(new_ride.as_dict(), ride_fields)}, 201
+
+"""
+RideRequestAPI
+--------------
+HTTP commands for checking on a ride request made with
+POST /api/rides?async=true. uri: /rides/requests/<ride_request_id>
+"""
+class RideRequestAPI(Resource):
+
+    # Require that user must be logged in
+    method_decorators = [login_required]
+
+    """
+    Return the RideRequest with the corresponding id or 404.
+    Its status is 'pending' while the etas are being computed, then
+    'created' along with the created Ride object, or 'failed' if
+    the Ride could not be created or it has been pending for longer
+    than RIDE_REQUEST_TIMEOUT seconds
+    """
+    def get(self, ride_request_id):
+        ride_request = RideRequest.query.get(ride_request_id)
+        if ride_request is None:
+            abort(404)
+
+        # only admins and the user who made the request can access it
+        if ride_request.user_id != current_user.id and not admin_permission.can():
+            abort(403)
+
+        if fail_stale_ride_request(ride_request):
+            ride_request = RideRequest.query.get(ride_request_id)
+
+        response = {'ride_request': marshal(ride_request.as_dict(), ride_request_fields)}
+        if ride_request.status == RideRequest.CREATED:
+            ride = Ride.query.get(ride_request.ride_id)
+            if ride is not None:
+                response['ride'] = marshal(ride.as_dict(), ride_fields)
+        return response, 200
+
+"""
+RideBatchAPI
+------------
+HTTP commands for creating many ride requests
+at once. uri: /rides/batch
+"""
+class RideBatchAPI(Resource):
+
+    # Require that users be logged in in order to access the RideBatchAPI
+    method_decorators = [login_required]
+
+    """
+    Create a list of new Ride objects and place them in the queue in
+    order. Expects a json object {"rides": [ride, ...]} where every
+    ride has the same fields as a RideForm. Either every ride is
+    created or, if any ride is invalid, none are
+
+    User must be an admin to access route
+    """
+    @admin_permission.require(http_exception=403)
+    def post(self):
+        data = request.get_json(silent=True)
+        rides = data.get('rides', None) if isinstance(data, dict) else None
+        if not isinstance(rides, list) or not 0 < len(rides) <= RIDE_BATCH_MAX_SIZE:
             abort(400)
 
-        # get pickup, travel, and dropoff times
-        pickup_time, travel_time, dropoff_time = result[0]
+        # validate every ride as a RideForm or 400
+        forms = []
+        for ride in rides:
+            if not isinstance(ride, dict):
+                abort(400)
+            form = RideForm(formdata=MultiDict(ride))
+            if not form.validate():
+                abort(400)
+            forms.append(form)
 
-        # get pickup and dropoff addresses
-        pickup_address, dropoff_address = result[1]
-        
-        # create new Ride object
-        new_ride = Ride(
-            num_passengers=form.num_passengers.data,
-            start_latitude=form.start_latitude.data,
-            start_longitude=form.start_longitude.data,
-            end_latitude=form.end_latitude.data,
-            end_longitude=form.end_longitude.data,
-            pickup_time=pickup_time,
-            travel_time=travel_time,
-            dropoff_time=dropoff_time,
-            pickup_address=pickup_address,
-            dropoff_address=dropoff_address,
-            on_campus=on_campus,
-            user=current_user
-        )
-        
-        try:
-            db.session.add(new_ride)    # add new Ride object to db
+        # get pickup and dropoff locations of every Ride request
+        pickup_locs = [(form.start_latitude.data, form.start_longitude.data) for form in forms]
+        dropoff_locs = [(form.end_latitude.data, form.end_longitude.data) for form in forms]
+
+        # check that every pickup and dropoff location is within the service radius
+        # of steerclear and check if the pickup locations are on campus or off campus
+        zones = zone_registry.zones_at_many(pickup_locs + dropoff_locs)
+        if not zones[:, radius_zone.column].all():
+            abort(400)
+        on_campus = zones[:len(pickup_locs), campus_zone.column].tolist()
+
+        # hold the queue tail lock until the new rides are committed so
+        # concurrent ride requests chain onto the end of the batch
+        with ride_queue_tail.lock():
+            # end the current transaction so the queue tails
+            # are read from a snapshot taken after getting the lock
             db.session.commit()
-        except exc.IntegrityError:
-            db.session.rollback()
+            new_rides = create_rides(forms, pickup_locs, dropoff_locs, on_campus)
+        return {'rides': [marshal(ride.as_dict(), ride_fields) for ride in new_rides]}, 201
+
+"""
+RideEventStreamAPI
+------------------
+Server-sent event stream of ride requests being created
+and deleted. uri: /rides/stream
+"""
+class RideEventStreamAPI(Resource):
+
+    # Require that users be logged in in order to access the RideEventStreamAPI
+    method_decorators = [login_required]
+
+    """
+    Stream ride-created and ride-deleted events as they happen.
+    Clients that reconnect with the Last-Event-ID header (or the
+    last_event_id query string value) are replayed every event
+    they missed
+
+    User must be an admin to access route
+    """
+    @admin_permission.require(http_exception=403)
+    def get(self):
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', None))
+        try:
+            last_event_id = int(last_event_id) if last_event_id is not None else None
+        except ValueError:
             abort(400)
-        return {'ride': marshal(new_ride.as_dict(), ride_fields)}, 201
+
+        response = Response(
+            stream_with_context(stream_ride_events(last_event_id)),
+            mimetype='text/event-stream'
+        )
+        response.cache_control.no_cache = True
+        # tell nginx not to buffer the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
 
 """
 RideAPI
@@ -172,16 +505,29 @@ class RideAPI(Resource):
             # If user doesn't have permission to access ride resource, abort 403
             abort(403)
         
-        ride = Ride.query.get(ride_id)  # query db for Ride object
-        if ride is None:                # 404 if not found
-            abort(404)
-        
-        try:
-            db.session.delete(ride)     # attempt to delete Ride object from db
+        # hold the queue tail lock so rides are not moved
+        # up while a new ride is being chained onto them
+        with ride_queue_tail.lock():
+            # end the current transaction so the queue
+            # is read from a snapshot taken after getting the lock
             db.session.commit()
-        except exc.IntegrityError:
-            db.session.rollback()
-            abort(404)
+
+            ride = Ride.query.get(ride_id)  # query db for Ride object
+            if ride is None:                # 404 if not found
+                abort(404)
+
+            try:
+                # move up the rides after the deleted ride
+                shifted = close_queue_gap(ride)
+                if shifted is not None:
+                    record_ride_event('rides-shifted', ride.id, {'ids': shifted[0], 'seconds': shifted[1]})
+
+                db.session.delete(ride)     # attempt to delete Ride object from db
+                record_ride_event('ride-deleted', ride.id, {'id': ride.id})
+                db.session.commit()
+            except exc.IntegrityError:
+                db.session.rollback()
+                abort(404)
         
         return "", 204
 
@@ -222,79 +568,820 @@ class NotificationAPI(Resource):
             abort(400)
         return '', 201
 
+"""
+StatsAPI
+--------
+HTTP commands for checking on the health of the uwsgi
+worker that serves the request. uri: /stats
+"""
+class StatsAPI(Resource):
+
+    # Require that user must be logged in and
+    # that the user is an admin
+    method_decorators = [
+        admin_permission.require(http_exception=403),
+        login_required
+    ]
+
+    """
+    Return the counters of the worker's distance matrix api client
+    """
+    def get(self):
+        return {
+            'pid': os.getpid(),
+            'distance_matrix': dm_client.stats()
+        }, 200
+
 # route urls to resources
 api.add_resource(RideListAPI, '/rides', endpoint='rides')
+api.add_resource(RideBatchAPI, '/rides/batch', endpoint='rides_batch')
+api.add_resource(RideEventStreamAPI, '/rides/stream', endpoint='ride_events')
 api.add_resource(RideAPI, '/rides/<int:ride_id>', endpoint='ride')
+api.add_resource(RideRequestAPI, '/rides/requests/<int:ride_request_id>', endpoint='ride_request')
 api.add_resource(NotificationAPI, '/notifications', endpoint='notifications')
+api.add_resource(StatsAPI, '/stats', endpoint='stats')
+
+"""
+process_ride_request
+--------------------
+Background job that creates the Ride of a pending RideRequest
+and marks the RideRequest as created, or as failed if the
+Ride could not be created or the RideRequest has been pending
+for too long. Runs in a WorkerPool thread
+"""
+def process_ride_request(ride_request_id):
+    with app.app_context():
+        ride_request = RideRequest.query.get(ride_request_id)
+        if ride_request is None or ride_request.status != RideRequest.PENDING:
+            return
+        if fail_stale_ride_request(ride_request):
+            return
+        pickup_loc = (ride_request.start_latitude, ride_request.start_longitude)
+        dropoff_loc = (ride_request.end_latitude, ride_request.end_longitude)
+
+        # same as RideListAPI.post()
+        with ride_queue_tail.lock():
+            db.session.commit()
+            try:
+                create_ride(
+                    ride_request.num_passengers,
+                    pickup_loc,
+                    dropoff_loc,
+                    ride_request.on_campus,
+                    ride_request.user,
+                    ride_request
+                )
+            except Exception as e:
+                # create_ride() aborts when the etas can not be computed.
+                # anything else (e.x. the db or the distance matrix client
+                # failing) must not leave the request pending forever either
+                db.session.rollback()
+                if not isinstance(e, HTTPException):
+                    app.logger.exception('creating the ride of ride request %d failed', ride_request_id)
+                RideRequest.query.filter_by(id=ride_request_id, status=RideRequest.PENDING) \
+                    .update({RideRequest.status: RideRequest.FAILED}, synchronize_session=False)
+                db.session.commit()
+
+"""
+fail_stale_ride_request
+-----------------------
+Marks :ride_request: as failed if it has been pending for longer than
+RIDE_REQUEST_TIMEOUT seconds, e.x. because the worker that was computing
+its etas was restarted and it will never be picked up again.
+Returns True if it was marked as failed
+"""
+def fail_stale_ride_request(ride_request):
+    cutoff = datetime.utcnow() - timedelta(0, RIDE_REQUEST_TIMEOUT)
+    if ride_request.status != RideRequest.PENDING or ride_request.created >= cutoff:
+        return False
+    # only if no worker created its ride in the meantime
+    failed = RideRequest.query.filter_by(id=ride_request.id, status=RideRequest.PENDING) \
+        .update({RideRequest.status: RideRequest.FAILED}, synchronize_session=False)
+    db.session.commit()
+    return failed > 0
+
+"""
+create_ride
+-----------
+Computes the eta times and addresses of a validated ride request,
+commits the new Ride to the queue of the vehicle that can pick it up
+soonest and caches it as that queue's tail.
+:user: User who requested the Ride
+:ride_request: optional RideRequest that is marked as created
+               in the same transaction the Ride is committed in
+Must be called with the queue tail lock held. Aborts 400 on failure
+"""
+def create_ride(num_passengers, pickup_loc, dropoff_loc, on_campus, user, ride_request=None):
+    # query distance matrix api and get eta time data,
+    # addresses, and the vehicle to assign the ride to
+    tails = None
+    if app.config.get('RIDE_INSERTION_MODE', 'append') == 'cheapest':
+        result = query_cheapest_insertion(pickup_loc, dropoff_loc)
+    else:
+        tails = queue_tails()
+        result = query_distance_matrix_api(pickup_loc, dropoff_loc, tails)
+    if result is None:
+        abort(400)
+
+    # create new Ride object
+    new_ride = build_ride(num_passengers, pickup_loc, dropoff_loc, on_campus, user, result)
+    vehicle_id = new_ride.vehicle_id
+
+    # in cheapest insertion mode, get the rides that come after the
+    # new ride, how far they are pushed back, and the new leg time
+    # of the ride right after the new ride
+    shifted_ride_ids, shift, next_leg_time = result[5:] if len(result) > 5 else ([], 0, None)
+    estimated = result[4]
+
+    try:
+        db.session.add(new_ride)    # add new Ride object to db
+        db.session.flush()
+        record_ride_event('ride-created', new_ride.id, marshal(new_ride.as_dict(), ride_fields))
+
+        # push back the rides after the new ride
+        if shifted_ride_ids:
+            shift_rides(shifted_ride_ids, shift)
+            values = {Ride.leg_time: next_leg_time}
+            if estimated:
+                values[Ride.eta_estimated] = True
+                values[Ride.eta_refine_attempts] = 0
+            Ride.query.filter_by(id=shifted_ride_ids[0]).update(values, synchronize_session=False)
+            record_ride_event('rides-shifted', new_ride.id, {'ids': shifted_ride_ids, 'seconds': shift})
+
+        if ride_request is not None:
+            # the request may have timed out while its etas were computed
+            created = RideRequest.query.filter_by(id=ride_request.id, status=RideRequest.PENDING).update({
+                RideRequest.ride_id: new_ride.id,
+                RideRequest.status: RideRequest.CREATED
+            }, synchronize_session=False)
+            if not created:
+                db.session.rollback()
+                abort(400)
+        db.session.commit()
+    except exc.IntegrityError:
+        db.session.rollback()
+        abort(400)
+
+    # if it was appended, the new ride is now the last ride in its vehicle's
+    # queue. cheapest insertion never reads the queue tails, so they are
+    # left to be queried again by whichever request needs them next
+    if tails is not None:
+        tails = dict(tails)
+        tails[vehicle_id] = new_ride
+        ride_queue_tail.set(ride_queue_cache.version(), tails)
+
+    # get real etas for the ride once the distance matrix api is back
+    if estimated:
+        schedule_eta_refinement()
+    return new_ride
+
+"""
+create_rides
+------------
+Computes the eta times and addresses of a list of validated ride
+requests and commits them in a single transaction, each appended to
+the queue of the vehicle that can pick it up soonest once the rides
+before it in the list are queued. Ride etas are fetched with
+query_batch_distance_matrix_api().
+Must be called with the queue tail lock held. Aborts 400 on failure
+"""
+def create_rides(forms, pickup_locs, dropoff_locs, on_campus):
+    tails = queue_tails()
+    results = query_batch_distance_matrix_api(pickup_locs, dropoff_locs, tails)
+    if results is None:
+        abort(400)
+
+    new_rides = [
+        build_ride(form.num_passengers.data, pickup_loc, dropoff_loc, ride_on_campus, current_user, result)
+        for form, pickup_loc, dropoff_loc, ride_on_campus, result
+        in zip(forms, pickup_locs, dropoff_locs, on_campus, results)
+    ]
+    try:
+        db.session.add_all(new_rides)   # add new Ride objects to db
+        db.session.flush()
+        for new_ride in new_rides:
+            record_ride_event('ride-created', new_ride.id, marshal(new_ride.as_dict(), ride_fields))
+        db.session.commit()
+    except exc.IntegrityError:
+        db.session.rollback()
+        abort(400)
+
+    # the last new ride assigned to each vehicle is now the last ride in its queue
+    tails = dict(tails)
+    for new_ride in new_rides:
+        tails[new_ride.vehicle_id] = new_ride
+    ride_queue_tail.set(ride_queue_cache.version(), tails)
+
+    # get real etas for the rides once the distance matrix api is back
+    if any(new_ride.eta_estimated for new_ride in new_rides):
+        schedule_eta_refinement()
+    return new_rides
+
+"""
+build_ride
+----------
+Returns a new Ride requested by :user: from a validated ride
+request and the result of one of the query_*_api functions
+"""
+def build_ride(num_passengers, pickup_loc, dropoff_loc, on_campus, user, result):
+    # get pickup, travel, and dropoff times
+    pickup_time, travel_time, dropoff_time = result[0]
+
+    # get pickup and dropoff addresses
+    pickup_address, dropoff_address = result[1]
+
+    return Ride(
+        num_passengers=num_passengers,
+        start_latitude=pickup_loc[0],
+        start_longitude=pickup_loc[1],
+        end_latitude=dropoff_loc[0],
+        end_longitude=dropoff_loc[1],
+        pickup_time=pickup_time,
+        travel_time=travel_time,
+        dropoff_time=dropoff_time,
+        leg_time=result[3],
+        eta_estimated=result[4],
+        pickup_address=pickup_address,
+        dropoff_address=dropoff_address,
+        on_campus=on_campus,
+        user=user,
+        vehicle_id=result[2]
+    )
 
 """
 query_distance_matrix_api
 -------------------
 Takes a pickup and dropoff location for a Ride request
-and returns the pickup, travel, and dropoff times
+and returns the pickup, travel, and dropoff times, the
+pickup and dropoff addresses, the id of the vehicle
+that can pick the ride up soonest, the leg time from
+that vehicle's last dropoff (None if it is idle), and whether
+the etas are estimates. Every vehicle's queue tail is
+evaluated in a single distance matrix request
+:tails: dictionary of vehicle id -> QueueTail, defaults to queue_tails()
 """
-def query_distance_matrix_api(pickup_loc, dropoff_loc):
-    # check to see if there are any rides in the queue
-    last_ride = db.session.query(Ride).order_by(Ride.id.desc()).first()
+def query_distance_matrix_api(pickup_loc, dropoff_loc, tails=None):
+    if tails is None:
+        tails = queue_tails()
 
-    # if there are no rides in the queue, pickup_loc and
-    # dropoff_loc are our only destinations
-    if last_ride is None:
-        # eta = time_between_locations([pickup_loc], [dropoff_loc])
+    # vehicles with rides in their queue must first get from the
+    # dropoff location of their last ride to pickup_loc.
+    # vehicles with empty queues are idle
+    vehicle_ids = sorted(tails.keys())
+    busy_vehicle_ids = [v for v in vehicle_ids if tails[v] is not None]
 
-        # query google distance matrix api and get response
-        response = dm_client.query_api([pickup_loc], [dropoff_loc])
-        
-        # get eta or return None
-        eta = response.get_eta()
-        if eta is None:
-            return None
-       
-        # calculate pickup, travel, and dropoff times based off eta response
-        # assumes that van will arive at pickup_loc within 5 minutes
-        pickup_time = datetime.utcnow() + timedelta(0, 10 * 60)
-        travel_time = eta[0][0]
-        dropoff_time = pickup_time + timedelta(0, travel_time)
+    # origins are the last dropoff location of every busy vehicle
+    # followed by pickup_loc. if every vehicle is idle, pickup_loc
+    # and dropoff_loc are our only destinations
+    origins = [(tails[v].end_latitude, tails[v].end_longitude) for v in busy_vehicle_ids]
+    destinations = [pickup_loc] if busy_vehicle_ids else []
+    origins.append(pickup_loc)
+    destinations.append(dropoff_loc)
 
-        # get addresses or return None
-        addresses = response.get_addresses()
-        if addresses is None:
-            return None
+    # query google distance matrix api and get response
+    response = dm_client.query_api(origins, destinations)
+
+    # get eta or return None
+    eta = response.get_eta()
+    if eta is None:
+        return None
 
-        # get pickup and dropoff addresses.
-        # pickup address is the first address in origin_addresses (index 0)
-        # dropoff address is the first address in destination_addresses (index 1)
-        pickup_address = addresses[0][0]
-        dropoff_address = addresses[1][0]
+    # get addresses or return None
+    addresses = response.get_addresses()
+    if addresses is None:
+        return None
+
+    # calculate the pickup time of every vehicle and pick the soonest.
+    # assumes that an idle van will arive at pickup_loc within 10 minutes
+    pickup_times = {}
+    leg_times = {}
+    for i, vehicle_id in enumerate(busy_vehicle_ids):
+        leg_times[vehicle_id] = eta[i][0]
+        pickup_times[vehicle_id] = tails[vehicle_id].dropoff_time + timedelta(0, eta[i][0])
+    idle_pickup_time = datetime.utcnow() + timedelta(0, 10 * 60)
+    for vehicle_id in vehicle_ids:
+        if tails[vehicle_id] is None:
+            pickup_times[vehicle_id] = idle_pickup_time
+    vehicle_id = min(vehicle_ids, key=lambda v: pickup_times[v])
+
+    # calculate pickup, travel, and dropoff times based off eta response.
+    # travel time is from pickup_loc (last origin) to dropoff_loc (last destination)
+    pickup_time = pickup_times[vehicle_id]
+    travel_time = eta[-1][-1]
+    dropoff_time = pickup_time + timedelta(0, travel_time)
+
+    # get pickup and dropoff addresses.
+    # pickup address is the last address in origin_addresses (index 0)
+    # dropoff address is the last address in destination_addresses (index 1)
+    pickup_address = addresses[0][-1]
+    dropoff_address = addresses[1][-1]
     
-    # else there are other rides in the queue, so we must factor
-    # in the dropoff time and location from the last ride in the queue
+    return (pickup_time, travel_time, dropoff_time), (pickup_address, dropoff_address), \
+        vehicle_id, leg_times.get(vehicle_id), response.is_estimated()
+
+"""
+query_batch_distance_matrix_api
+-------------------------------
+Takes lists of pickup and dropoff locations for Ride requests and
+returns the same result as query_distance_matrix_api() for every
+ride, as if the rides were requested one after another. Every leg
+a ride could be chained onto (from a vehicle's queue tail or the
+dropoff of an earlier ride in the list to the ride's pickup) and
+every ride's travel time are fetched up front with query_matrix(),
+so a batch costs a handful of distance matrix requests instead of
+one per ride. Returns None if any request fails
+:tails: dictionary of vehicle id -> QueueTail
+"""
+def query_batch_distance_matrix_api(pickup_locs, dropoff_locs, tails):
+    vehicle_ids = sorted(tails.keys())
+    busy_vehicle_ids = [v for v in vehicle_ids if tails[v] is not None]
+    num_busy = len(busy_vehicle_ids)
+
+    # origins are the last dropoff location of every busy vehicle followed
+    # by the dropoff location of every ride but the last. ride j can only
+    # be chained onto a vehicle's tail or onto a ride before it
+    origins = [(tails[v].end_latitude, tails[v].end_longitude) for v in busy_vehicle_ids]
+    origins += dropoff_locs[:-1]
+    if len(vehicle_ids) == 1:
+        # a single vehicle picks up every ride right after the one before
+        # it (the first one right after its queue tail). only those legs
+        # are needed instead of every leg ride j could be chained onto
+        needed = lambda i, j: j == i - num_busy + 1
     else:
-        # get last ride dropoff location. this is our starting location
-        start_loc = (last_ride.end_latitude, last_ride.end_longitude)
+        needed = lambda i, j: i < num_busy or i - num_busy < j
+    chain = query_matrix(dm_client, origins, pickup_locs, needed)
 
-        # query google distance matrix api and get response
-        response = dm_client.query_api([start_loc, pickup_loc], [pickup_loc, dropoff_loc])
-        
-        # get eta or return None
+    # only the diagonal of pickup_locs x dropoff_locs is needed
+    travel = query_matrix(dm_client, pickup_locs, dropoff_locs, lambda i, j: i == j)
+    if chain is None or travel is None:
+        return None
+    chain_eta = chain[0]
+    travel_eta, addresses = travel[:2]
+    estimated = chain[2] or travel[2]
+
+    # row of the chain matrix and dropoff time of the last ride in every busy vehicle's queue
+    ends = dict((v, (i, tails[v].dropoff_time)) for i, v in enumerate(busy_vehicle_ids))
+
+    # assumes that an idle van will arive at a pickup location within 10 minutes
+    idle_pickup_time = datetime.utcnow() + timedelta(0, 10 * 60)
+
+    results = []
+    for j in xrange(len(pickup_locs)):
+        # calculate the pickup time of every vehicle and pick the soonest
+        pickup_times = {}
+        leg_times = {}
+        for vehicle_id in vehicle_ids:
+            if vehicle_id in ends:
+                i, end_time = ends[vehicle_id]
+                leg_times[vehicle_id] = chain_eta[i][j]
+                pickup_times[vehicle_id] = end_time + timedelta(0, chain_eta[i][j])
+            else:
+                pickup_times[vehicle_id] = idle_pickup_time
+        vehicle_id = min(vehicle_ids, key=lambda v: pickup_times[v])
+
+        pickup_time = pickup_times[vehicle_id]
+        travel_time = travel_eta[j][j]
+        dropoff_time = pickup_time + timedelta(0, travel_time)
+
+        # the ride is now the last ride in the vehicle's queue
+        ends[vehicle_id] = (num_busy + j, dropoff_time)
+
+        results.append((
+            (pickup_time, travel_time, dropoff_time),
+            (addresses[0][j], addresses[1][j]),
+            vehicle_id,
+            leg_times.get(vehicle_id),
+            estimated
+        ))
+    return results
+
+"""
+queue_tails
+-----------
+Returns the dictionary of vehicle id -> QueueTail of the last ride
+in that vehicle's queue (None if the queue is empty). If there are no
+active vehicles, the whole queue is under the vehicle id None.
+Only queries the db if the ride queue changed since the tails were cached
+"""
+def queue_tails():
+    version = ride_queue_cache.version()
+    tails = ride_queue_tail.get(version)
+    if tails is None:
+        tails = ride_queue_tail.set(version, last_rides())
+    return tails
+
+"""
+last_rides
+----------
+Queries the db for the last Ride in every active vehicle's queue.
+Queues are in pickup time order, which is also ride id order unless
+rides were inserted with cheapest insertion.
+Returns a dictionary of vehicle id -> Ride or None if the queue is empty
+"""
+def last_rides():
+    vehicle_ids = [v.id for v in Vehicle.query.filter_by(active=True)]
+
+    # single van service. every ride is in one queue
+    if not vehicle_ids:
+        return {None: Ride.query.order_by(Ride.pickup_time.desc(), Ride.id.desc()).first()}
+
+    rides = {}
+    for vehicle_id in vehicle_ids:
+        rides[vehicle_id] = Ride.query.filter_by(vehicle_id=vehicle_id) \
+            .order_by(Ride.pickup_time.desc(), Ride.id.desc()).first()
+    return rides
+
+"""
+queued_rides
+------------
+Queries the db for every Ride in every active vehicle's queue.
+Returns a dictionary of vehicle id -> list of Ride rows in pickup
+time order. If there are no active vehicles, the whole queue is
+under the vehicle id None
+"""
+def queued_rides():
+    vehicle_ids = [v.id for v in Vehicle.query.filter_by(active=True)]
+    query = Ride.query.with_entities(
+        Ride.id,
+        Ride.vehicle_id,
+        Ride.start_latitude,
+        Ride.start_longitude,
+        Ride.end_latitude,
+        Ride.end_longitude,
+        Ride.pickup_time,
+        Ride.dropoff_time,
+        Ride.leg_time
+    ).order_by(Ride.pickup_time, Ride.id)
+
+    # single van service. every ride is in one queue
+    if not vehicle_ids:
+        return {None: query.all()}
+
+    queues = dict((vehicle_id, []) for vehicle_id in vehicle_ids)
+    for ride in query.filter(Ride.vehicle_id.in_(vehicle_ids)):
+        queues[ride.vehicle_id].append(ride)
+    return queues
+
+"""
+query_cheapest_insertion
+------------------------
+Takes a pickup and dropoff location for a Ride request and finds the
+place in any vehicle's queue where the ride adds the least travel time.
+The ride can go after the last ride of a queue, or between two rides
+if the second one has not been picked up yet. Existing leg times are the
+queued rides' stored leg times (or the gaps between their dropoff and
+pickup times if those are unknown), so only the legs to and from the new
+ride at those places are fetched. The new ride is never picked up before
+now, even right after a ride that was already dropped off.
+Returns the pickup, travel, and dropoff times, the pickup and dropoff
+addresses, the vehicle id, the new ride's leg time, whether the etas
+are estimates, the ids of the rides after the new ride, how many seconds
+those rides are pushed back, and the new leg time of the ride right
+after the new ride
+"""
+def query_cheapest_insertion(pickup_loc, dropoff_loc):
+    queues = queued_rides()
+    vehicle_ids = sorted(queues.keys())
+
+    # every queue is empty so just add the ride to an idle vehicle
+    if not any(queues.values()):
+        result = query_distance_matrix_api(pickup_loc, dropoff_loc, dict((v, None) for v in vehicle_ids))
+        if result is None:
+            return None
+        return result + ([], 0, None)
+
+    # the (vehicle id, k) of every place the new ride can go right after
+    # ride k, and the rides that would come right after the new ride
+    now = datetime.utcnow()
+    places = []
+    next_rides = []
+    for vehicle_id in vehicle_ids:
+        queue = queues[vehicle_id]
+        for k in xrange(len(queue) - 1):
+            if queue[k + 1].pickup_time > now:
+                places.append((vehicle_id, k))
+                next_rides.append(queue[k + 1])
+        if queue:
+            places.append((vehicle_id, len(queue) - 1))
+
+    # query the travel times from the dropoff location of the ride
+    # before every place to pickup_loc, and from pickup_loc to dropoff_loc
+    origins = [
+        (queues[vehicle_id][k].end_latitude, queues[vehicle_id][k].end_longitude)
+        for vehicle_id, k in places
+    ]
+    response = dm_client.query_api(origins + [pickup_loc], [pickup_loc, dropoff_loc])
+    eta = response.get_eta()
+    addresses = response.get_addresses()
+    if eta is None or addresses is None:
+        return None
+    to_pickup = dict(zip(places, [row[0] for row in eta[:-1]]))
+    travel_time = eta[-1][-1]
+    estimated = response.is_estimated()
+
+    # query the travel times from dropoff_loc to the ride after every place
+    from_dropoff = {}
+    if next_rides:
+        destinations = [(ride.start_latitude, ride.start_longitude) for ride in next_rides]
+        next_response = dm_client.query_api([dropoff_loc], destinations)
+        next_eta = next_response.get_eta()
+        if next_eta is None:
+            return None
+        estimated = estimated or next_response.is_estimated()
+        from_dropoff = dict(zip([ride.id for ride in next_rides], next_eta[0]))
+
+    # find the cheapest place to insert the ride in every vehicle's queue
+    best = None
+    for vehicle_id in vehicle_ids:
+        queue = queues[vehicle_id]
+        if not queue:
+            # assumes that an idle van will arive at pickup_loc within 10 minutes
+            candidate = (10 * 60 + travel_time, vehicle_id, None, now + timedelta(0, 10 * 60), None)
+        else:
+            legs = [
+                queue[k + 1].leg_time if queue[k + 1].leg_time is not None
+                else int((queue[k + 1].pickup_time - queue[k].dropoff_time).total_seconds())
+                for k in xrange(len(queue) - 1)
+            ]
+            # the new ride can not be picked up before now, so after a ride
+            # that was already dropped off the van also waits until now
+            slots = []
+            for i, ride in enumerate(queue):
+                leg_time = to_pickup.get((vehicle_id, i))
+                if leg_time is not None:
+                    leg_time = max(leg_time, int(math.ceil((now - ride.dropoff_time).total_seconds())))
+                slots.append(leg_time)
+            k, cost = cheapest_insertion(
+                legs,
+                slots,
+                [from_dropoff.get(ride.id) for ride in queue],
+                travel_time
+            )
+            leg_time = to_pickup[(vehicle_id, k)]
+            pickup_time = max(now, queue[k].dropoff_time + timedelta(0, leg_time))
+            candidate = (cost, vehicle_id, k, pickup_time, leg_time)
+        if best is None or candidate[0] < best[0]:
+            best = candidate
+
+    cost, vehicle_id, k, pickup_time, leg_time = best
+    dropoff_time = pickup_time + timedelta(0, travel_time)
+
+    # every ride after the new one is pushed back by the added travel time.
+    # the ride right after the new one now starts from dropoff_loc
+    shifted_ride_ids = []
+    if k is not None:
+        shifted_ride_ids = [ride.id for ride in queues[vehicle_id][k + 1:]]
+    shift = cost if shifted_ride_ids else 0
+    next_leg_time = from_dropoff[shifted_ride_ids[0]] if shifted_ride_ids else None
+
+    # pickup address is the last address in origin_addresses (index 0)
+    # dropoff address is the last address in destination_addresses (index 1)
+    pickup_address = addresses[0][-1]
+    dropoff_address = addresses[1][-1]
+
+    return (pickup_time, travel_time, dropoff_time), (pickup_address, dropoff_address), \
+        vehicle_id, leg_time, estimated, shifted_ride_ids, shift, next_leg_time
+
+"""
+queue_neighbors
+---------------
+Returns the Rides right before and right after :ride: in its
+vehicle's queue (in pickup time order), or None if there are none
+"""
+def queue_neighbors(ride):
+    queue = Ride.query.filter(Ride.vehicle_id == ride.vehicle_id, Ride.id != ride.id)
+    before = or_(
+        Ride.pickup_time < ride.pickup_time,
+        and_(Ride.pickup_time == ride.pickup_time, Ride.id < ride.id)
+    )
+    previous_ride = queue.filter(before).order_by(Ride.pickup_time.desc(), Ride.id.desc()).first()
+    next_ride = queue.filter(not_(before)).order_by(Ride.pickup_time, Ride.id).first()
+    return previous_ride, next_ride
+
+"""
+close_queue_gap
+---------------
+Moves up the rides after a ride that is about to be deleted. The ride
+right after it now starts from the dropoff of the ride right before it,
+so only that one leg is fetched, and every later ride is shifted by the
+time saved in a single bulk UPDATE. If the deleted ride was first in
+the queue, the next ride is picked up by an idle vehicle. The next ride
+is never moved up to before now. If the new leg is an estimate, the next ride is flagged as estimated until it is refined.
+Does nothing for rides that were already picked up (e.x. finished
+rides), or if the new leg can not be fetched.
+Returns the (ids, seconds) of the shifted rides or None
+"""
+def close_queue_gap(ride):
+    now = datetime.utcnow()
+    if ride.pickup_time <= now:
+        return None
+    previous_ride, next_ride = queue_neighbors(ride)
+    if next_ride is None:
+        return None
+
+    estimated = False
+    if previous_ride is None:
+        # assumes that an idle van will arive at the pickup location within 10 minutes
+        leg_time = None
+        pickup_time = now + timedelta(0, 10 * 60)
+    else:
+        origin = (previous_ride.end_latitude, previous_ride.end_longitude)
+        destination = (next_ride.start_latitude, next_ride.start_longitude)
+        response = dm_client.query_api([origin], [destination])
         eta = response.get_eta()
         if eta is None:
             return None
+        leg_time = eta[0][0]
+        estimated = response.is_estimated()
+        # the ride before may have been dropped off already, but the
+        # next ride can not be picked up any earlier than now
+        pickup_time = max(now, previous_ride.dropoff_time + timedelta(0, leg_time))
 
-        # get addresses or return None
-        addresses = response.get_addresses()
-        if addresses is None:
-            return None
-        
-        # calculate pickup, travel, and dropoff times based off eta response
-        pickup_time = last_ride.dropoff_time + timedelta(0, eta[0][0])
-        travel_time = eta[1][1]
-        dropoff_time = pickup_time + timedelta(0, travel_time)
+    # rides are only ever moved up by deleting a ride
+    shift = int((pickup_time - next_ride.pickup_time).total_seconds())
+    if shift >= 0:
+        return None
 
-        # get pickup and dropoff addresses.
-        # pickup address is the second address in origin_addresses (index 0)
-        # dropoff address is the second address in destination_addresses (index 1)
-        pickup_address = addresses[0][1]
-        dropoff_address = addresses[1][1]
-    
-    return (pickup_time, travel_time, dropoff_time), (pickup_address, dropoff_address)
+    # every ride from next_ride on is moved up by the same amount
+    shifted_ride_ids = [
+        row.id for row in Ride.query.with_entities(Ride.id)
+            .filter(Ride.vehicle_id == ride.vehicle_id, Ride.id != ride.id)
+            .filter(or_(
+                Ride.pickup_time > next_ride.pickup_time,
+                and_(Ride.pickup_time == next_ride.pickup_time, Ride.id >= next_ride.id)
+            ))
+    ]
+    shift_rides(shifted_ride_ids, shift)
+    values = {Ride.leg_time: leg_time}
+    if estimated:
+        values[Ride.eta_estimated] = True
+        values[Ride.eta_refine_attempts] = 0
+        schedule_eta_refinement()
+    Ride.query.filter_by(id=next_ride.id).update(values, synchronize_session=False)
+    return shifted_ride_ids, shift
+
+"""
+shift_rides
+-----------
+Pushes back the pickup and dropoff times of the Rides with the
+given ids by :seconds: (moves them up if negative) in a single bulk UPDATE
+"""
+def shift_rides(ride_ids, seconds):
+    Ride.query.filter(Ride.id.in_(ride_ids)).update({
+        Ride.pickup_time: add_seconds(Ride.pickup_time, seconds),
+        Ride.dropoff_time: add_seconds(Ride.dropoff_time, seconds),
+    }, synchronize_session=False)
+
+"""
+schedule_eta_refinement
+-----------------------
+Makes sure this process has a job waiting to refine the etas of
+Rides created while the distance matrix api was unavailable. The job
+runs in the ride worker pool every ETA_REFINE_INTERVAL seconds until
+no refinable Rides are left
+"""
+def schedule_eta_refinement():
+    global eta_refine_scheduled
+    with eta_refine_lock:
+        if eta_refine_scheduled:
+            return
+        eta_refine_scheduled = True
+    start_eta_refine_timer()
+
+def start_eta_refine_timer():
+    timer = threading.Timer(ETA_REFINE_INTERVAL, ride_worker_pool.submit, (refine_eta_job,))
+    timer.daemon = True
+    timer.start()
+
+"""
+refine_eta_job
+--------------
+Background job that refines every estimated Ride it can, then
+either schedules itself again or, if no refinable Rides are
+left, lets the next estimated Ride schedule a new job
+"""
+def refine_eta_job():
+    global eta_refine_scheduled
+    with app.app_context():
+        with ride_queue_tail.lock():
+            db.session.commit()
+            try:
+                refine_estimated_rides()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('refining estimated etas failed')
+
+        # rides created after the count schedule a new job themselves
+        with eta_refine_lock:
+            db.session.commit()
+            if refinable_rides().count() == 0:
+                eta_refine_scheduled = False
+                return
+    start_eta_refine_timer()
+
+"""
+refinable_rides
+---------------
+Returns a query for the estimated Rides that are still being refined,
+i.e. the api had a route for them, or had none fewer than
+ETA_REFINE_MAX_ATTEMPTS times
+"""
+def refinable_rides():
+    return Ride.query.filter(
+        Ride.eta_estimated == True,
+        Ride.eta_refine_attempts < ETA_REFINE_MAX_ATTEMPTS
+    )
+
+"""
+refine_estimated_rides
+----------------------
+Replaces the estimated etas and addresses of Rides with real ones, one
+Ride at a time in pickup time order, so every Ride is refined after the
+Ride before it in its queue. Stops at the first Ride whose etas are still
+estimated, since the distance matrix api is still unavailable. Rides the
+api has no route for keep their estimates and count an attempt. They are
+tried again next time until they run out of attempts.
+Must be called with the queue tail lock held.
+Returns the number of Rides refined
+"""
+def refine_estimated_rides():
+    ride_ids = [
+        row.id for row in refinable_rides().with_entities(Ride.id)
+            .order_by(Ride.pickup_time, Ride.id)
+    ]
+    refined = 0
+    for ride_id in ride_ids:
+        ride = Ride.query.get(ride_id)
+        if ride is None or not ride.eta_estimated:
+            continue
+        result = refine_ride(ride)
+        if result is None:
+            db.session.rollback()
+            Ride.query.filter_by(id=ride_id).update({
+                Ride.eta_refine_attempts: Ride.eta_refine_attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            continue
+        if not result:
+            db.session.rollback()
+            break
+        db.session.commit()
+        refined += 1
+    return refined
+
+"""
+refine_ride
+-----------
+Recomputes the leg from the previous Ride's dropoff (unless the ride
+was picked up by an idle vehicle), the travel time, and the addresses
+of an estimated :ride:, and shifts every Ride after it in its vehicle's
+queue by however much its dropoff time changed.
+Returns True once refined, False if the etas are still estimated, or
+None if the api has no route for the ride, in which case it is left as is
+"""
+def refine_ride(ride):
+    pickup_loc = (ride.start_latitude, ride.start_longitude)
+    dropoff_loc = (ride.end_latitude, ride.end_longitude)
+    previous_ride = queue_neighbors(ride)[0] if ride.leg_time is not None else None
+    origins, destinations = [pickup_loc], [dropoff_loc]
+    if previous_ride is not None:
+        origins.insert(0, (previous_ride.end_latitude, previous_ride.end_longitude))
+        destinations.insert(0, pickup_loc)
+
+    response = dm_client.query_api(origins, destinations)
+    if response.is_estimated():
+        return False
+    eta = response.get_eta()
+    addresses = response.get_addresses()
+    if eta is None or addresses is None:
+        # the api has no route for the ride. keep the estimate, and
+        # keep it flagged since its times were never checked
+        app.logger.warning('could not refine estimated etas of ride %d', ride.id)
+        return None
+
+    # rides after this one in its vehicle's queue
+    shifted_ride_ids = [
+        row.id for row in Ride.query.with_entities(Ride.id)
+            .filter(Ride.vehicle_id == ride.vehicle_id, Ride.id != ride.id)
+            .filter(or_(
+                Ride.pickup_time > ride.pickup_time,
+                and_(Ride.pickup_time == ride.pickup_time, Ride.id > ride.id)
+            ))
+    ]
+
+    if previous_ride is not None:
+        ride.leg_time = eta[0][0]
+        ride.pickup_time = previous_ride.dropoff_time + timedelta(0, ride.leg_time)
+    ride.travel_time = eta[-1][-1]
+    dropoff_time = ride.pickup_time + timedelta(0, ride.travel_time)
+    shift = int((dropoff_time - ride.dropoff_time).total_seconds())
+    ride.dropoff_time = dropoff_time
+    ride.pickup_address = addresses[0][-1]
+    ride.dropoff_address = addresses[1][-1]
+    ride.eta_estimated = False
+    db.session.flush()
+
+    if shifted_ride_ids and shift:
+        shift_rides(shifted_ride_ids, shift)
+    record_ride_event('rides-refined', ride.id, {'ids': [ride.id] + (shifted_ride_ids if shift else [])})
+    return True
@@ -24,3 +24,96 @@ LOGGING_FILENAME = 'path_to_your_logfile.log'
 # set this to the amount of time db connections can remain
 # idle before being refreshed
 # SQLALCHEMY_POOL_RECYCLE = idle_time_limit_in_seconds
+
+# how new ride requests are placed in a vehicle's queue.
+# 'append' puts them after the last ride in the queue.
+# 'cheapest' puts them wherever they add the least travel time
+RIDE_INSERTION_MODE = 'append'
+
+# number of background threads in each uwsgi worker that compute
+# the etas of ride requests made with POST /api/rides?async=true
+RIDE_WORKER_THREADS = 4
+
+# seconds an async ride request can stay pending before it is failed,
+# e.x. when the worker computing its etas was restarted
+RIDE_REQUEST_TIMEOUT = 120
+
+# where etas come from. 'google' queries the google distancematrix api.
+# 'road_graph' routes on the local road graph file ROAD_GRAPH_FILENAME
+# (built with scripts/build_road_graph.py) without any network access.
+# ROAD_GRAPH_FILENAME defaults to steerclear/static/road_graph/road_graph.json
+DISTANCEMATRIX_BACKEND = 'google'
+ROAD_GRAPH_FILENAME = None
+
+# url of the distancematrix api. None is the google api. point it at
+# scripts/distance_matrix_server.py to run or load test without the api,
+# e.x. 'http://127.0.0.1:8765/maps/api/distancematrix/json'
+DISTANCEMATRIX_BASE_URL = None
+
+# connection pool size, timeouts in seconds, and number of retries
+# of requests to the google distancematrix api. the pool should hold
+# at least as many connections as a uwsgi worker has threads
+DISTANCEMATRIX_POOL_MAXSIZE = 10
+DISTANCEMATRIX_CONNECT_TIMEOUT = 3.05
+DISTANCEMATRIX_READ_TIMEOUT = 10
+DISTANCEMATRIX_MAX_RETRIES = 2
+
+# queries over the distancematrix api's per request limits (25 origins,
+# 25 destinations, 100 elements) are split into tiles that are requested
+# on DISTANCEMATRIX_FETCH_THREADS threads per uwsgi worker at once
+DISTANCEMATRIX_FETCH_THREADS = 4
+
+# concurrent identical distancematrix queries (every location in the same
+# DISTANCEMATRIX_CACHE_GRID cell) always share one request within a uwsgi
+# worker. with DISTANCEMATRIX_COALESCE_WORKERS they are also shared between
+# workers through the 'distancematrix' uwsgi cache
+DISTANCEMATRIX_COALESCE_WORKERS = True
+
+# the circuit breaker opens when DISTANCEMATRIX_BREAKER_FAILURE_RATIO of the
+# last DISTANCEMATRIX_BREAKER_WINDOW distancematrix requests (at least
+# DISTANCEMATRIX_BREAKER_MIN_CALLS) failed or took longer than
+# DISTANCEMATRIX_BREAKER_SLOW_CALL_SECONDS. while it is open no requests are
+# made for DISTANCEMATRIX_BREAKER_COOLDOWN seconds, etas are estimated from
+# straight line distances (DISTANCEMATRIX_ESTIMATE_SPEED meters per second
+# until calibrated with real legs), and rides are flagged eta_estimated.
+# estimated rides are refined every ETA_REFINE_INTERVAL seconds, until the
+# api has had no route for them ETA_REFINE_MAX_ATTEMPTS times
+DISTANCEMATRIX_BREAKER_WINDOW = 20
+DISTANCEMATRIX_BREAKER_MIN_CALLS = 5
+DISTANCEMATRIX_BREAKER_FAILURE_RATIO = 0.5
+DISTANCEMATRIX_BREAKER_SLOW_CALL_SECONDS = 3.0
+DISTANCEMATRIX_BREAKER_COOLDOWN = 30
+DISTANCEMATRIX_ESTIMATE_SPEED = 6.0
+ETA_REFINE_INTERVAL = 30
+ETA_REFINE_MAX_ATTEMPTS = 3
+
+# distance matrix legs and addresses are cached in memory and in the db.
+# locations are rounded to a grid of DISTANCEMATRIX_CACHE_GRID degrees
+# (0.0005 is about 50 meters) so nearby locations share cached legs.
+# DISTANCEMATRIX_CACHE_SIZE legs are kept in memory per uwsgi worker and
+# cached legs are refreshed after DISTANCEMATRIX_CACHE_TTL seconds
+DISTANCEMATRIX_CACHE_GRID = 0.0005
+DISTANCEMATRIX_CACHE_SIZE = 10000
+DISTANCEMATRIX_CACHE_TTL = 86400
+
+# precomputed travel times between cells of a grid over the service area
+# (built with scripts/build_travel_time_grid.py) answer etas before the
+# db cache and the distancematrix api. TRAVEL_TIME_GRID_DIRNAME defaults to
+# steerclear/static/travel_time_grid. cell pairs older than
+# TRAVEL_TIME_GRID_MAX_AGE seconds are stale and go to the api until rebuilt
+TRAVEL_TIME_GRID_DIRNAME = None
+TRAVEL_TIME_GRID_MAX_AGE = 30 * 86400
+
+# the zones of the shapefiles in steerclear/static/shapefiles (the campus map,
+# the steerclear radius, and any others) are compiled into a zone cache file
+# (with scripts/build_zone_cache.py, or on startup whenever a shapefile
+# changed) that every uwsgi worker memory maps. ZONE_CACHE_DIRNAME
+# defaults to steerclear/static/zone_cache
+ZONE_CACHE_DIRNAME = None
+
+# size in degrees of the cells of a bitmap over the zones that answers which
+# zones contain a location without any polygon math, unless a zone boundary
+# crosses its cell. smaller cells answer more locations from the bitmap but
+# take longer to build on startup (0.0005 is about 50 meters and takes
+# about 15ms). None turns the bitmap off. see scripts/bench_zone_lookup.py
+ZONE_RASTER_CELL_SIZE = 0.0005
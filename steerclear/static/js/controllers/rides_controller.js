@@ -29,19 +29,101 @@ app.controller('RidesController', ['$scope', 'RidesService', function($scope, Ri
         }
     }
 
-		updateData = function() {
-	      RidesService.getRides().then(function(data){
-	          for (var i =0; i < data.rides.length; i++){
-	              data.rides[i].pickup_address = data.rides[i].pickup_address || "Start Address Not Found";
-	              data.rides[i].dropoff_address = data.rides[i].dropoff_address || "End Address Not Found";
-	          };
+    $scope.originalRides = [];
+    $scope.rides = [];
+
+    // events that arrive while the queue is being loaded are held back
+    // and applied once it is, so none are lost or applied to a stale queue
+    var loading = false;
+    var pendingEvents = [];
+
+    updateData = function() {
+        loading = true;
+        return RidesService.getRides().then(function(data){
+            for (var i =0; i < data.rides.length; i++){
+                data.rides[i].pickup_address = data.rides[i].pickup_address || "Start Address Not Found";
+                data.rides[i].dropoff_address = data.rides[i].dropoff_address || "End Address Not Found";
+            };
             $scope.originalRides = angular.copy(data.rides);
-	          $scope.filterRides($scope.filter);
-	    	});
+            replayEvents(data.last_event_id);
+            $scope.filterRides($scope.filter);
+            return data;
+        }, function(message){
+            replayEvents(0);
+        });
+    };
+
+    // apply the held back events the loaded queue does not include yet
+    replayEvents = function( last_event_id ) {
+        var events = pendingEvents;
+        pendingEvents = [];
+        loading = false;
+        for (var i = 0; i < events.length; i++){
+            if (parseInt(events[i].lastEventId, 10) > last_event_id){
+                applyEvent(events[i]);
+            }
+        }
+    };
+
+    applyEvent = function( e ) {
+        switch(e.type) {
+            case "ride-created":
+                addRide(JSON.parse(e.data));
+                break;
+            case "ride-deleted":
+                removeRide(JSON.parse(e.data).id);
+                break;
+            // a ride was inserted in front of other rides and pushed back their
+            // times, estimated etas were replaced with real ones, or missed
+            // events are no longer available, so reload the whole queue
+            default:
+                updateData();
+        }
     };
 
-    updateData();
-    setInterval('updateData()', 5000);
+    handleEvent = function( e ) {
+        if (loading) {
+            pendingEvents.push(e);
+        } else {
+            $scope.$apply(function(){ applyEvent(e); });
+        }
+    };
+
+    addRide = function( ride ) {
+        // the loaded queue may already include the ride
+        for (var i = 0; i < $scope.originalRides.length; i++){
+            if ($scope.originalRides[i].id == ride.id){
+                return;
+            }
+        }
+        ride.pickup_address = ride.pickup_address || "Start Address Not Found";
+        ride.dropoff_address = ride.dropoff_address || "End Address Not Found";
+        $scope.originalRides.push(ride);
+        $scope.filterRides($scope.filter);
+    };
+
+    removeRide = function( ride_id ) {
+        $scope.originalRides = $scope.originalRides.filter(function(ride){
+            return ride.id != ride_id;
+        });
+        $scope.filterRides($scope.filter);
+    };
+
+    if (window.EventSource) {
+        // listen for ride queue changes pushed by the server instead of polling.
+        // the stream starts after the last event the loaded queue includes, and
+        // the browser sends Last-Event-ID on reconnect so missed events are replayed
+        updateData().then(function(data){
+            var source = new EventSource("api/rides/stream?last_event_id=" + ((data && data.last_event_id) || 0));
+            var events = ["ride-created", "ride-deleted", "rides-shifted", "rides-refined", "reset"];
+            for (var i = 0; i < events.length; i++){
+                source.addEventListener(events[i], handleEvent);
+            }
+        });
+    } else {
+        updateData();
+        setInterval('updateData()', 5000);
+    }
 
     $scope.gps = function ( dlat, dlong, slat, slong ) {
         $scope.iOS = /iPad|iPhone|iPod/.test(navigator.platform);
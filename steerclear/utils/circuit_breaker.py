@@ -0,0 +1,112 @@
+import threading, time
+from collections import deque
+
+"""
+CircuitBreaker
+--------------
+Tracks the outcome and latency of the last :window: calls to an
+upstream service. Once at least :min_calls: have been made and
+:failure_ratio: of them failed (errors and calls slower than
+:slow_call_seconds: both count as failures) the breaker opens, and
+calls are refused for :cooldown: seconds. After that a single trial
+call is let through. If it succeeds the breaker closes again,
+otherwise it stays open for another cooldown
+"""
+class CircuitBreaker():
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window=20, min_calls=5, failure_ratio=0.5, slow_call_seconds=3.0, cooldown=30):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        # (failed, seconds) of the most recent calls
+        self._calls = deque(maxlen=window)
+        self._state = CircuitBreaker.CLOSED
+        self._opened_at = None
+        self._opened = 0
+
+    """
+    allow
+    -----
+    Returns True if a call may be made right now. While the breaker
+    is half open, only the one trial call is allowed
+    """
+    def allow(self):
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.OPEN and time.time() - self._opened_at >= self.cooldown:
+                self._state = CircuitBreaker.HALF_OPEN
+                return True
+            return False
+
+    """
+    record
+    ------
+    Records the outcome of a call that allow() let through
+
+    :success:   False if the call errored
+    :seconds:   how long the call took
+    """
+    def record(self, success, seconds):
+        failed = not success or seconds > self.slow_call_seconds
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    self._state = CircuitBreaker.CLOSED
+                    self._calls.clear()
+                return
+
+            self._calls.append((failed, seconds))
+            if self._state == CircuitBreaker.CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for call in self._calls if call[0])
+                if failures >= self.failure_ratio * len(self._calls):
+                    self._open()
+
+    """
+    state
+    -----
+    Returns whether the breaker is 'closed', 'open', or 'half_open'
+    """
+    def state(self):
+        return self._state
+
+    """
+    stats
+    -----
+    Returns the breaker's state, the number of times it has opened,
+    and the failure ratio and mean latency in seconds of the recent calls
+    """
+    def stats(self):
+        with self._lock:
+            calls = list(self._calls)
+        return {
+            'state': self._state,
+            'opened': self._opened,
+            'failure_ratio': float(sum(1 for call in calls if call[0])) / len(calls) if calls else None,
+            'latency': sum(call[1] for call in calls) / len(calls) if calls else None
+        }
+
+    """
+    reset
+    -----
+    Closes the breaker and forgets every recorded call
+    """
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._state = CircuitBreaker.CLOSED
+            self._opened_at = None
+            self._opened = 0
+
+    def _open(self):
+        self._state = CircuitBreaker.OPEN
+        self._opened_at = time.time()
+        self._opened += 1
@@ -0,0 +1,169 @@
+import json, random, threading, time, urlparse
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from steerclear.utils.eta import DMResponse, DISTANCEMATRIX_MAX_ELEMENTS, DISTANCEMATRIX_MAX_LOCATIONS
+from steerclear.utils.eta_estimate import haversine_matrix
+
+# path the server answers distancematrix queries on, same as the google api
+DISTANCEMATRIX_PATH = '/maps/api/distancematrix/json'
+
+"""
+HaversineDMClient
+-----------------
+Duration model for the stand-in server that answers queries like
+SteerClearDMClient.query_api() does, with distances of :detour: times
+the straight line distance driven at :speed: meters per second
+"""
+class HaversineDMClient():
+
+    def __init__(self, speed=6.0, detour=1.3):
+        self.speed = speed
+        self.detour = detour
+
+    def query_api(self, origins, destinations):
+        meters = haversine_matrix(origins, destinations) * self.detour
+        return DMResponse({
+            u'status': u'OK',
+            u'origin_addresses': [u'%f,%f' % tuple(point) for point in origins],
+            u'destination_addresses': [u'%f,%f' % tuple(point) for point in destinations],
+            u'rows': [
+                {u'elements': [
+                    {
+                        u'status': u'OK',
+                        u'duration': {u'value': int(round(value / self.speed))},
+                        u'distance': {u'value': int(round(value))}
+                    }
+                    for value in row
+                ]}
+                for row in meters
+            ]
+        })
+
+"""
+DistanceMatrixServer
+--------------------
+Local HTTP stand-in for the google distancematrix api, for load testing
+and working offline. Answers GET requests to DISTANCEMATRIX_PATH with
+responses in the api's json format, computed by a duration model, after
+a configurable latency and with configurable error rates. Point the
+app at it with the DISTANCEMATRIX_BASE_URL setting
+"""
+class DistanceMatrixServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    """
+    Creates a new DistanceMatrixServer listening on :address:
+
+    :model:                 client whose query_api() computes the responses
+                            (e.x. HaversineDMClient or RoadGraphDMClient)
+    :latency:               seconds every response is delayed by
+    :jitter:                up to this many more seconds are added at random
+    :error_rate:            fraction of requests answered with a 500
+    :over_query_limit_rate: fraction of requests answered with OVER_QUERY_LIMIT
+    :seed:                  seed of the random errors and jitter
+    """
+    def __init__(self, address, model, latency=0.0, jitter=0.0, error_rate=0.0, over_query_limit_rate=0.0, seed=None):
+        HTTPServer.__init__(self, address, DistanceMatrixHandler)
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.over_query_limit_rate = over_query_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    """
+    base_url
+    --------
+    Returns the url to set DISTANCEMATRIX_BASE_URL to
+    """
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d%s' % (host, port, DISTANCEMATRIX_PATH)
+
+    """
+    draw
+    ----
+    Counts a request and returns (seconds to delay it by, what to answer it with),
+    where what to answer with is 'error', 'over_query_limit', or 'ok'
+    """
+    def draw(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.errors += 1
+                return delay, 'error'
+            if roll < self.error_rate + self.over_query_limit_rate:
+                self.errors += 1
+                return delay, 'over_query_limit'
+            return delay, 'ok'
+
+"""
+DistanceMatrixHandler
+---------------------
+Keep-alive request handler of the DistanceMatrixServer
+"""
+class DistanceMatrixHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != DISTANCEMATRIX_PATH:
+            self._send(404, {'status': 'NOT_FOUND'})
+            return
+
+        delay, outcome = self.server.draw()
+        if delay > 0:
+            time.sleep(delay)
+        if outcome == 'error':
+            self._send(500, {'status': 'UNKNOWN_ERROR'})
+            return
+        if outcome == 'over_query_limit':
+            self._send(200, {'status': 'OVER_QUERY_LIMIT', 'rows': []})
+            return
+
+        query = urlparse.parse_qs(url.query)
+        origins = parse_locations(query.get('origins', [''])[0])
+        destinations = parse_locations(query.get('destinations', [''])[0])
+        if not origins or not destinations:
+            self._send(200, {'status': 'INVALID_REQUEST', 'rows': []})
+        elif max(len(origins), len(destinations)) > DISTANCEMATRIX_MAX_LOCATIONS:
+            self._send(200, {'status': 'MAX_DIMENSIONS_EXCEEDED', 'rows': []})
+        elif len(origins) * len(destinations) > DISTANCEMATRIX_MAX_ELEMENTS:
+            self._send(200, {'status': 'MAX_ELEMENTS_EXCEEDED', 'rows': []})
+        else:
+            response = self.server.model.query_api(origins, destinations)
+            self._send(200, response.data or {'status': 'INVALID_REQUEST', 'rows': []})
+
+    def _send(self, status, data):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+"""
+parse_locations
+---------------
+Parses the '|' separated lat,long pairs of an origins or
+destinations parameter. Returns None if any pair is malformed
+"""
+def parse_locations(value):
+    locations = []
+    for pair in value.split('|'):
+        try:
+            latitude, longitude = pair.split(',')
+            locations.append((float(latitude), float(longitude)))
+        except ValueError:
+            return None
+    return locations
@@ -1,23 +1,363 @@
-import requests, urllib
+import requests, urllib, os, threading, hashlib, json, time
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from array import array
+
+from steerclear.utils.single_flight import SingleFlight
+from steerclear.utils.circuit_breaker import CircuitBreaker
+from steerclear.utils.workers import WorkerPool
+
+# uwsgi is only importable when the app is running inside a uwsgi worker.
+# when it is available, workers share the responses of identical
+# in-flight queries through the uwsgi cache
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
 
 # Base url for the google distancematrix api
 DISTANCEMATRIX_BASE_URL = 'https://maps.googleapis.com/maps/api/distancematrix/json'
 
+# per request limits of the google distancematrix api. queries over
+# them are split into tiles by SteerClearDMClient. the url limit is
+# never reached by a tile within the other limits, but is checked anyway
+DISTANCEMATRIX_MAX_ELEMENTS = 100
+DISTANCEMATRIX_MAX_LOCATIONS = 25
+DISTANCEMATRIX_MAX_URL_LENGTH = 8192
+
+# name of the uwsgi cache (see cache2 in steerclear.ini)
+# responses are shared between uwsgi workers through
+UWSGI_CACHE_NAME = 'distancematrix'
+
+# seconds a shared response stays in the uwsgi cache after its request
+# finishes, so workers waiting on it have time to pick it up
+SHARED_RESPONSE_TTL = 2
+
+# seconds between checks for a response another worker is requesting
+SHARED_RESPONSE_POLL = 0.01
+
+# top level response statuses that mean the api itself is failing,
+# as opposed to the query being bad
+UPSTREAM_ERROR_STATUSES = set([u'OVER_QUERY_LIMIT', u'UNKNOWN_ERROR'])
+
+# element statuses of a distancematrix response, indexed by the
+# code DMResponse stores per element. INVALID marks elements that
+# have an unknown status, or are OK but have no duration
+ELEMENT_STATUSES = (u'OK', u'NOT_FOUND', u'ZERO_RESULTS', u'MAX_ROUTE_LENGTH_EXCEEDED', u'INVALID')
+ELEMENT_STATUS_CODES = dict((status, code) for code, status in enumerate(ELEMENT_STATUSES))
+ELEMENT_OK = ELEMENT_STATUS_CODES[u'OK']
+ELEMENT_INVALID = ELEMENT_STATUS_CODES[u'INVALID']
 
+# duration of an element that has none
+MISSING_VALUE = -1
+
+
+"""
+SteerClearDMClient
+------------------
+Client for the google distancematrix api. Requests go through a
+keep-alive requests.Session per process, so consecutive queries
+reuse the same TCP and TLS connection instead of handshaking again.
+Concurrent identical queries (origins and destinations in the same
+grid cells, in the same order) share one in-flight request and its DMResponse.
+With a CircuitBreaker, requests stop being made while the api is
+failing or slow, and with an estimator, queries the api can not answer
+get estimated etas instead (see DMResponse.is_estimated()).
+Queries over the api's per request limits are split into tiles
+that are requested concurrently and stitched back together
+"""
 class SteerClearDMClient():
 
+    """
+    Creates a new SteerClearDMClient
+
+    :pool_maxsize:      maximum number of connections kept open to the
+                        api. should be at least the number of threads
+                        that query the api at once
+    :connect_timeout:   seconds to wait for a connection to the api
+    :read_timeout:      seconds to wait for the api to respond
+    :max_retries:       number of times a failed connection, read,
+                        or 5xx response is retried
+    :coalesce_workers:  also share in-flight queries between uwsgi
+                        workers, not just between threads of a worker
+    :coalesce_grid:     size in degrees of the grid cells locations are
+                        quantized to when matching in-flight queries.
+                        None only matches the same locations (to the 6
+                        decimal places they are sent to the api with)
+    :breaker:           optional CircuitBreaker tracking the api's errors and latency
+    :estimator:         optional HaversineEstimator used when the api fails
+    :fetch_threads:     number of threads the tiles of big queries are
+                        requested on. should be at most pool_maxsize
+    :base_url:          url of the api. defaults to DISTANCEMATRIX_BASE_URL,
+                        e.x. the url of a local DistanceMatrixServer
+    """
+    def __init__(self, pool_maxsize=10, connect_timeout=3.05, read_timeout=10, max_retries=2, coalesce_workers=True,
+                 breaker=None, estimator=None, fetch_threads=4, base_url=None, coalesce_grid=None):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.coalesce_workers = coalesce_workers
+        self.coalesce_grid = coalesce_grid
+        self.breaker = breaker
+        self.estimator = estimator
+        self.fetch_threads = fetch_threads
+        self.base_url = base_url
+        self._fetch_pool = WorkerPool(fetch_threads)
+        self._lock = threading.Lock()
+        # guards the counters below, which every fetch thread updates
+        self._counter_lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._session = None
+        self._pid = None
+        self._requests = 0
+        self._errors = 0
+        self._worker_coalesced = 0
+        self._short_circuited = 0
 
+    """
+    query_api
+    ---------
+    Queries the eta from every origin to every destination.
+    Returns a DMResponse, which holds no data if the
+    request failed, timed out, or got a bad response. If the
+    client has an estimator, failed requests (but not bad queries)
+    get an estimated DMResponse instead. Queries over the api's
+    limits are split into concurrent tile requests, and fail if any
+    tile fails
+    """
     def query_api(self, origins, destinations):
         # build query string and url
         query = self._format_query(origins, destinations)
         url = self._build_url(query)
 
-        # make request and check for bad response
-        response = requests.get(url)
-        if response.status_code != requests.codes.ok:
-            return DMResponse(None)
-        # return response object
-        return DMResponse(response.json())
+        # too big for one request. request it in tiles
+        if len(origins) * len(destinations) > DISTANCEMATRIX_MAX_ELEMENTS or \
+                max(len(origins), len(destinations)) > DISTANCEMATRIX_MAX_LOCATIONS or \
+                len(url) > DISTANCEMATRIX_MAX_URL_LENGTH:
+            rows, columns = tile_shape(len(origins), len(destinations))
+            tiles = [
+                (origins[i:i + rows], destinations[j:j + columns])
+                for i in xrange(0, len(origins), rows)
+                for j in xrange(0, len(destinations), columns)
+            ]
+            responses = self.query_many(tiles)
+            return stitch_responses(tiles, responses, (len(destinations) + columns - 1) // columns)
+
+        # identical concurrent queries in this process share one request
+        self._get_session()
+        key = self._flight_key(origins, destinations)
+        response, failed = self._flight.do(key, lambda: self._query(origins, destinations, url, key))
+
+        # the api is down, failing, or too slow. estimate the etas instead
+        if failed and self.estimator is not None:
+            return self.estimator.response(origins, destinations)
+        return response
+
+    """
+    query_many
+    ----------
+    Runs query_api() for every (origins, destinations) pair of :queries:
+    concurrently on the client's fetch threads, and returns the
+    DMResponses in the same order
+    """
+    def query_many(self, queries):
+        if len(queries) < 2 or self.fetch_threads < 2:
+            return [self.query_api(origins, destinations) for origins, destinations in queries]
+        return self._fetch_pool.map(lambda query: self.query_api(*query), queries)
+
+    """
+    available
+    ---------
+    Returns False while the circuit breaker is keeping requests from being made
+    """
+    def available(self):
+        return self.breaker is None or self.breaker.state() == CircuitBreaker.CLOSED
+
+    """
+    stats
+    -----
+    Returns counters of this process' requests to the api.
+    Every new connection costs a TCP and TLS handshake, so
+    'reused' should be close to 'requests' once the pool is warm
+    * requests - queries made
+    * errors - queries that failed or got a bad response
+    * connections - connections opened to the api
+    * reused - requests the connection pool sent over an already
+    open connection (retries count as requests too)
+    * coalesced - queries that shared an identical in-flight query's
+    response instead of making their own request
+    * breaker_* - the circuit breaker's state, how many times it
+    opened, and the failure ratio and mean latency of recent requests
+    * short_circuited - requests not made because the breaker was open
+    * estimates - queries answered with estimated etas
+    """
+    def stats(self):
+        connections, reused = 0, 0
+        session = self._session if self._pid == os.getpid() else None
+        if session is not None:
+            pools = session.get_adapter(self._base_url()).poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    # every connection the pool opens carries its first request
+                    connections += pool.num_connections
+                    reused += max(pool.num_requests - pool.num_connections, 0)
+        with self._counter_lock:
+            stats = {
+                'requests': self._requests,
+                'errors': self._errors,
+                'connections': connections,
+                'reused': reused,
+                'coalesced': self._flight.shared + self._worker_coalesced
+            }
+            short_circuited = self._short_circuited
+        if self.breaker is not None:
+            breaker = self.breaker.stats()
+            stats.update({
+                'breaker_state': breaker['state'],
+                'breaker_opened': breaker['opened'],
+                'breaker_failure_ratio': breaker['failure_ratio'],
+                'breaker_latency': breaker['latency'],
+                'short_circuited': short_circuited
+            })
+        if self.estimator is not None:
+            stats.update(self.estimator.stats())
+        return stats
+
+    """
+    _flight_key
+    -----------
+    Returns the key concurrent queries are coalesced on: the grid
+    cells of the origins and destinations, in order. Queries with
+    locations a few meters apart share a key, unlike their urls
+    """
+    def _flight_key(self, origins, destinations):
+        scale = 1.0 / self.coalesce_grid if self.coalesce_grid else 1e6
+        cell = lambda point: (int(round(point[0] * scale)), int(round(point[1] * scale)))
+        return tuple(map(cell, origins)), tuple(map(cell, destinations))
+
+    """
+    _query
+    ------
+    Returns (DMResponse, failed) for the query :url:, where failed is
+    True if the request failed rather than the api rejecting the query.
+    Real etas are used to calibrate the estimator
+    """
+    def _query(self, origins, destinations, url, key):
+        data = self._fetch(url, key)
+        if data is None:
+            return DMResponse(None), True
+        response = DMResponse(data)
+        if self.estimator is not None:
+            self.estimator.calibrate(origins, destinations, response.get_eta())
+        return response, False
+
+    """
+    _fetch
+    ------
+    Returns the json response to the query :url:, or None if the
+    request failed. Under uwsgi, if another worker is already making
+    a request with the same _flight_key() :key:, waits for its response instead
+    """
+    def _fetch(self, url, key):
+        if uwsgi is None or not self.coalesce_workers:
+            return self._request(url)
+
+        key = hashlib.md5(repr(key)).hexdigest()
+        inflight_key, response_key = 'inflight:' + key, 'response:' + key
+
+        # cache_set only succeeds if no other worker has claimed the request
+        if uwsgi.cache_set(inflight_key, str(os.getpid()), int(sum(self.timeout)) + 1, UWSGI_CACHE_NAME):
+            try:
+                data = self._request(url)
+                if data is not None:
+                    uwsgi.cache_update(response_key, json.dumps(data), SHARED_RESPONSE_TTL, UWSGI_CACHE_NAME)
+            finally:
+                uwsgi.cache_del(inflight_key, UWSGI_CACHE_NAME)
+            return data
+
+        # wait for the worker making the request to share its response
+        deadline = time.time() + sum(self.timeout)
+        while time.time() < deadline and uwsgi.cache_exists(inflight_key, UWSGI_CACHE_NAME):
+            time.sleep(SHARED_RESPONSE_POLL)
+        body = uwsgi.cache_get(response_key, UWSGI_CACHE_NAME)
+        if body is None:
+            # the other worker's request failed or timed out
+            return self._request(url)
+        with self._counter_lock:
+            self._worker_coalesced += 1
+        return json.loads(body)
+
+    """
+    _request
+    --------
+    Requests the query :url: from the api. Returns the json
+    response, or None if the request failed or got a bad response
+    """
+    def _request(self, url):
+        # the api has been failing. do not wait on it again until the breaker lets us
+        if self.breaker is not None and not self.breaker.allow():
+            with self._counter_lock:
+                self._short_circuited += 1
+            return None
+
+        session = self._get_session()
+        with self._counter_lock:
+            self._requests += 1
+        start = time.time()
+        data = None
+        try:
+            response = session.get(url, timeout=self.timeout)
+            if response.status_code == requests.codes.ok:
+                data = response.json()
+                # anything but a json object is a bad response
+                if not isinstance(data, dict) or data.get(u'status') in UPSTREAM_ERROR_STATUSES:
+                    data = None
+        except (requests.exceptions.RequestException, ValueError):
+            data = None
+        finally:
+            # the outcome is recorded even if something unexpected was
+            # raised. an unrecorded trial call leaves the breaker half open
+            if data is None:
+                with self._counter_lock:
+                    self._errors += 1
+            if self.breaker is not None:
+                self.breaker.record(data is not None, time.time() - start)
+        return data
+
+    """
+    _get_session
+    ------------
+    Returns this process' requests.Session, creating it on first use.
+    Open connections must not be shared with forked uwsgi workers,
+    so a forked process starts its own session
+    """
+    def _get_session(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    retries = Retry(
+                        total=self.max_retries,
+                        backoff_factor=0.1,
+                        status_forcelist=[500, 502, 503, 504]
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=retries
+                    )
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._flight = SingleFlight()
+                    self._requests = 0
+                    self._errors = 0
+                    self._worker_coalesced = 0
+                    self._short_circuited = 0
+                    self._pid = pid
+        return self._session
 
     """
     _format_query
@@ -41,11 +381,14 @@ class SteerClearDMClient():
     """
     _build_url
     ---------
-    Takes a query of key/value pairs and returns the
-    correctly formatted google distancematrix api url
+    Takes a query of key/value pairs and returns the correctly
+    formatted distancematrix api url, on the client's base url
     """
     def _build_url(self, query):
-        return DISTANCEMATRIX_BASE_URL + '?' + urllib.urlencode(query)
+        return self._base_url() + '?' + urllib.urlencode(query)
+
+    def _base_url(self):
+        return self.base_url or DISTANCEMATRIX_BASE_URL
 
 """
 DMResponse
@@ -63,6 +406,12 @@ class DMResponse():
             self.data = None
         else:
             self.data = data
+        # the rows are parsed into a flat array the first time they are needed
+        self._parsed = False
+        self._shape = None
+        self._durations = None
+        self._statuses = None
+        self._bad_elements = 0
 
     def __eq__(self, other):
         return self.data == other.data
@@ -72,65 +421,72 @@ class DMResponse():
     -------
     Return the list of eta data values
     Response object looks like this: https://maps.googleapis.com/maps/api/distancematrix/json?origins=37.272042,-76.714027|37.273485,-76.719628&destinations=37.273485,-76.719628|37.280893,%20-76.719691
-    Returns a list of lists of all of the eta values
+    Returns a list of lists of all of the eta values, or None
+    if the response is malformed or any element is not OK
     """
     def get_eta(self):
-        # bad response
-        if not self.data:
+        self._parse()
+        if self._shape is None or self._bad_elements:
             return None
+        rows, columns = self._shape
+        durations = self._durations
+        return [durations[r * columns:(r + 1) * columns].tolist() for r in xrange(rows)]
 
-        # get rows or return None
-        rows = self.data.get(u'rows', None)
-        if rows is None:
-            print 'rows'
+    """
+    get_shape
+    ---------
+    Returns the (origins, destinations) size of the
+    matrix, or None if the response is malformed
+    """
+    def get_shape(self):
+        self._parse()
+        return self._shape
+
+    """
+    eta_at
+    ------
+    Returns the eta in seconds from origin :i: to destination :j:,
+    or None if the response is malformed or that element is not OK
+    """
+    def eta_at(self, i, j):
+        index = self._index(i, j)
+        if index is None or self._statuses[index] != ELEMENT_OK:
+            return None
+        return self._durations[index]
+
+    """
+    distance_at
+    -----------
+    Returns the distance in meters from origin :i: to destination :j:, or
+    None if the response is malformed or that element has no distance
+    """
+    def distance_at(self, i, j):
+        index = self._index(i, j)
+        if index is None or self._statuses[index] != ELEMENT_OK:
             return None
+        # distances are rarely needed, so they are read from the element instead of parsed
+        distance = self.data[u'rows'][i][u'elements'][j].get(u'distance', None)
+        return distance.get(u'value', None) if distance is not None else None
 
-        # Get all of the eta values in the response
-        eta_list = []
-        for row in rows:
-            # get elements
-            elements = row.get(u'elements', None)
-            if elements is None:
-                print 'elements'
-                return None
-
-            eta = []
-            # for every element, get the duration
-            for element in elements:
-                # if bad status, return None
-                status = element.get(u'status', u'')
-                if status != u'OK':
-                    print 'status'
-                    return None
-
-                # get duration or return None
-                duration = element.get(u'duration', None)
-                if duration is None:
-                    print 'duration'
-                    return None
-
-                # get eta value or return None
-                value = duration.get(u'value', None)
-                if value is None:
-                    print 'value'
-                    return None
-
-                # append to current list of eta values
-                eta.append(value)
-
-            # append list of eta values
-            eta_list.append(eta)
-
-        # some part of the response was bad
-        if eta_list == [] or [] in eta_list:
+    """
+    status_at
+    ---------
+    Returns the status string of the element from origin :i: to
+    destination :j: (e.x. u'OK' or u'ZERO_RESULTS'), or None if the
+    response is malformed. OK elements without a duration are u'INVALID'
+    """
+    def status_at(self, i, j):
+        index = self._index(i, j)
+        if index is None:
             return None
-        return eta_list
+        return ELEMENT_STATUSES[self._statuses[index]]
 
     """
     get_addresses
     -------------
     Return the origin and destination addresses field in the response
-    as a tuple of lists
+    as a tuple of lists. Addresses are read straight from the response
+    when asked for and are never part of parsing the rows
     """
     def get_addresses(self):
         # bad response
@@ -145,6 +501,232 @@ class DMResponse():
 
         return (origin_addresses, destination_addresses)
 
+    """
+    is_estimated
+    ------------
+    Returns True if the etas are estimates made while the
+    distancematrix api was unavailable, rather than real etas
+    """
+    def is_estimated(self):
+        return bool(self.data and self.data.get(u'estimated', False))
+
+    """
+    _index
+    ------
+    Returns the index of element i, j in the flat arrays,
+    or None if the response is malformed
+    """
+    def _index(self, i, j):
+        self._parse()
+        if self._shape is None:
+            return None
+        rows, columns = self._shape
+        if not 0 <= i < rows or not 0 <= j < columns:
+            raise IndexError('element (%d, %d) is outside the %dx%d matrix' % (i, j, rows, columns))
+        return i * columns + j
+
+    """
+    _parse
+    ------
+    Parses the rows of the response once into a flat row major array
+    of durations and a bytearray of element status codes. A response
+    can be shared by several threads, so _parsed is only set once the
+    parsed rows are all in place; threads that get here first just
+    parse the same rows again
+    """
+    def _parse(self):
+        if self._parsed:
+            return
+        parsed = self._parse_rows()
+        if parsed is not None:
+            self._shape, self._durations, self._statuses, self._bad_elements = parsed
+        self._parsed = True
+
+    """
+    _parse_rows
+    -----------
+    Returns the (shape, durations, statuses, bad_elements) of the rows
+    of the response, or None if the response is malformed: there are
+    no rows, a row has no elements, or the rows are not all the same length
+    """
+    def _parse_rows(self):
+        rows = self.data.get(u'rows', None) if self.data else None
+        if not rows:
+            return None
+        matrix = [row.get(u'elements', None) for row in rows]
+        if not matrix[0] or any(elements is None or len(elements) != len(matrix[0]) for elements in matrix):
+            return None
+        size = len(matrix) * len(matrix[0])
+
+        # fast path: every element is OK and has an integer duration
+        durations = None
+        try:
+            durations = array('i', [
+                element[u'duration'][u'value']
+                for row in matrix for element in row if element.get(u'status', u'') == u'OK'
+            ])
+        except (KeyError, TypeError):
+            pass
+        if durations is not None and len(durations) == size:
+            statuses = bytearray(size)
+            bad_elements = 0
+
+        # slow path: check every element on its own
+        else:
+            durations = array('i', [MISSING_VALUE]) * size
+            statuses = bytearray(size)
+            bad_elements = 0
+            elements = (element for row in matrix for element in row)
+            for index, element in enumerate(elements):
+                status = ELEMENT_STATUS_CODES.get(element.get(u'status', u''), ELEMENT_INVALID)
+                if status == ELEMENT_OK:
+                    duration = element.get(u'duration', None)
+                    value = duration.get(u'value', None) if duration is not None else None
+                    if value is None:
+                        status = ELEMENT_INVALID
+                    else:
+                        durations[index] = int(value)
+                if status != ELEMENT_OK:
+                    statuses[index] = status
+                    bad_elements += 1
+
+        return (len(matrix), len(matrix[0])), durations, statuses, bad_elements
+
+"""
+tile_shape
+----------
+Returns the (origins, destinations) size of the tiles that split an
+origins x destinations matrix into the fewest requests within the api's
+limits of DISTANCEMATRIX_MAX_LOCATIONS origins and destinations and
+DISTANCEMATRIX_MAX_ELEMENTS elements per request
+* needed - optional function (i, j) -> bool of whether the eta from
+origin i to destination j is needed. only tiles with a needed element
+are counted, and ties are broken by the fewest elements requested
+"""
+def tile_shape(num_origins, num_destinations, needed=None):
+    if needed is not None:
+        cells = [(i, j) for i in xrange(num_origins) for j in xrange(num_destinations) if needed(i, j)]
+    best = None
+    for rows in xrange(1, min(num_origins, DISTANCEMATRIX_MAX_LOCATIONS) + 1):
+        columns = min(num_destinations, DISTANCEMATRIX_MAX_LOCATIONS, DISTANCEMATRIX_MAX_ELEMENTS // rows)
+        if needed is None:
+            cost = ((num_origins + rows - 1) // rows) * ((num_destinations + columns - 1) // columns)
+        else:
+            tiles = set((i // rows, j // columns) for i, j in cells)
+            elements = sum(min(rows, num_origins - a * rows) * min(columns, num_destinations - b * columns)
+                           for a, b in tiles)
+            cost = (len(tiles), elements)
+        if best is None or cost < best[0]:
+            best = (cost, rows, columns)
+    return best[1], best[2]
+
+"""
+stitch_responses
+----------------
+Stitches the DMResponses of the tiles of a matrix back into one DMResponse
+of the whole matrix. :tiles: are the (origins, destinations) of every
+tile in row major order, with :tiles_per_row: tiles across the matrix.
+Returns a DMResponse with no data if any tile failed or is not the size
+it was asked for. The whole matrix is estimated if any tile is, and has
+no addresses if any tile has none
+"""
+def stitch_responses(tiles, responses, tiles_per_row):
+    for (origins, destinations), response in zip(tiles, responses):
+        if response.get_shape() != (len(origins), len(destinations)):
+            return DMResponse(None)
+
+    rows = []
+    origin_addresses, destination_addresses = [], []
+    has_addresses = True
+    for band in xrange(0, len(responses), tiles_per_row):
+        band_responses = responses[band:band + tiles_per_row]
+        # the elements of each row of the band, tile by tile
+        for r in xrange(band_responses[0].get_shape()[0]):
+            elements = []
+            for response in band_responses:
+                elements.extend(response.data[u'rows'][r][u'elements'])
+            rows.append({u'elements': elements})
+
+        for response in band_responses:
+            addresses = response.get_addresses()
+            has_addresses = has_addresses and addresses is not None and \
+                map(len, addresses) == list(response.get_shape())
+        if has_addresses:
+            origin_addresses.extend(band_responses[0].get_addresses()[0])
+            if band == 0:
+                for response in band_responses:
+                    destination_addresses.extend(response.get_addresses()[1])
+
+    data = {u'status': u'OK', u'rows': rows}
+    if has_addresses:
+        data[u'origin_addresses'] = origin_addresses
+        data[u'destination_addresses'] = destination_addresses
+    if any(response.is_estimated() for response in responses):
+        data[u'estimated'] = True
+    return DMResponse(data)
+
+"""
+query_matrix
+------------
+Queries the eta between every origin and destination. The whole matrix
+is handed to the client's query_api(), which splits it within the api's
+limits. When only some etas are :needed:, the matrix is split into tiles
+of tile_shape() instead and tiles without a needed element are skipped.
+Returns (eta, addresses, estimated) where eta and addresses are shaped
+like DMResponse.get_eta() and DMResponse.get_addresses() for the whole
+matrix and estimated is True if any tile was answered with
+estimated etas, or None if the query or any tile fails.
+* client - SteerClearDMClient used to make the queries. clients
+with query_many() get every tile at once to run concurrently
+* needed - optional function (i, j) -> bool of whether the eta from
+origin i to destination j is needed. tiles without a needed element
+are never requested and their etas and addresses are left as None
+"""
+def query_matrix(client, origins, destinations, needed=None):
+    if needed is None:
+        response = client.query_api(origins, destinations)
+        eta, addresses = response.get_eta(), response.get_addresses()
+        if eta is None or addresses is None:
+            return None
+        return eta, addresses, response.is_estimated()
+
+    eta = [[None] * len(destinations) for _ in origins]
+    origin_addresses = [None] * len(origins)
+    destination_addresses = [None] * len(destinations)
+    estimated = False
+
+    # the corners of every tile with a needed element
+    corners = []
+    if origins and destinations:
+        size_i, size_j = tile_shape(len(origins), len(destinations), needed)
+        for i in xrange(0, len(origins), size_i):
+            rows = range(i, min(i + size_i, len(origins)))
+            for j in xrange(0, len(destinations), size_j):
+                columns = range(j, min(j + size_j, len(destinations)))
+                if any(needed(r, c) for r in rows for c in columns):
+                    corners.append((i, j))
+
+    # query the tiles, concurrently if the client can
+    tiles = [(origins[i:i + size_i], destinations[j:j + size_j]) for i, j in corners]
+    if hasattr(client, 'query_many'):
+        responses = client.query_many(tiles)
+    else:
+        responses = [client.query_api(*tile) for tile in tiles]
+
+    # copy the etas and addresses of every tile into the matrix
+    for (i, j), response in zip(corners, responses):
+        tile_eta = response.get_eta()
+        tile_addresses = response.get_addresses()
+        if tile_eta is None or tile_addresses is None:
+            return None
+        for r in xrange(i, min(i + size_i, len(origins))):
+            eta[r][j:j + size_j] = tile_eta[r - i]
+        origin_addresses[i:i + size_i] = tile_addresses[0]
+        destination_addresses[j:j + size_j] = tile_addresses[1]
+        estimated = estimated or response.is_estimated()
+
+    return eta, (origin_addresses, destination_addresses), estimated
+
 """
 time_between_locations
 ------------------
@@ -0,0 +1,115 @@
+import threading
+import numpy as np
+
+from steerclear.utils.eta import DMResponse
+
+# mean radius of the earth in meters
+EARTH_RADIUS = 6371000.0
+
+# legs shorter than this many meters are too dominated by
+# stops and turns to calibrate the estimator's speed with
+MIN_CALIBRATION_METERS = 200.0
+
+"""
+haversine_matrix
+----------------
+Returns a (len(origins), len(destinations)) array of the great
+circle distance in meters from every origin to every destination
+"""
+def haversine_matrix(origins, destinations):
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+    lat1, lng1 = origins[:, 0, np.newaxis], origins[:, 1, np.newaxis]
+    lat2, lng2 = destinations[np.newaxis, :, 0], destinations[np.newaxis, :, 1]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+"""
+HaversineEstimator
+------------------
+Estimates travel times as the straight line distance divided by an
+effective speed, for when the distance matrix api is unavailable.
+The speed starts out at :speed: meters per second and, once
+:min_samples: real legs have been seen with calibrate(), is the total
+straight line distance over the total travel time of those legs, so
+it accounts for how much roads wind and how fast traffic moves
+"""
+class HaversineEstimator():
+
+    def __init__(self, speed=6.0, min_samples=20):
+        self.default_speed = speed
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = 0
+        self._meters = 0.0
+        self._seconds = 0.0
+        self._estimates = 0
+
+    """
+    speed
+    -----
+    Returns the effective speed in meters per second estimates are made with
+    """
+    def speed(self):
+        if self._samples < self.min_samples or self._seconds <= 0:
+            return self.default_speed
+        return self._meters / self._seconds
+
+    """
+    estimate
+    --------
+    Returns a (len(origins), len(destinations)) int array of
+    estimated travel times in seconds
+    """
+    def estimate(self, origins, destinations):
+        return np.rint(haversine_matrix(origins, destinations) / self.speed()).astype(np.int64)
+
+    """
+    calibrate
+    ---------
+    Adds the real travel times :eta: (as returned by
+    DMResponse.get_eta()) between origins and destinations
+    to the samples the effective speed is computed from
+    """
+    def calibrate(self, origins, destinations, eta):
+        if not eta:
+            return
+        meters = haversine_matrix(origins, destinations)
+        seconds = np.array(eta, dtype=np.float64)
+        usable = (meters >= MIN_CALIBRATION_METERS) & (seconds > 0)
+        with self._lock:
+            self._samples += int(usable.sum())
+            self._meters += float(meters[usable].sum())
+            self._seconds += float(seconds[usable].sum())
+
+    """
+    response
+    --------
+    Returns a DMResponse of estimated travel times, flagged as estimated.
+    Addresses are the coordinates of the locations
+    """
+    def response(self, origins, destinations):
+        with self._lock:
+            self._estimates += 1
+        eta = self.estimate(origins, destinations)
+        return DMResponse({
+            u'status': u'OK',
+            u'estimated': True,
+            u'origin_addresses': [u'%f,%f' % tuple(point) for point in origins],
+            u'destination_addresses': [u'%f,%f' % tuple(point) for point in destinations],
+            u'rows': [
+                {u'elements': [{u'status': u'OK', u'duration': {u'value': int(value)}} for value in row]}
+                for row in eta
+            ]
+        })
+
+    """
+    stats
+    -----
+    Returns the number of estimates made and the speed they are made with
+    """
+    def stats(self):
+        return {
+            'estimates': self._estimates,
+            'estimate_speed': self.speed()
+        }
@@ -0,0 +1,40 @@
+"""
+cheapest_insertion
+------------------
+Finds where in a vehicle's queue a new ride adds the least travel time.
+Runs in O(n) for a queue of n rides.
+
+:legs:          legs[k] is the existing travel time in seconds from the
+                dropoff of ride k to the pickup of ride k+1 (n-1 values)
+:to_pickup:     to_pickup[k] is the travel time in seconds from the
+                dropoff of ride k to the new ride's pickup (n values). May
+                be None where from_dropoff[k + 1] is None, since the new
+                ride can not go there anyway
+:from_dropoff:  from_dropoff[k] is the travel time in seconds from the
+                new ride's dropoff to the pickup of ride k (n values). None
+                if the new ride may not be placed in front of ride k
+                (e.x. ride k was already picked up)
+:travel_time:   travel time in seconds of the new ride
+
+Returns (k, cost) where the new ride goes right after ride k and cost
+is the travel time in seconds it adds to the queue. If the new ride is not
+appended, cost is also how much every ride after it is pushed back.
+Returns None if the queue is empty
+"""
+def cheapest_insertion(legs, to_pickup, from_dropoff, travel_time):
+    n = len(to_pickup)
+    if n == 0:
+        return None
+
+    # appending after the last ride only adds the trip to and of the new ride
+    best = (n - 1, to_pickup[n - 1] + travel_time)
+
+    # inserting between ride k and ride k+1 replaces their leg with a
+    # detour through the new ride's pickup and dropoff
+    for k in xrange(n - 1):
+        if from_dropoff[k + 1] is None:
+            continue
+        cost = to_pickup[k] + travel_time + from_dropoff[k + 1] - legs[k]
+        if cost < best[1]:
+            best = (k, cost)
+    return best
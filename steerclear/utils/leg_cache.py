@@ -0,0 +1,334 @@
+import threading, time, logging
+from collections import OrderedDict
+
+from steerclear.utils.eta import DMResponse, query_matrix
+
+logger = logging.getLogger(__name__)
+
+"""
+LRUCache
+--------
+Thread safe least recently used cache whose entries expire
+:ttl: seconds after they are set. Once it holds :maxsize:
+entries, setting a new entry evicts the least recently used one
+"""
+class LRUCache():
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    """
+    get
+    ---
+    Returns the value cached under :key: or None
+    if it is not cached or has expired
+    """
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.time():
+                return None
+            # re-insert the entry as the most recently used
+            self._entries[key] = entry
+            return value
+
+    """
+    set
+    ---
+    Caches :value: under :key:, evicting the least
+    recently used entries if the cache is full
+    """
+    def set(self, key, value, expires=None):
+        if expires is None:
+            expires = time.time() + self.ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+"""
+CachingDMClient
+---------------
+Wraps a SteerClearDMClient with a cache of leg durations and
+addresses. Coordinates are quantized to a grid of :grid: degrees,
+so every origin and destination within the same grid cell shares
+cache entries. Legs and addresses are looked up in a per-process
+LRUCache first, then legs in the optional precomputed :travel_times:
+grid, then in the optional persistent :store:, and only the elements
+missing from all of them are requested from the api.
+The store must have get_legs(keys), set_legs(items), get_addresses(keys),
+and set_addresses(items) methods, where items are (key, value) pairs
+"""
+class CachingDMClient():
+
+    """
+    Creates a new CachingDMClient
+
+    :client:    SteerClearDMClient used for cache misses
+    :grid:      size in degrees of the grid cells coordinates are quantized to
+    :maxsize:   maximum number of legs (and addresses) cached in memory
+    :ttl:       seconds cached legs and addresses stay valid
+    :store:     optional persistent store shared by every process
+    :travel_times:  optional TravelTimeGrid of precomputed leg durations
+    """
+    def __init__(self, client, grid=0.0005, maxsize=10000, ttl=86400, store=None, travel_times=None):
+        self.client = client
+        self.grid = grid
+        self.ttl = ttl
+        self.store = store
+        self.travel_times = travel_times
+        self.legs = LRUCache(maxsize, ttl)
+        self.addresses = LRUCache(maxsize, ttl)
+        self._hits = 0
+        self._grid_hits = 0
+        self._store_hits = 0
+        self._misses = 0
+
+    """
+    quantize
+    --------
+    Returns the grid cell of a lat/long point as a pair of integers
+    """
+    def quantize(self, point):
+        return int(round(point[0] / self.grid)), int(round(point[1] / self.grid))
+
+    """
+    query_api
+    ---------
+    Same as SteerClearDMClient.query_api(), but built from cached legs
+    and addresses where possible. Returns a DMResponse with no data if
+    the request for the missing elements fails. If the missing elements
+    were estimated, so is the returned DMResponse
+    """
+    def query_api(self, origins, destinations):
+        # nothing to cache. let the api reject the request
+        if not origins or not destinations:
+            return self.client.query_api(origins, destinations)
+
+        origin_cells = [self.quantize(point) for point in origins]
+        destination_cells = [self.quantize(point) for point in destinations]
+        leg_keys = set((o, d) for o in origin_cells for d in destination_cells)
+        point_keys = set(origin_cells) | set(destination_cells)
+
+        # look up legs and addresses in memory, then legs
+        # in the travel time grid, then both in the store
+        durations = self._lookup(self.legs, leg_keys)
+        addresses = self._lookup(self.addresses, point_keys)
+        memory_hits = len(durations)
+        if self.travel_times is not None and len(durations) < len(leg_keys):
+            durations.update(self._lookup_travel_times(origins, destinations, origin_cells, destination_cells, durations))
+        grid_hits = len(durations) - memory_hits
+        if self.store is not None and (len(durations) < len(leg_keys) or len(addresses) < len(point_keys)):
+            durations.update(self._lookup_store('legs', self.legs, leg_keys - set(durations)))
+            addresses.update(self._lookup_store('addresses', self.addresses, point_keys - set(addresses)))
+        missing = leg_keys - set(durations)
+        self._hits += memory_hits
+        self._grid_hits += grid_hits
+        self._store_hits += len(durations) - memory_hits - grid_hits
+        self._misses += len(missing)
+
+        # request every missing leg, and a leg from or to every
+        # point whose address is missing, from the api
+        estimated = False
+        if missing or len(addresses) < len(point_keys):
+            estimated = self._fetch(origins, destinations, origin_cells, destination_cells, durations, addresses)
+            if estimated is None:
+                return DMResponse(None)
+
+        data = {
+            u'status': u'OK',
+            u'origin_addresses': [addresses[o] for o in origin_cells],
+            u'destination_addresses': [addresses[d] for d in destination_cells],
+            u'rows': [
+                {u'elements': [
+                    {u'status': u'OK', u'duration': {u'value': durations[(o, d)]}}
+                    for d in destination_cells
+                ]}
+                for o in origin_cells
+            ]
+        }
+        if estimated:
+            data[u'estimated'] = True
+        return DMResponse(data)
+
+    """
+    available
+    ---------
+    Returns False while the wrapped client is not making requests to the api
+    """
+    def available(self):
+        return self.client.available()
+
+    """
+    stats
+    -----
+    Returns the wrapped client's counters along with the cache's.
+    Hits and misses count distinct legs (grid cell pairs) per query
+    * cache_hits - legs found in memory
+    * cache_grid_hits - legs found in the travel time grid
+    * cache_store_hits - legs found in the persistent store
+    * cache_misses - legs requested from the api
+    * cache_hit_ratio - fraction of legs that were not requested from the api
+    """
+    def stats(self):
+        stats = self.client.stats()
+        hits = self._hits + self._grid_hits + self._store_hits
+        total = hits + self._misses
+        stats.update({
+            'cache_hits': self._hits,
+            'cache_grid_hits': self._grid_hits,
+            'cache_store_hits': self._store_hits,
+            'cache_misses': self._misses,
+            'cache_hit_ratio': float(hits) / total if total else None,
+            'cache_size': len(self.legs)
+        })
+        return stats
+
+    """
+    clear
+    -----
+    Empties the in-memory caches and resets the counters
+    """
+    def clear(self):
+        self.legs.clear()
+        self.addresses.clear()
+        self._hits = 0
+        self._grid_hits = 0
+        self._store_hits = 0
+        self._misses = 0
+
+    """
+    _lookup
+    -------
+    Returns the dictionary of key -> value of the keys found in :cache:
+    """
+    def _lookup(self, cache, keys):
+        found = {}
+        for key in keys:
+            value = cache.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    """
+    _lookup_travel_times
+    --------------------
+    Returns the dictionary of leg key -> duration of the legs missing from
+    :durations: that the travel time grid has a valid travel time for
+    """
+    def _lookup_travel_times(self, origins, destinations, origin_cells, destination_cells, durations):
+        times = self.travel_times.lookup(origins, destinations)
+        found = {}
+        for i, o in enumerate(origin_cells):
+            for j, d in enumerate(destination_cells):
+                if times[i, j] >= 0 and (o, d) not in durations:
+                    found.setdefault((o, d), int(times[i, j]))
+        return found
+
+    """
+    _lookup_store
+    -------------
+    Returns the dictionary of key -> value of the keys found in the
+    store, and caches them in memory. A failing store counts as a miss
+    """
+    def _lookup_store(self, kind, cache, keys):
+        if not keys:
+            return {}
+        try:
+            found = getattr(self.store, 'get_' + kind)(keys)
+        except Exception:
+            logger.exception('distance matrix cache store lookup failed')
+            return {}
+        for key, value in found.iteritems():
+            cache.set(key, value)
+        return found
+
+    """
+    _save_store
+    -----------
+    Saves key -> value pairs in the store. A failing store is only logged
+    """
+    def _save_store(self, kind, items):
+        if self.store is None or not items:
+            return
+        try:
+            getattr(self.store, 'set_' + kind)(items)
+        except Exception:
+            logger.exception('distance matrix cache store update failed')
+
+    """
+    _fetch
+    ------
+    Requests the missing legs and addresses from the api, only
+    including origins and destinations that have something missing,
+    and caches the results. Estimated legs and addresses are only used
+    for this query and never cached. Returns None if the request failed,
+    else whether the legs and addresses it returned are estimated
+    """
+    def _fetch(self, origins, destinations, origin_cells, destination_cells, durations, addresses):
+        # one origin and destination per grid cell that is missing something
+        rows = OrderedDict()
+        for point, o in zip(origins, origin_cells):
+            if o not in addresses or any((o, d) not in durations for d in destination_cells):
+                rows.setdefault(o, point)
+        columns = OrderedDict()
+        for point, d in zip(destinations, destination_cells):
+            if d not in addresses or any((o, d) not in durations for o in rows):
+                columns.setdefault(d, point)
+        if not columns:
+            # every leg is known but some origin addresses are missing
+            columns[destination_cells[0]] = destinations[0]
+        row_cells, column_cells = rows.keys(), columns.keys()
+
+        # an element is needed if its leg is missing, or it is the first
+        # element of a row or column whose address is missing
+        def needed(i, j):
+            o, d = row_cells[i], column_cells[j]
+            return (o, d) not in durations or \
+                (j == 0 and o not in addresses) or \
+                (i == 0 and d not in addresses)
+
+        result = query_matrix(self.client, rows.values(), columns.values(), needed)
+        if result is None:
+            return None
+        eta, (origin_addresses, destination_addresses), estimated = result
+
+        # cache every leg and address the api returned
+        new_legs = []
+        for i, o in enumerate(row_cells):
+            for j, d in enumerate(column_cells):
+                if eta[i][j] is not None:
+                    durations[(o, d)] = eta[i][j]
+                    if not estimated:
+                        self.legs.set((o, d), eta[i][j])
+                        new_legs.append(((o, d), eta[i][j]))
+        new_addresses = []
+        for cells, cell_addresses in ((row_cells, origin_addresses), (column_cells, destination_addresses)):
+            for cell, address in zip(cells, cell_addresses):
+                if address is not None:
+                    addresses[cell] = address
+                    if not estimated:
+                        self.addresses.set(cell, address)
+                        new_addresses.append((cell, address))
+        self._save_store('legs', new_legs)
+        self._save_store('addresses', new_addresses)
+
+        # the api may not have returned everything that was needed
+        if not all((o, d) in durations for o in origin_cells for d in destination_cells) or \
+                not all(cell in addresses for cell in set(origin_cells) | set(destination_cells)):
+            return None
+        return estimated
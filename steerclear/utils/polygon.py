@@ -1,6 +1,10 @@
 import shapefile
+import numpy as np
 
 import os
+from bisect import bisect_left
+from steerclear.utils.zone_cache import zone_cache_filename, load_zone_cache, save_zone_cache
+
 """
 SteerClearGISClient
 -------------
@@ -14,16 +18,23 @@ class SteerClearGISClient():
 
     :shapefilename: Filename of shapefile that
                     contains polygon
+    :cache_dirname: Directory of the zone cache the compiled
+                    polygon is memory mapped from, or None
     """
-    def __init__(self, shapefilename):
-        # read shapefile data
-        sf = shapefile.Reader(shapefilename)
-
-        # get campus map shape
-        shape = sf.shapes()[0]
+    def __init__(self, shapefilename, cache_dirname=None):
+        # precompile the polygon of the shapefile for fast lookups,
+        # or load it from the zone cache
+        if cache_dirname is None:
+            self.index = compile_polygon(read_polygon(shapefilename))
+        else:
+            self.index = open_polygon_index(
+                zone_cache_filename(shapefilename, cache_dirname),
+                [shapefilename],
+                lambda: compile_polygon(read_polygon(shapefilename))
+            )
 
         # save campus polygon
-        self.polygon = shape.points
+        self.polygon = self.index.polygon
 
     """
     is_in_polygon
@@ -34,12 +45,26 @@ class SteerClearGISClient():
     """
     def is_in_polygon(self, point):
         x, y = point
-        return self.point_in_poly(y, x, self.polygon)
+        return self.index.contains(y, x)
+
+    """
+    is_in_polygon_many
+    ------------------
+    Checks which of many lat/long points are on the polygon.
+    Returns a bool array giving the same answers as is_in_polygon()
+
+    :points: (N, 2) array of lat/long points
+    """
+    def is_in_polygon_many(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.index.contains_many(points[:, 1], points[:, 0])
 
     """
     point_in_poly
     -------------
-    Algorithm to solve the point in polygon problem
+    Algorithm to solve the point in polygon problem. Checks every
+    edge of the polygon, so is_in_polygon() uses a PolygonIndex that
+    gives the same answers instead
 
     :x:         longitude of point
     :y:         latitude of point
@@ -83,4 +108,249 @@ class SteerClearGISClient():
                             inside = not inside
             p1x,p1y = p2x,p2y
 
-        return inside
\ No newline at end of file
+        return inside
+
+"""
+PolygonIndex
+------------
+Zones made of polygon rings, precompiled for point in polygon lookups that
+answer which zones contain a point. For each zone the answer is the same
+as SteerClearGISClient.point_in_poly() would give with all of the zone's
+rings, where the crossings of every ring count towards one even-odd total
+so rings inside a zone's other rings are holes. Points outside the bounding
+box are rejected right away, vertices and horizontal boundary edges are
+looked up in a dict, and the ray casting only looks at the edges that cross
+the point's latitude. Those are found by binary searching the slabs between
+consecutive vertex latitudes, each of which holds the edges that span it,
+so a lookup is O(log n + k) for k edges crossing the slab. Made by
+compile_zones() or loaded from a zone cache file
+"""
+class PolygonIndex():
+
+    """
+    Creates a PolygonIndex from the arrays compile_zones() makes.
+    They may be memory mapped, lookup_many() reads them in place
+
+    :zones:         number of zones
+    :vertices:      (n, 4) array of the (long, lat, zone, ring) vertices of the rings
+    :ys:            sorted distinct latitudes of the vertices
+    :slabs:         (len(ys) - 1, width, 6) array of the (p1x, p1y, p2x, p2y, max x, zone)
+                    edges spanning each slab, padded with edges at -inf longitude
+    :horizontal:    (h, 4) array of the (latitude, min x, max x, zone) of
+                    the horizontal edges point_in_poly() checks
+    """
+    def __init__(self, zones, vertices, ys, slabs, horizontal):
+        self.zones = zones
+        self.arrays = (vertices, ys, slabs, horizontal)
+        points = vertices.tolist()
+        self.polygon = [(x, y) for x, y, zone, ring in points]
+
+        # bitmask of the zones each vertex belongs to
+        self.vertices = {}
+        for x, y, zone, ring in points:
+            self.vertices[(x, y)] = self.vertices.get((x, y), 0) | 1 << int(zone)
+
+        if points:
+            self.max_x = max(point[0] for point in points)
+            self.min_y = min(point[1] for point in points)
+            self.max_y = max(point[1] for point in points)
+        else:
+            self.max_x, self.min_y, self.max_y = -np.inf, np.inf, -np.inf
+
+        self.horizontal = {}
+        for y, min_x, max_x, zone in horizontal.tolist():
+            self.horizontal.setdefault(y, []).append((min_x, max_x, 1 << int(zone)))
+
+        # slab k is the latitudes in (ys[k], ys[k + 1]]. lookup()
+        # uses lists of its edges, lookup_many() the arrays
+        self.ys = ys.tolist()
+        counts = np.count_nonzero(slabs[:, :, 4] != -np.inf, axis=1).tolist()
+        self.slabs = [slab[:count] for slab, count in zip(slabs.tolist(), counts)]
+        self.ys_array = ys
+        self.slab_p1x, self.slab_p1y, self.slab_p2x, self.slab_p2y, self.slab_max_x, self.slab_zone = \
+            [slabs[:, :, i] for i in xrange(6)]
+
+    """
+    lookup
+    ------
+    Returns the bitmask of the zones the point at
+    longitude :x: and latitude :y: is in
+    """
+    def lookup(self, x, y):
+        # nothing of any zone is to the right, above, or below the bounding box.
+        # points to the left still go through the ray casting to get the same answer
+        if x > self.max_x or y < self.min_y or y > self.max_y:
+            return 0
+
+        # zones the point is a vertex of or on a horizontal boundary of
+        inside = self.vertices.get((x, y), 0)
+        for min_x, max_x, bit in self.horizontal.get(y, ()):
+            if min_x < x < max_x:
+                inside |= bit
+
+        # ray casting over only the edges that cross the point's latitude
+        k = bisect_left(self.ys, y) - 1
+        if not 0 <= k < len(self.slabs):
+            return inside
+        crossings = 0
+        for p1x, p1y, p2x, p2y, edge_max_x, zone in self.slabs[k]:
+            if x <= edge_max_x:
+                if p1x == p2x or x <= (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x:
+                    crossings ^= 1 << int(zone)
+        return inside | crossings
+
+    """
+    contains
+    --------
+    Returns whether the point at longitude :x: and latitude :y: is
+    in zone :zone:. For the polygon of a SteerClearGISClient this is
+    exactly SteerClearGISClient.point_in_poly()
+    """
+    def contains(self, x, y, zone=0):
+        return bool(self.lookup(x, y) >> zone & 1)
+
+    """
+    lookup_many
+    -----------
+    Returns a (len(x), zones) bool array of whether each point at
+    longitude :x:[i] and latitude :y:[i] is in each zone, exactly like
+    lookup(). Only points level with a vertex can be a vertex or on a
+    horizontal edge, so those few go through lookup() and the rest are
+    ray cast against the edges of their slab all at once
+    """
+    def lookup_many(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        inside = np.zeros((len(x), self.zones), dtype=bool)
+        candidates = np.flatnonzero((x <= self.max_x) & (y >= self.min_y) & (y <= self.max_y))
+        if not len(candidates):
+            return inside
+
+        # points level with a vertex go through the exact scalar checks
+        ys = self.ys_array
+        k = np.searchsorted(ys, y[candidates])
+        level = ys[np.minimum(k, len(ys) - 1)] == y[candidates]
+        for i in candidates[level]:
+            mask = self.lookup(x[i], y[i])
+            inside[i] = [mask >> zone & 1 for zone in xrange(self.zones)]
+
+        # the rest are strictly inside slab k - 1
+        candidates, k = candidates[~level], k[~level] - 1
+        px, py = x[candidates], y[candidates]
+        rows = np.arange(len(candidates))
+        crossings = np.zeros((len(candidates), self.zones), dtype=bool)
+        for j in xrange(self.slab_max_x.shape[1]):
+            p1x, p1y = self.slab_p1x[k, j], self.slab_p1y[k, j]
+            p2x, p2y = self.slab_p2x[k, j], self.slab_p2y[k, j]
+            xints = (py - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+            crossings[rows, self.slab_zone[k, j].astype(np.intp)] ^= \
+                (px <= self.slab_max_x[k, j]) & ((p1x == p2x) | (px <= xints))
+        inside[candidates] = crossings
+        return inside
+
+    """
+    contains_many
+    -------------
+    Returns a bool array of whether each point at longitude :x:[i]
+    and latitude :y:[i] is in zone :zone:, exactly like contains()
+    """
+    def contains_many(self, x, y, zone=0):
+        return self.lookup_many(x, y)[:, zone]
+
+"""
+compile_zones
+-------------
+Precompiles :zones: into a PolygonIndex. Each zone
+is a list of rings of (longitude, latitude) tuples
+"""
+def compile_zones(zones):
+    vertices, horizontal, edges = [], [], []
+    rings = 0
+    for zone, zone_rings in enumerate(zones):
+        for ring in zone_rings:
+            if not ring:
+                continue
+            vertices.extend((point[0], point[1], zone, rings) for point in ring)
+            rings += 1
+
+            # horizontal edges the boundary check of point_in_poly()
+            # looks at, which is every edge but the closing one
+            for i in xrange(1, len(ring)):
+                p1, p2 = ring[i - 1], ring[i]
+                if p1[1] == p2[1]:
+                    horizontal.append((p1[1], min(p1[0], p2[0]), max(p1[0], p2[0]), zone))
+
+            # edges the ray casting of point_in_poly() looks at, including the
+            # closing one. horizontal edges never cross a ray so are left out
+            n = len(ring)
+            for i in xrange(1, n + 1):
+                (p1x, p1y), (p2x, p2y) = ring[i - 1][:2], ring[i % n][:2]
+                if p1y != p2y:
+                    edges.append((p1x, p1y, p2x, p2y, max(p1x, p2x), zone))
+
+    # slab k is the latitudes in (ys[k], ys[k + 1]] and holds every
+    # edge whose latitudes span it
+    ys = sorted(set(vertex[1] for vertex in vertices))
+    slabs = [[] for i in xrange(max(len(ys) - 1, 0))]
+    for edge in edges:
+        first = bisect_left(ys, min(edge[1], edge[3]))
+        last = bisect_left(ys, max(edge[1], edge[3]))
+        for k in xrange(first, last):
+            slabs[k].append(edge)
+
+    # pad the slabs to the most edges in a slab with vertical
+    # edges at -inf longitude, which no point is left of
+    width = max([len(slab) for slab in slabs] + [1])
+    padding = (0.0, 0.0, 0.0, 1.0, -np.inf, 0.0)
+    slabs = np.array([slab + [padding] * (width - len(slab)) for slab in slabs], dtype=np.float64)
+
+    return PolygonIndex(
+        len(zones),
+        np.array(vertices, dtype=np.float64).reshape(-1, 4),
+        np.array(ys, dtype=np.float64),
+        slabs.reshape(len(slabs), width, 6),
+        np.array(horizontal, dtype=np.float64).reshape(-1, 4)
+    )
+
+"""
+compile_polygon
+---------------
+Precompiles :polygon:, a list of (longitude, latitude)
+tuples, into a PolygonIndex of a single zone
+"""
+def compile_polygon(polygon):
+    return compile_zones([[polygon]])
+
+"""
+read_polygon
+------------
+Returns the first shape of the shapefile :shapefilename: as a list
+of (longitude, latitude) tuples. pyshp points are arrays, which never
+compare equal to a tuple, so they are made tuples for the vertex check
+"""
+def read_polygon(shapefilename):
+    shape = shapefile.Reader(shapefilename).shapes()[0]
+    return [tuple(point) for point in shape.points]
+
+"""
+open_polygon_index
+------------------
+Returns the PolygonIndex compiled by :compile: from the files
+:sourcefilenames:, memory mapped from the zone cache file :cache_filename:.
+The cache file is built if it is missing or any source file changed since
+it was built. If it can not be written the index is compiled in memory instead
+"""
+def open_polygon_index(cache_filename, sourcefilenames, compile):
+    loaded = load_zone_cache(cache_filename, sourcefilenames)
+    if loaded is None:
+        index = compile()
+        try:
+            save_zone_cache(cache_filename, sourcefilenames, index.zones, *index.arrays)
+        except (IOError, OSError):
+            return index
+
+        # reopen the cache so its pages are shared
+        loaded = load_zone_cache(cache_filename, sourcefilenames)
+        if loaded is None:
+            return index
+    return PolygonIndex(*loaded)
@@ -0,0 +1,202 @@
+import threading, time
+from collections import namedtuple
+from contextlib import contextmanager
+
+# uwsgi is only importable when the app is running inside a uwsgi worker.
+# when it is available, the queue version is kept in the uwsgi shared
+# cache so that every worker process sees the same version
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+# name of the uwsgi cache (see cache2 in steerclear.ini) and the key
+# the queue version is stored under
+UWSGI_CACHE_NAME = 'steerclear'
+QUEUE_VERSION_KEY = 'ride_queue_version'
+
+# number of the uwsgi lock (see locks in steerclear.ini)
+# that serializes appending rides to the queue
+QUEUE_TAIL_LOCK = 1
+
+# the parts of the last ride in the queue that new rides are chained onto
+QueueTail = namedtuple('QueueTail', ['id', 'end_latitude', 'end_longitude', 'dropoff_time'])
+
+"""
+RideQueueCache
+--------------
+Keeps a monotonically increasing version number for the ride queue
+and a pre-serialized response body for each location filter variant
+of the ride queue. The version is bumped every time a ride is
+inserted or deleted, which invalidates every cached body and ETag
+"""
+class RideQueueCache():
+
+    """
+    Creates a new RideQueueCache. The version starts at the current
+    time in milliseconds so that versions (and ETags) handed out before
+    a restart are never reused after it
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._version = int(time.time() * 1000)
+
+        # maps location filter -> (version, etag, body)
+        self._bodies = {}
+
+    """
+    version
+    -------
+    Returns the current version of the ride queue
+    """
+    def version(self):
+        if uwsgi is not None:
+            value = uwsgi.cache_get(QUEUE_VERSION_KEY, UWSGI_CACHE_NAME)
+            if value is not None:
+                return int(value)
+            # first worker to look at the version initializes it
+            return self.bump()
+        return self._version
+
+    """
+    bump
+    ----
+    Increments the ride queue version and returns the new version.
+    Must be called after any change to the ride queue is committed
+    """
+    def bump(self):
+        if uwsgi is not None:
+            uwsgi.lock()
+            try:
+                value = uwsgi.cache_get(QUEUE_VERSION_KEY, UWSGI_CACHE_NAME)
+                version = max(int(value or 0) + 1, int(time.time() * 1000))
+                uwsgi.cache_update(QUEUE_VERSION_KEY, str(version), 0, UWSGI_CACHE_NAME)
+            finally:
+                uwsgi.unlock()
+            with self._changed:
+                self._changed.notify_all()
+            return version
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+            return self._version
+
+    """
+    wait
+    ----
+    Blocks until the ride queue version is no longer :version:
+    or :timeout: seconds have passed, and returns the current version.
+    Bumps made by this process wake waiters immediately. Bumps made by
+    other uwsgi workers are picked up when the timeout expires
+    """
+    def wait(self, version, timeout):
+        with self._changed:
+            if self.version() == version:
+                self._changed.wait(timeout)
+            return self.version()
+
+    """
+    etag
+    ----
+    Returns the ETag of the ride queue for the
+    location filter variant at the given version
+    """
+    def etag(self, location, version):
+        return '%d-%s' % (version, location or 'all')
+
+    """
+    get
+    ---
+    Returns the cached (etag, body) pair for the location
+    filter variant if it was cached at the given version, else None
+    """
+    def get(self, location, version):
+        entry = self._bodies.get(location)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1], entry[2]
+
+    """
+    set
+    ---
+    Caches the serialized response body of the location filter
+    variant at the given version and returns its etag
+    """
+    def set(self, location, version, body):
+        etag = self.etag(location, version)
+        self._bodies[location] = (version, etag, body)
+        return etag
+
+    """
+    invalidate
+    ----------
+    Bumps the version and throws away every cached body
+    """
+    def invalidate(self):
+        self._bodies.clear()
+        return self.bump()
+
+"""
+RideQueueTail
+-------------
+Caches the last ride in each vehicle's queue against the ride queue
+version, so finding where a new ride is chained onto does not need a
+query while the queue is unchanged. Also provides the lock that serializes
+reading the tails and appending a ride to one, so that concurrent ride
+requests (in any worker) chain onto each other instead of onto the same tail
+"""
+class RideQueueTail():
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # (version, {vehicle_id: QueueTail or None if the queue is empty})
+        self._entry = None
+
+    """
+    lock
+    ----
+    Context manager holding the queue tail lock across
+    threads and, under uwsgi, across worker processes
+    """
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            if uwsgi is not None:
+                uwsgi.lock(QUEUE_TAIL_LOCK)
+            try:
+                yield
+            finally:
+                if uwsgi is not None:
+                    uwsgi.unlock(QUEUE_TAIL_LOCK)
+
+    """
+    get
+    ---
+    Returns the dictionary of vehicle id -> QueueTail (None if that
+    vehicle's queue is empty) if it was cached at :version:, else None
+    """
+    def get(self, version):
+        entry = self._entry
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    """
+    set
+    ---
+    Caches the last ride in each vehicle's queue at the given ride
+    queue :version: and returns the dictionary of QueueTails.
+    :rides: dictionary of vehicle id -> last Ride (or QueueTail) in its
+            queue, or None if the queue is empty
+    """
+    def set(self, version, rides):
+        tails = {}
+        for vehicle_id, ride in rides.iteritems():
+            tail = None
+            if ride is not None:
+                tail = QueueTail(ride.id, ride.end_latitude, ride.end_longitude, ride.dropoff_time)
+            tails[vehicle_id] = tail
+        self._entry = (version, tails)
+        return tails
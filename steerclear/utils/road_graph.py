@@ -0,0 +1,219 @@
+import json, math, heapq
+from collections import defaultdict
+
+from steerclear.utils.eta import DMResponse
+from steerclear.utils.eta_estimate import haversine_matrix
+
+# speed in meters per second assumed between a location
+# and the road network node it is snapped to (about 10 mph)
+SNAP_SPEED = 4.5
+
+# size in degrees of the grid cells nodes are bucketed into for snapping
+SNAP_CELL_SIZE = 0.002
+
+"""
+RoadGraph
+---------
+Directed road network loaded from a road graph file
+(see scripts/build_road_graph.py), which is a json object:
+{
+    "nodes": [[lat, long], ...],
+    "names": ["Jamestown Road", ...],
+    "edges": [[from_node, to_node, seconds, meters, oneway, name_index or null], ...]
+}
+Edges that are not oneway can be driven in both directions
+"""
+class RoadGraph():
+
+    """
+    Creates a new RoadGraph
+
+    :filename: road graph file to load
+    """
+    def __init__(self, filename):
+        with open(filename) as f:
+            data = json.load(f)
+
+        self.nodes = [tuple(node) for node in data['nodes']]
+        self.names = data.get('names', [])
+
+        # adjacency lists of (node, seconds, meters)
+        self.edges = defaultdict(list)
+        # name of a street every node is on, if it has one
+        self.node_names = {}
+        for u, v, seconds, meters, oneway, name in data['edges']:
+            self.edges[u].append((v, seconds, meters))
+            if not oneway:
+                self.edges[v].append((u, seconds, meters))
+            if name is not None:
+                self.node_names.setdefault(u, self.names[name])
+                self.node_names.setdefault(v, self.names[name])
+
+        # bucket every node that has edges into grid cells for snapping
+        self.cells = defaultdict(list)
+        for node in set(self.edges) | set(v for edges in self.edges.values() for v, _, _ in edges):
+            self.cells[self._cell(self.nodes[node])].append(node)
+
+    def _cell(self, point):
+        return int(math.floor(point[0] / SNAP_CELL_SIZE)), int(math.floor(point[1] / SNAP_CELL_SIZE))
+
+    """
+    snap
+    ----
+    Returns (node, meters) of the road network node closest to a
+    lat/long point, or None if there is no node within a couple grid cells
+    """
+    def snap(self, point):
+        row, column = self._cell(point)
+        # search the point's cell and its neighbors, then one ring further
+        for radius in (1, 2):
+            candidates = [
+                node
+                for i in xrange(row - radius, row + radius + 1)
+                for j in xrange(column - radius, column + radius + 1)
+                for node in self.cells.get((i, j), ())
+            ]
+            if candidates:
+                meters = haversine_matrix([point], [self.nodes[node] for node in candidates])[0]
+                best = int(meters.argmin())
+                return candidates[best], float(meters[best])
+        return None
+
+    """
+    shortest_paths
+    --------------
+    Dijkstra's algorithm from :source: that stops as soon as every
+    node in :targets: is settled. Returns a dictionary of
+    target node -> (seconds, meters) of the fastest path to it.
+    Unreachable targets are left out
+    """
+    def shortest_paths(self, source, targets):
+        remaining = set(targets)
+        found = {}
+        settled = set()
+        heap = [(0, 0, source)]
+        while heap and remaining:
+            seconds, meters, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = (seconds, meters)
+            for v, edge_seconds, edge_meters in self.edges.get(node, ()):
+                if v not in settled:
+                    heapq.heappush(heap, (seconds + edge_seconds, meters + edge_meters, v))
+        return found
+
+    """
+    address
+    -------
+    Returns a readable address for a snapped location: the name of
+    the street its node is on (if known) and its coordinates
+    """
+    def address(self, node, point):
+        coordinates = '%f,%f' % point
+        name = self.node_names.get(node)
+        if name is None:
+            return coordinates
+        return '%s (%s)' % (name, coordinates)
+
+"""
+RoadGraphDMClient
+-----------------
+Drop-in replacement for SteerClearDMClient that answers distance
+matrix queries from a local RoadGraph instead of the google
+distancematrix api. Works without network access or quota
+"""
+class RoadGraphDMClient():
+
+    """
+    Creates a new RoadGraphDMClient
+
+    :filename: road graph file to load
+    """
+    def __init__(self, filename):
+        self.graph = RoadGraph(filename)
+        self._requests = 0
+        self._errors = 0
+
+    """
+    query_api
+    ---------
+    Returns a DMResponse in the same format the distancematrix api
+    responds with. Elements between locations that can not be snapped
+    to the road network, or that are not connected, have the status
+    ZERO_RESULTS, so DMResponse.get_eta() returns None like it does
+    when the api can not find a route
+    """
+    def query_api(self, origins, destinations):
+        self._requests += 1
+        if not origins or not destinations:
+            self._errors += 1
+            return DMResponse({u'status': u'INVALID_REQUEST'})
+
+        origin_snaps = [self.graph.snap(point) for point in origins]
+        destination_snaps = [self.graph.snap(point) for point in destinations]
+        targets = set(snap[0] for snap in destination_snaps if snap is not None)
+
+        # one search per distinct origin node covers its whole row
+        paths = {}
+        for snap in origin_snaps:
+            if snap is not None and snap[0] not in paths:
+                paths[snap[0]] = self.graph.shortest_paths(snap[0], targets)
+
+        rows = []
+        for origin_snap in origin_snaps:
+            elements = []
+            for destination_snap in destination_snaps:
+                path = None
+                if origin_snap is not None and destination_snap is not None:
+                    path = paths[origin_snap[0]].get(destination_snap[0])
+                if path is None:
+                    elements.append({u'status': u'ZERO_RESULTS'})
+                    continue
+                # add the time to get on and off the road network
+                seconds = path[0] + (origin_snap[1] + destination_snap[1]) / SNAP_SPEED
+                meters = path[1] + origin_snap[1] + destination_snap[1]
+                elements.append({
+                    u'status': u'OK',
+                    u'duration': {u'value': int(round(seconds))},
+                    u'distance': {u'value': int(round(meters))}
+                })
+            rows.append({u'elements': elements})
+
+        return DMResponse({
+            u'status': u'OK',
+            u'origin_addresses': self._addresses(origins, origin_snaps),
+            u'destination_addresses': self._addresses(destinations, destination_snaps),
+            u'rows': rows
+        })
+
+    """
+    available
+    ---------
+    The road graph is local, so it is always available
+    """
+    def available(self):
+        return True
+
+    """
+    stats
+    -----
+    Returns counters of the queries answered. There are no connections
+    or queries in flight, so the other counters are always 0
+    """
+    def stats(self):
+        return {
+            'requests': self._requests,
+            'errors': self._errors,
+            'connections': 0,
+            'reused': 0,
+            'coalesced': 0
+        }
+
+    def _addresses(self, points, snaps):
+        return [
+            self.graph.address(snap[0], point) if snap is not None else u'%f,%f' % point
+            for point, snap in zip(points, snaps)
+        ]
@@ -0,0 +1,60 @@
+import threading
+
+"""
+SingleFlight
+------------
+Coalesces concurrent calls that share a key. While a call for a key
+is in flight, other threads calling with the same key wait for it and
+get its result (or exception) instead of making the call again
+"""
+class SingleFlight():
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    """
+    do
+    --
+    Returns fn(), or the result of the call of fn()
+    with the same :key: that is already in flight
+    """
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+"""
+_Call
+-----
+A call in flight and its outcome
+"""
+class _Call():
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,200 @@
+import os, json, time
+import numpy as np
+
+from steerclear.utils.eta import tile_shape
+
+# files a travel time grid is made of, inside its directory
+META_FILENAME = 'meta.json'
+CELLS_FILENAME = 'cells.npy'
+TIMES_FILENAME = 'times.npy'
+UPDATED_FILENAME = 'updated.npy'
+
+# travel time of a cell pair that has not been computed
+MISSING = -1
+
+"""
+TravelTimeGrid
+--------------
+Precomputed travel times between every pair of cells of a grid laid
+over the service area. A grid is a directory of numpy arrays:
+* cells.npy - (rows, columns) int32 index of every grid cell into the
+  travel time matrix, or -1 if the cell is outside the service area
+* times.npy - (n, n) int32 travel time in seconds from cell i to cell j,
+  or -1 if it is missing
+* updated.npy - (n, n) uint32 unix time cell pair i, j was computed at
+and meta.json holding the latitude and longitude of the grid's south
+west corner and its cell size in degrees. The matrices are memory
+mapped, so they are only paged in as they are read and are shared
+by every uwsgi worker
+"""
+class TravelTimeGrid():
+
+    """
+    Opens the travel time grid in :dirname:
+
+    :dirname:   directory of the grid
+    :max_age:   seconds a cell pair's travel time stays valid, or
+                None if travel times never go stale
+    :mode:      'r' to open the grid read only, 'r+' to update it
+    """
+    def __init__(self, dirname, max_age=None, mode='r'):
+        self.dirname = dirname
+        self.max_age = max_age
+        with open(os.path.join(dirname, META_FILENAME)) as f:
+            meta = json.load(f)
+        self.min_latitude = meta['min_latitude']
+        self.min_longitude = meta['min_longitude']
+        self.cell_size = meta['cell_size']
+        self.cells = np.load(os.path.join(dirname, CELLS_FILENAME))
+        self.times = np.load(os.path.join(dirname, TIMES_FILENAME), mmap_mode=mode)
+        self.updated = np.load(os.path.join(dirname, UPDATED_FILENAME), mmap_mode=mode)
+
+    """
+    cell_indices
+    ------------
+    Returns an array of the travel time matrix index of the cell every
+    lat/long point is in, or -1 for points outside the service area
+    """
+    def cell_indices(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        rows = np.floor((points[:, 0] - self.min_latitude) / self.cell_size).astype(np.int64)
+        columns = np.floor((points[:, 1] - self.min_longitude) / self.cell_size).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.cells.shape[0]) & \
+            (columns >= 0) & (columns < self.cells.shape[1])
+        indices = np.full(len(points), MISSING, dtype=np.int64)
+        indices[inside] = self.cells[rows[inside], columns[inside]]
+        return indices
+
+    """
+    lookup
+    ------
+    Returns a (len(origins), len(destinations)) int array of the travel
+    time in seconds from every origin to every destination. Pairs that
+    are outside the service area, missing, or stale are -1
+    """
+    def lookup(self, origins, destinations):
+        o = self.cell_indices(origins)
+        d = self.cell_indices(destinations)
+        index = np.ix_(np.maximum(o, 0), np.maximum(d, 0))
+        times = self.times[index].astype(np.int64)
+
+        invalid = (o < 0)[:, np.newaxis] | (d < 0)[np.newaxis, :] | (times < 0)
+        if self.max_age is not None:
+            invalid |= self.updated[index] < time.time() - self.max_age
+        times[invalid] = MISSING
+        return times
+
+    """
+    stale
+    -----
+    Returns an (n, n) bool array of the cell pairs
+    that are missing or older than max_age
+    """
+    def stale(self):
+        stale = np.asarray(self.times) < 0
+        if self.max_age is not None:
+            stale |= np.asarray(self.updated) < time.time() - self.max_age
+        return stale
+
+    """
+    centers
+    -------
+    Returns the list of lat/long centers of the cells in travel time matrix order
+    """
+    def centers(self):
+        centers = [None] * int(self.cells.max() + 1)
+        for (row, column), index in np.ndenumerate(self.cells):
+            if index >= 0:
+                centers[index] = (
+                    self.min_latitude + (row + 0.5) * self.cell_size,
+                    self.min_longitude + (column + 0.5) * self.cell_size
+                )
+        return centers
+
+"""
+open_travel_time_grid
+---------------------
+Returns the TravelTimeGrid in :dirname:, or None if no grid has been built there
+"""
+def open_travel_time_grid(dirname, max_age=None):
+    if not os.path.exists(os.path.join(dirname, META_FILENAME)):
+        return None
+    return TravelTimeGrid(dirname, max_age)
+
+"""
+create_travel_time_grid
+-----------------------
+Lays a grid of :cell_size: degree cells over the bounding box of the
+service area polygon and creates an empty travel time grid in :dirname: with every
+cell whose center is inside the service area. Returns the TravelTimeGrid
+opened for updating
+
+:gis_client:    SteerClearGISClient (or Zone) of the service area polygon
+"""
+def create_travel_time_grid(dirname, gis_client, cell_size, max_age=None):
+    longitudes = [point[0] for point in gis_client.polygon]
+    latitudes = [point[1] for point in gis_client.polygon]
+    min_latitude, min_longitude = min(latitudes), min(longitudes)
+    # round off float error so an exact multiple of cell_size gets no extra cell
+    rows = int(np.ceil(round((max(latitudes) - min_latitude) / cell_size, 6)))
+    columns = int(np.ceil(round((max(longitudes) - min_longitude) / cell_size, 6)))
+
+    cells = np.full((rows, columns), MISSING, dtype=np.int32)
+    row, column = np.mgrid[0:rows, 0:columns]
+    centers = np.column_stack([
+        (min_latitude + (row + 0.5) * cell_size).ravel(),
+        (min_longitude + (column + 0.5) * cell_size).ravel()
+    ])
+    inside = gis_client.is_in_polygon_many(centers).reshape(rows, columns)
+    n = int(np.count_nonzero(inside))
+    cells[inside] = np.arange(n)
+
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    np.save(os.path.join(dirname, CELLS_FILENAME), cells)
+    times = np.lib.format.open_memmap(os.path.join(dirname, TIMES_FILENAME), mode='w+', dtype=np.int32, shape=(n, n))
+    times[:] = MISSING
+    del times
+    updated = np.lib.format.open_memmap(os.path.join(dirname, UPDATED_FILENAME), mode='w+', dtype=np.uint32, shape=(n, n))
+    updated[:] = 0
+    del updated
+    with open(os.path.join(dirname, META_FILENAME), 'w') as f:
+        json.dump({
+            'min_latitude': min_latitude,
+            'min_longitude': min_longitude,
+            'cell_size': cell_size
+        }, f)
+    return TravelTimeGrid(dirname, max_age, mode='r+')
+
+"""
+update_travel_time_grid
+-----------------------
+Queries the travel time of every missing or stale cell pair of :grid:
+(opened with mode='r+') between cell centers, in tiles of tile_shape()
+within the api's limits. Tiles without a stale pair are skipped.
+Tiles that fail or are only estimated are left missing so the next update retries them.
+Returns (number of cell pairs updated, number of tiles that failed)
+
+:client:    SteerClearDMClient (or RoadGraphDMClient) to query
+"""
+def update_travel_time_grid(grid, client):
+    centers = grid.centers()
+    stale = grid.stale()
+    updated, failed = 0, 0
+    rows, columns = tile_shape(len(centers), len(centers))
+    for i in xrange(0, len(centers), rows):
+        for j in xrange(0, len(centers), columns):
+            if not stale[i:i + rows, j:j + columns].any():
+                continue
+            response = client.query_api(centers[i:i + rows], centers[j:j + columns])
+            eta = response.get_eta()
+            # never store estimates made while the api was unavailable
+            if eta is None or response.is_estimated():
+                failed += 1
+                continue
+            grid.times[i:i + rows, j:j + columns] = eta
+            grid.updated[i:i + rows, j:j + columns] = int(time.time())
+            updated += np.count_nonzero(stale[i:i + rows, j:j + columns])
+    grid.times.flush()
+    grid.updated.flush()
+    return updated, failed
@@ -0,0 +1,105 @@
+import os, threading, Queue, logging
+
+logger = logging.getLogger(__name__)
+
+"""
+WorkerPool
+----------
+Fixed size pool of daemon threads that run jobs off of a queue.
+The threads are started by the first submit() in each process, so a
+pool created at import time (before uwsgi forks its workers) still
+gets its own threads in every worker process
+"""
+class WorkerPool():
+
+    """
+    Creates a new WorkerPool
+
+    :num_threads: number of threads running jobs
+    """
+    def __init__(self, num_threads):
+        self.num_threads = num_threads
+        self._lock = threading.Lock()
+        self._jobs = None
+        self._pid = None
+
+    """
+    submit
+    ------
+    Queues fn(*args) to be run by one of the pool's threads
+    """
+    def submit(self, fn, *args):
+        self._start()
+        self._jobs.put((fn, args))
+
+    """
+    map
+    ---
+    Runs fn(item) for every item on the pool's threads and returns
+    the results in the order of :items:. If any call raises, the first
+    exception is raised once every call is done. Must not be called from
+    one of the pool's own jobs, since it blocks until its calls have run
+    """
+    def map(self, fn, items):
+        items = list(items)
+        results = [None] * len(items)
+        errors = []
+        done = threading.Semaphore(0)
+
+        def run(index, item):
+            try:
+                results[index] = fn(item)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.release()
+
+        for index, item in enumerate(items):
+            self.submit(run, index, item)
+        for item in items:
+            done.acquire()
+        if errors:
+            raise errors[0]
+        return results
+
+    """
+    join
+    ----
+    Blocks until every job submitted so far has been run
+    """
+    def join(self):
+        if self._jobs is not None:
+            self._jobs.join()
+
+    """
+    _start
+    ------
+    Starts the pool's threads if they are not running in this process.
+    Threads do not survive a fork, so a forked process starts its own
+    """
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._jobs = Queue.Queue()
+            for i in xrange(self.num_threads):
+                thread = threading.Thread(target=self._run, args=(self._jobs,), name='worker-%d' % i)
+                thread.daemon = True
+                thread.start()
+
+    """
+    _run
+    ----
+    Runs jobs off of the queue forever. A failing job
+    is logged and does not take its thread down with it
+    """
+    def _run(self, jobs):
+        while True:
+            fn, args = jobs.get()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception('worker job %r failed', fn)
+            finally:
+                jobs.task_done()
@@ -0,0 +1,105 @@
+import os
+import numpy as np
+
+# version of the zone cache file format. cache files
+# of another version are rebuilt
+ZONE_CACHE_VERSION = 3
+
+# number of header fields at the start of a zone cache file
+HEADER_SIZE = 8
+
+"""
+Zone cache files hold zones compiled by steerclear.utils.polygon.compile_zones()
+from shapefiles, so workers can memory map them and share their pages instead
+of parsing and compiling the shapefiles. A zone cache file is a single
+float64 .npy array of:
+* the header: ZONE_CACHE_VERSION, the number of source files, of zones,
+  of vertices, of vertex latitudes, of slabs, of edges per slab, and of
+  horizontal edges
+* the (mtime, size) of every source file it was built from
+* the (n, 4) vertices, the vertex latitudes, the (slabs, width, 6) slab
+  edges and the (h, 4) horizontal edges of the PolygonIndex, flattened
+"""
+
+"""
+zone_cache_filename
+-------------------
+Returns the filename of the zone cache file of the shapefile
+(or directory of shapefiles) :shapefilename: in :dirname:
+"""
+def zone_cache_filename(shapefilename, dirname):
+    name = os.path.splitext(os.path.basename(os.path.normpath(shapefilename)))[0]
+    return os.path.join(dirname, name + '.zone.npy')
+
+"""
+source_stats
+------------
+Returns the (mtime, size) of every file in :sourcefilenames:
+"""
+def source_stats(sourcefilenames):
+    stats = []
+    for sourcefilename in sourcefilenames:
+        stat = os.stat(sourcefilename)
+        stats.append((stat.st_mtime, stat.st_size))
+    return stats
+
+"""
+save_zone_cache
+---------------
+Writes the :zones: count and arrays of a PolygonIndex compiled
+from the files :sourcefilenames: to the zone cache file :filename:
+"""
+def save_zone_cache(filename, sourcefilenames, zones, vertices, ys, slabs, horizontal):
+    stats = source_stats(sourcefilenames)
+    header = [
+        ZONE_CACHE_VERSION, len(stats), zones, len(vertices),
+        len(ys), slabs.shape[0], slabs.shape[1], len(horizontal)
+    ]
+    data = np.concatenate([np.array(header, dtype=np.float64), np.array(stats, dtype=np.float64).ravel()] +
+        [np.asarray(array, dtype=np.float64).ravel() for array in (vertices, ys, slabs, horizontal)])
+
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    # write a temporary file and rename it over the cache file so
+    # workers starting at the same time never map half written files
+    temp_filename = '%s.%d.tmp' % (filename, os.getpid())
+    with open(temp_filename, 'wb') as f:
+        np.save(f, data)
+    os.rename(temp_filename, filename)
+
+"""
+load_zone_cache
+---------------
+Memory maps the zone cache file :filename: and returns the
+(zones, vertices, ys, slabs, horizontal) of the PolygonIndex in it,
+or None if it is missing, unreadable, or was not built from the
+current version of every file in :sourcefilenames:
+"""
+def load_zone_cache(filename, sourcefilenames):
+    try:
+        data = np.load(filename, mmap_mode='r')
+        stats = source_stats(sourcefilenames)
+    except (IOError, OSError, ValueError):
+        return None
+    if data.ndim != 1 or data.dtype != np.float64 or len(data) < HEADER_SIZE:
+        return None
+
+    version, sources, zones, n, n_ys, n_slabs, width, n_horizontal = data[:HEADER_SIZE].tolist()
+    if version != ZONE_CACHE_VERSION or sources != len(stats) or len(data) < HEADER_SIZE + 2 * len(stats):
+        return None
+    offset = HEADER_SIZE + 2 * len(stats)
+    if [tuple(stat) for stat in data[HEADER_SIZE:offset].reshape(-1, 2).tolist()] != stats:
+        return None
+
+    shapes = [(int(n), 4), (int(n_ys),), (int(n_slabs), int(width), 6), (int(n_horizontal), 4)]
+    sizes = [int(np.prod(shape)) for shape in shapes]
+    if offset + sum(sizes) != len(data):
+        return None
+
+    arrays = [int(zones)]
+    for shape, size in zip(shapes, sizes):
+        arrays.append(data[offset:offset + size].reshape(shape))
+        offset += size
+    return tuple(arrays)
@@ -0,0 +1,169 @@
+import numpy as np
+
+# cells within this many degrees of a zone boundary (about 0.1mm) fall back
+# to the exact lookup, so float error in the ray casting never disagrees
+# with the answer the grid stores for the rest of the cell
+RASTER_MARGIN = 1e-9
+
+# value of the cells a zone boundary crosses
+BOUNDARY = -1
+
+"""
+ZoneRaster
+----------
+A bitmap of :cell_size: degree cells over the bounding box of every
+zone of a PolygonIndex, for O(1) lookups of the points far from any
+zone boundary. Each cell stores the bitmask of the zones that contain
+it, or BOUNDARY if the boundary of any zone crosses it, in which case
+the point goes through the exact PolygonIndex lookup. Points outside the
+grid go through the PolygonIndex too, which rejects them right away. Answers
+are always the same as the PolygonIndex's, and it can be used in its place
+"""
+class ZoneRaster():
+
+    def __init__(self, index, cell_size):
+        if index.zones > 63:
+            raise ValueError('a ZoneRaster holds at most 63 zones')
+        self.index = index
+        self.cell_size = cell_size
+        self.zones = index.zones
+        self.arrays = index.arrays
+        self.polygon = index.polygon
+
+        vertices = index.arrays[0]
+        if len(vertices):
+            self.min_x, self.min_y = float(vertices[:, 0].min()), float(vertices[:, 1].min())
+            width, height = float(vertices[:, 0].max()) - self.min_x, float(vertices[:, 1].max()) - self.min_y
+        else:
+            self.min_x, self.min_y, width, height = 0.0, 0.0, 0.0, 0.0
+        self.rows = max(int(np.ceil(height / cell_size)), 1)
+        self.columns = max(int(np.ceil(width / cell_size)), 1)
+
+        # look up the zones of the center of every cell no boundary crosses.
+        # nothing separates any other point of such a cell from its center
+        boundary = self._boundary_cells(vertices)
+        rows, columns = np.nonzero(~boundary)
+        inside = index.lookup_many(
+            self.min_x + (columns + 0.5) * cell_size,
+            self.min_y + (rows + 0.5) * cell_size
+        )
+        self.cells = np.full((self.rows, self.columns), BOUNDARY, dtype=np.int64)
+        self.cells[rows, columns] = (inside * (1 << np.arange(self.zones, dtype=np.int64))).sum(axis=1)
+        self._cells = self.cells.tolist()
+
+    """
+    lookup
+    ------
+    Returns the bitmask of the zones the point at
+    longitude :x: and latitude :y: is in
+    """
+    def lookup(self, x, y):
+        row = (y - self.min_y) / self.cell_size
+        column = (x - self.min_x) / self.cell_size
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            mask = self._cells[int(row)][int(column)]
+            if mask != BOUNDARY:
+                return mask
+        return self.index.lookup(x, y)
+
+    """
+    contains
+    --------
+    Returns whether the point at longitude :x: and latitude :y: is in zone :zone:
+    """
+    def contains(self, x, y, zone=0):
+        return bool(self.lookup(x, y) >> zone & 1)
+
+    """
+    lookup_many
+    -----------
+    Returns a (len(x), zones) bool array of whether each point at
+    longitude :x:[i] and latitude :y:[i] is in each zone
+    """
+    def lookup_many(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        masks, hits = self._cell_masks(x, y)
+        inside = (masks[:, np.newaxis] >> np.arange(self.zones, dtype=np.int64) & 1).astype(bool)
+        misses = np.flatnonzero(~hits)
+        if len(misses):
+            inside[misses] = self.index.lookup_many(x[misses], y[misses])
+        return inside
+
+    """
+    contains_many
+    -------------
+    Returns a bool array of whether each point at longitude
+    :x:[i] and latitude :y:[i] is in zone :zone:
+    """
+    def contains_many(self, x, y, zone=0):
+        return self.lookup_many(x, y)[:, zone]
+
+    """
+    hits
+    ----
+    Returns a bool array of whether each point at longitude :x:[i]
+    and latitude :y:[i] is answered by the grid, rather than
+    falling back to the exact lookup
+    """
+    def hits(self, x, y):
+        return self._cell_masks(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))[1]
+
+    """
+    stats
+    -----
+    Returns the size of the grid and the fraction of its cells a boundary crosses
+    """
+    def stats(self):
+        return {
+            'rows': self.rows,
+            'columns': self.columns,
+            'boundary_cells': float(np.count_nonzero(self.cells == BOUNDARY)) / self.cells.size
+        }
+
+    def _cell_masks(self, x, y):
+        with np.errstate(invalid='ignore'):
+            row = (y - self.min_y) / self.cell_size
+            column = (x - self.min_x) / self.cell_size
+            on_grid = (row >= 0) & (row < self.rows) & (column >= 0) & (column < self.columns)
+        masks = np.full(len(x), BOUNDARY, dtype=np.int64)
+        masks[on_grid] = self.cells[row[on_grid].astype(np.intp), column[on_grid].astype(np.intp)]
+        return masks, masks != BOUNDARY
+
+    """
+    Returns a (rows, columns) bool array of the cells an edge of any ring
+    comes within RASTER_MARGIN of, going row by row over the part of each
+    edge inside the row (widened by RASTER_MARGIN)
+    """
+    def _boundary_cells(self, vertices):
+        boundary = np.zeros((self.rows, self.columns), dtype=bool)
+        points = vertices.tolist()
+        size, margin = self.cell_size, RASTER_MARGIN
+        for i, (x1, y1, zone, ring) in enumerate(points):
+            # the edge to the next vertex, or back to the first vertex of the ring
+            j = i + 1
+            if j == len(points) or points[j][3] != ring:
+                j = i
+                while j > 0 and points[j - 1][3] == ring:
+                    j -= 1
+            x2, y2 = points[j][:2]
+
+            low, high = min(y1, y2), max(y1, y2)
+            first = max(int(np.floor((low - margin - self.min_y) / size)), 0)
+            last = min(int(np.floor((high + margin - self.min_y) / size)), self.rows - 1)
+            for row in xrange(first, last + 1):
+                if y1 == y2:
+                    left, right = min(x1, x2), max(x1, x2)
+                else:
+                    # x of the edge where it enters and leaves the row, widened by the margin
+                    ends = [
+                        x1 + (y - y1) * (x2 - x1) / (y2 - y1) for y in (
+                            max(low, self.min_y + row * size - margin),
+                            min(high, self.min_y + (row + 1) * size + margin)
+                        )
+                    ]
+                    left, right = min(ends), max(ends)
+                start = max(int(np.floor((left - margin - self.min_x) / size)), 0)
+                end = min(int(np.floor((right + margin - self.min_x) / size)), self.columns - 1)
+                boundary[row, start:end + 1] = True
+        return boundary
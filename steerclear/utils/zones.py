@@ -0,0 +1,187 @@
+import shapefile
+import numpy as np
+
+import os, glob
+from steerclear.utils.polygon import compile_zones, open_polygon_index
+from steerclear.utils.zone_cache import zone_cache_filename
+from steerclear.utils.zone_raster import ZoneRaster
+
+"""
+ZoneRegistry
+------------
+Every zone of a directory of shapefiles, with one indexed lookup
+answering which zones contain a lat/long point. Every record of every
+shapefile in the directory (or its subdirectories) is a zone, made of
+all of the parts of its shape. Parts inside other parts of the same
+shape are holes, and the .dbf attributes of the record are kept with it.
+A shapefile with a single record is a zone named after the file,
+otherwise each record is named '<file>/<Name attribute>', or
+'<file>/<record number>' if it has no Name
+"""
+class ZoneRegistry():
+
+    """
+    Loads the zones of the shapefiles in :dirname:
+
+    :cache_dirname:     Directory of the zone cache the compiled
+                        zones are memory mapped from, or None
+    :raster_cell_size:  Size in degrees of the cells of a ZoneRaster
+                        answering lookups away from zone boundaries,
+                        or None to always use the exact lookup
+    """
+    def __init__(self, dirname, cache_dirname=None, raster_cell_size=None):
+        self.shapefilenames = sorted(glob.glob(os.path.join(dirname, '*.shp')) +
+            glob.glob(os.path.join(dirname, '*', '*.shp')))
+
+        # files the zones are compiled from
+        self.sourcefilenames = []
+        for shapefilename in self.shapefilenames:
+            self.sourcefilenames += [shapefilename, dbf_filename(shapefilename)]
+
+        # only the small .dbf files are read on startup, the
+        # shapes are read when the zones need to be compiled
+        zones = []
+        for shapefilename in self.shapefilenames:
+            name = os.path.splitext(os.path.basename(shapefilename))[0]
+            records = read_records(shapefilename)
+            for i, attributes in enumerate(records):
+                if len(records) > 1:
+                    zone_name = '%s/%s' % (name, attributes.get('Name') or i)
+                else:
+                    zone_name = name
+                zones.append((zone_name, shapefilename, attributes))
+
+        if cache_dirname is None:
+            self.index = compile_zones(self._read_zones())
+        else:
+            self.index = open_polygon_index(
+                zone_cache_filename(dirname, cache_dirname),
+                self.sourcefilenames,
+                lambda: compile_zones(self._read_zones())
+            )
+
+        # lookups go through the raster if there is one
+        self.raster = ZoneRaster(self.index, raster_cell_size) if raster_cell_size else None
+        self._lookups = self.raster or self.index
+
+        self.zones = [Zone(self._lookups, column, *zone) for column, zone in enumerate(zones)]
+        self._zones_by_name = dict((zone.name, zone) for zone in self.zones)
+
+    """
+    zone
+    ----
+    Returns the Zone named :name:. Raises KeyError if there is none
+    """
+    def zone(self, name):
+        return self._zones_by_name[name]
+
+    """
+    zones_at
+    --------
+    Returns the list of Zones the lat/long :point: is in
+    """
+    def zones_at(self, point):
+        mask = self._lookups.lookup(point[1], point[0])
+        return [zone for zone in self.zones if mask >> zone.column & 1]
+
+    """
+    zones_at_many
+    -------------
+    Returns a (N, len(zones)) bool array of whether each of the (N, 2)
+    lat/long :points: is in each zone. Column i is self.zones[i]
+    """
+    def zones_at_many(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self._lookups.lookup_many(points[:, 1], points[:, 0])
+
+    def _read_zones(self):
+        zones = []
+        for shapefilename in self.shapefilenames:
+            zones += read_zone_rings(shapefilename)
+        return zones
+
+"""
+Zone
+----
+A zone of a ZoneRegistry. Checks points like a SteerClearGISClient of
+the zone would, so it can be used in place of one
+"""
+class Zone():
+
+    """
+    Creates the zone in column :column: of the PolygonIndex (or ZoneRaster) :index:
+
+    :name:          name of the zone
+    :shapefilename: filename of the shapefile the zone is from
+    :attributes:    dict of the zone's .dbf attributes
+    """
+    def __init__(self, index, column, name, shapefilename, attributes):
+        self.index = index
+        self.column = column
+        self.name = name
+        self.shapefilename = shapefilename
+        self.attributes = attributes
+
+        # long/lat vertices of the zone's rings
+        vertices = index.arrays[0]
+        self.polygon = [tuple(point) for point in vertices[vertices[:, 2] == column, :2].tolist()]
+
+    """
+    is_in_polygon
+    -------------
+    Checks if a given lat/long point is in the zone
+    """
+    def is_in_polygon(self, point):
+        return self.index.contains(point[1], point[0], self.column)
+
+    """
+    is_in_polygon_many
+    ------------------
+    Checks which of an (N, 2) array of lat/long points are in the zone
+    """
+    def is_in_polygon_many(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.index.contains_many(points[:, 1], points[:, 0], self.column)
+
+    def __repr__(self):
+        return '<Zone(%s)>' % self.name
+
+"""
+dbf_filename
+------------
+Returns the filename of the .dbf file of the shapefile :shapefilename:
+"""
+def dbf_filename(shapefilename):
+    return os.path.splitext(shapefilename)[0] + '.dbf'
+
+"""
+read_records
+------------
+Returns a dict of the .dbf attributes of every record of the
+shapefile :shapefilename:, with text attributes stripped of padding
+"""
+def read_records(shapefilename):
+    with open(dbf_filename(shapefilename), 'rb') as f:
+        reader = shapefile.Reader(dbf=f)
+        fields = [field[0] for field in reader.fields[1:]]
+        records = reader.records()
+    return [
+        dict((field, value.strip() if isinstance(value, basestring) else value) for field, value in zip(fields, record))
+        for record in records
+    ]
+
+"""
+read_zone_rings
+---------------
+Returns the rings of every shape of the shapefile :shapefilename:, as
+lists of (longitude, latitude) tuples, one list of rings per shape
+"""
+def read_zone_rings(shapefilename):
+    zones = []
+    for shape in shapefile.Reader(shapefilename).shapes():
+        starts = list(shape.parts) + [len(shape.points)]
+        zones.append([
+            [tuple(point[:2]) for point in shape.points[starts[i]:starts[i + 1]]]
+            for i in xrange(len(starts) - 1)
+        ])
+    return zones
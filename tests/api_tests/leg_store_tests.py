@@ -0,0 +1,52 @@
+from steerclear import app, db
+from steerclear.api.leg_store import DBLegStore
+from tests.base import base
+
+from testfixtures import Replacer, test_datetime
+from datetime import datetime
+
+"""
+DBLegStoreTestCase
+------------------
+Test cases for the db backed tier of the distance matrix leg cache
+"""
+class DBLegStoreTestCase(base.SteerClearBaseTestCase):
+
+    """
+    test_legs
+    ---------
+    Tests that stored legs can be read back by
+    their grid cell keys and that storing a leg again replaces it
+    """
+    def test_legs(self):
+        store = DBLegStore(60)
+        a, b, c = (37272, -76714), (37273, -76720), (-1, 2)
+        store.set_legs([((a, b), 120), ((b, c), 60)])
+        store.set_legs([((a, b), 130)])
+        self.assertEquals(store.get_legs(set([(a, b), (b, c), (a, c)])), {(a, b): 130, (b, c): 60})
+
+    """
+    test_addresses
+    --------------
+    Tests that stored addresses can be read back by their grid cell keys
+    """
+    def test_addresses(self):
+        store = DBLegStore(60)
+        store.set_addresses([((37272, -76714), u'2006 Brooks Street')])
+        self.assertEquals(store.get_addresses(set([(37272, -76714), (0, 0)])), {(37272, -76714): u'2006 Brooks Street'})
+
+    """
+    test_ttl
+    --------
+    Tests that legs stored more than ttl seconds ago are not returned
+    """
+    def test_ttl(self):
+        store = DBLegStore(60)
+        key = ((37272, -76714), (37273, -76720))
+        with Replacer() as r:
+            r.replace('steerclear.api.leg_store.datetime', test_datetime(2015,6,13,1,0,0, delta=0))
+            store.set_legs([(key, 120)])
+            r.replace('steerclear.api.leg_store.datetime', test_datetime(2015,6,13,1,0,59, delta=0))
+            self.assertEquals(store.get_legs([key]), {key: 120})
+            r.replace('steerclear.api.leg_store.datetime', test_datetime(2015,6,13,1,1,1, delta=0))
+            self.assertEquals(store.get_legs([key]), {})
@@ -43,7 +43,8 @@ class RideModelTestCase(base.SteerClearBaseTestCase):
             'dropoff_time': datetime(1,1,1),
             'pickup_address': 'Foo',
             'dropoff_address': 'Bar',
-            'on_campus': True
+            'on_campus': True,
+            'eta_estimated': False
         }
         self.assertEquals(self.default_ride.as_dict(), correct_default_dict)
 
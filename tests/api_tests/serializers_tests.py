@@ -0,0 +1,48 @@
+from steerclear import app, db
+from steerclear.models import Ride
+from steerclear.api.views import ride_fields
+from steerclear.api.serializers import *
+from tests.base import base
+
+from flask_restful import marshal
+from datetime import datetime
+
+"""
+RideSerializerTestCase
+----------------------
+Test cases for the Ride serializer that reads rows
+straight from a core select instead of going through
+Ride.as_dict() and marshal()
+"""
+class RideSerializerTestCase(base.SteerClearBaseTestCase):
+
+    """
+    test_format_rfc822
+    ------------------
+    Tests that dates are formatted exactly like fields.DateTime does
+    """
+    def test_format_rfc822(self):
+        field = ride_fields['pickup_time']
+        for dt in [datetime(1,1,1), datetime(2015,6,13,1,2,3,999999), datetime(2016,2,29,23,59,59)]:
+            self.assertEquals(format_rfc822(dt), field.format(dt))
+        self.assertEquals(format_rfc822(None), None)
+
+    """
+    test_serialize_rides_matches_marshal
+    ------------------------------------
+    Tests that serialized Rides are the same as the marshalled Rides
+    """
+    def test_serialize_rides_matches_marshal(self):
+        self._create_ride(self.student_user)
+        self._create_ride(
+            self.admin_user, num_passengers=3, start_latitude=37.2735,
+            start_longitude=-76.7196, pickup_time=datetime(2015,6,13,1,2,3),
+            dropoff_time=datetime(2015,6,13,1,6,2), pickup_address=u'2006 Brooks Street',
+            on_campus=False
+        )
+        expected = marshal(map(Ride.as_dict, Ride.query.order_by(Ride.id).all()), ride_fields)
+        self.assertEquals(serialize_rides(Ride.query.order_by(Ride.id)), expected)
+
+        # filters and limits on the query are kept
+        rides = serialize_rides(Ride.query.filter_by(on_campus=False).limit(1))
+        self.assertEquals(rides, expected[1:])
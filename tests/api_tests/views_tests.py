@@ -1,12 +1,21 @@
-from steerclear import app, db
-from steerclear.models import Ride
-from steerclear.api.views import query_distance_matrix_api
+from steerclear import app, db, ride_queue_cache
+from steerclear.models import Ride, Vehicle, RideRequest, RideEvent
+from steerclear.api.views import (
+    query_distance_matrix_api,
+    queue_tails,
+    query_cheapest_insertion,
+    shift_rides,
+    process_ride_request,
+    refine_estimated_rides,
+    RIDE_REQUEST_TIMEOUT
+)
+from steerclear.utils.eta import DMResponse
 from tests.base import base
 
-from testfixtures import replace, test_datetime
+from testfixtures import replace, test_datetime, Replacer
 from flask import url_for
 from datetime import datetime, timedelta
-import vcr
+import vcr, json
 
 # vcr object used to record api request responses or return already recorded responses
 myvcr = vcr.VCR(cassette_library_dir='tests/fixtures/vcr_cassettes/api_tests/')
@@ -60,7 +69,7 @@ class RideListAPITestCase(base.SteerClearBaseTestCase):
         self._login(self.admin_user)
         response = self.client.get(url_for('api.rides'))
         self.assertEquals(response.status_code, 200)
-        self.assertEquals(response.json, {"rides": []})
+        self.assertEquals(response.json, {"rides": [], "last_event_id": 0})
 
     """
     test_get_ride_list_not_empty_list
@@ -91,7 +100,7 @@ class RideListAPITestCase(base.SteerClearBaseTestCase):
         # test response
         response = self.client.get(url_for('api.rides'))
         self.assertEquals(response.status_code, 200)
-        self.assertEquals(response.json, {'rides': [r1_dict, r2_dict, r3_dict]})
+        self.assertEquals(response.json, {'rides': [r1_dict, r2_dict, r3_dict], 'last_event_id': 0})
 
     """
     test_get_ride_list_filter_by_location
@@ -170,6 +179,149 @@ class RideListAPITestCase(base.SteerClearBaseTestCase):
         self.assertEquals(on_campus_count, n+1)
         self.assertEquals(off_campus_count, n)
 
+    """
+    test_get_ride_list_keyset_pagination
+    ------------------------------------
+    Tests that the ride queue can be paged through
+    using the after_id and limit query string values
+    """
+    def test_get_ride_list_keyset_pagination(self):
+        self._login(self.admin_user)
+        for _ in xrange(5):
+            self._create_ride(self.admin_user)
+
+        # first page should start at the beginning of the queue
+        response = self.client.get(url_for('api.rides', limit=2))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals([r['id'] for r in response.json['rides']], [1, 2])
+        self.assertEquals(response.json['next_after_id'], 2)
+
+        # next page should start after the cursor
+        response = self.client.get(url_for('api.rides', after_id=2, limit=2))
+        self.assertEquals([r['id'] for r in response.json['rides']], [3, 4])
+        self.assertEquals(response.json['next_after_id'], 4)
+
+        # last page is not full so there is no next cursor
+        response = self.client.get(url_for('api.rides', after_id=4, limit=2))
+        self.assertEquals([r['id'] for r in response.json['rides']], [5])
+        self.assertEquals(response.json['next_after_id'], None)
+
+        # malformed pagination values return 400
+        response = self.client.get(url_for('api.rides', after_id='foo'))
+        self.assertEquals(response.status_code, 400)
+        response = self.client.get(url_for('api.rides', limit=0))
+        self.assertEquals(response.status_code, 400)
+
+    """
+    test_get_ride_list_stream
+    -------------------------
+    Tests that streaming the ride queue returns the
+    same json object as the regular ride list response
+    """
+    def test_get_ride_list_stream(self):
+        self._login(self.admin_user)
+        self._create_ride(self.admin_user, on_campus=True)
+        self._create_ride(self.admin_user, on_campus=False)
+        self._create_ride(self.admin_user, on_campus=True)
+
+        expected = self.client.get(url_for('api.rides')).json
+        response = self.client.get(url_for('api.rides', stream='true'))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(json.loads(response.data), expected)
+
+        # streaming honors the location filter and cursor
+        response = self.client.get(url_for('api.rides', stream='true', location='on_campus', after_id=1))
+        self.assertEquals([r['id'] for r in json.loads(response.data)['rides']], [3])
+
+    """
+    test_get_ride_list_stream_batches
+    ---------------------------------
+    Tests that a streamed ride queue longer than a batch is
+    queried a batch at a time and the limit holds across batches
+    """
+    def test_get_ride_list_stream_batches(self):
+        self._login(self.admin_user)
+        for _ in xrange(5):
+            self._create_ride(self.admin_user)
+
+        with Replacer() as r:
+            r.replace('steerclear.api.views.RIDE_LIST_STREAM_BATCH_SIZE', 2)
+            response = self.client.get(url_for('api.rides', stream='true'))
+            self.assertEquals([ride['id'] for ride in json.loads(response.data)['rides']], [1, 2, 3, 4, 5])
+            response = self.client.get(url_for('api.rides', stream='true', limit=3, after_id=1))
+            self.assertEquals([ride['id'] for ride in json.loads(response.data)['rides']], [2, 3, 4])
+
+    """
+    test_get_ride_list_etag
+    -----------------------
+    Tests that polling an unchanged ride queue with the
+    ETag of the last response returns 304, and that changing
+    the queue changes the ETag
+    """
+    def test_get_ride_list_etag(self):
+        self._login(self.admin_user)
+        ride = self._create_ride(self.admin_user)
+
+        response = self.client.get(url_for('api.rides'))
+        self.assertEquals(response.status_code, 200)
+        etag = response.headers['ETag']
+
+        # unchanged queue returns 304 with no body
+        response = self.client.get(url_for('api.rides'), headers={'If-None-Match': etag})
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response.data, '')
+
+        # each location filter variant has its own ETag
+        response = self.client.get(url_for('api.rides', location='on_campus'), headers={'If-None-Match': etag})
+        self.assertEquals(response.status_code, 200)
+
+        # deleting a ride changes the ETag and the cached body
+        self.client.delete(url_for('api.ride', ride_id=ride.id))
+        response = self.client.get(url_for('api.rides'), headers={'If-None-Match': etag})
+        self.assertEquals(response.status_code, 200)
+        self.assertNotEquals(response.headers['ETag'], etag)
+        self.assertEquals(response.json, {'rides': [], 'last_event_id': 1})
+
+    """
+    test_get_ride_list_commit_before_version
+    ----------------------------------------
+    Tests that a ride committed by another worker after the login
+    queries ran but before the queue version was read is part of
+    the body cached and returned under that version
+    """
+    def test_get_ride_list_commit_before_version(self):
+        self._login(self.admin_user)
+        self._create_ride(self.admin_user)
+        user_id = self.student_user.id
+
+        # another worker commits a ride (and bumps the version)
+        # right before the list reads the queue version
+        version = ride_queue_cache.version
+        def version_after_commit():
+            if not committed:
+                committed.append(True)
+                session = db.create_scoped_session()
+                session.add(Ride(
+                    num_passengers=1, start_latitude=1.0, start_longitude=1.1, end_latitude=2.0,
+                    end_longitude=2.1, pickup_time=datetime(1,1,1), travel_time=10,
+                    dropoff_time=datetime(1,1,1), pickup_address='Foo', dropoff_address='Bar',
+                    on_campus=True, user_id=user_id
+                ))
+                session.commit()
+                session.remove()
+            return version()
+        committed = []
+
+        with Replacer() as r:
+            r.replace('steerclear.api.views.ride_queue_cache.version', version_after_commit)
+            response = self.client.get(url_for('api.rides'))
+        self.assertEquals(committed, [True])
+        self.assertEquals([ride['id'] for ride in response.json['rides']], [1, 2])
+
+        # the ETag of the response stands for both rides
+        response = self.client.get(url_for('api.rides'), headers={'If-None-Match': response.headers['ETag']})
+        self.assertEquals(response.status_code, 304)
+
     """
     test_post_ride_list_requires_login
     ----------------------------------
@@ -207,7 +359,8 @@ class RideListAPITestCase(base.SteerClearBaseTestCase):
             u"dropoff_time": expected_dropoff_string,
             u'pickup_address': u'2006 Brooks Street, Williamsburg, VA 23185, USA',
             u'dropoff_address': u'1234 Richmond Road, Williamsburg, VA 23185, USA',
-            u'on_campus': True
+            u'on_campus': True,
+            u'eta_estimated': False
           }
 
         response = self.client.post(url_for('api.rides'), data=payload)
@@ -216,6 +369,35 @@ class RideListAPITestCase(base.SteerClearBaseTestCase):
         self.assertEquals(response.json, {u"ride": payload})
         self.assertEquals(Ride.query.get(1).user, self.student_user)
 
+    """
+    test_post_ride_list_estimated
+    -----------------------------
+    Tests that a ride request created while the distance matrix api
+    is unavailable is flagged as estimated and gets refined later
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,2,3))
+    def test_post_ride_list_estimated(self):
+        self._login(self.student_user)
+        payload = {
+            u"num_passengers": 3,
+            u"start_latitude": 37.2735,
+            u"start_longitude": -76.7196,
+            u"end_latitude": 37.2809,
+            u"end_longitude": -76.7197,
+        }
+        client = FakeDMClient([[0, 239]])
+        client.estimated = True
+        scheduled = []
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            r.replace('steerclear.api.views.schedule_eta_refinement', lambda: scheduled.append(True))
+            response = self.client.post(url_for('api.rides'), data=payload)
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(response.json['ride']['eta_estimated'], True)
+        self.assertEquals(response.json['ride']['travel_time'], 239)
+        self.assertTrue(Ride.query.get(1).eta_estimated)
+        self.assertEquals(scheduled, [True])
+
     """
     test_post_ride_list_pickup_loc_outside_radius
     ---------------------------------------------
@@ -301,6 +483,308 @@ class RideListAPITestCase(base.SteerClearBaseTestCase):
         r = self.client.post(url_for('api.rides'), data=bad_payload)
         self.assertEquals(r.status_code, 400)
 
+    """
+    test_post_ride_list_async
+    -------------------------
+    Tests that an async ride request returns 202 and a pending
+    ride request right away, and that the ride request points
+    to the created ride once the background job has run
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,2,3, delta=0))
+    def test_post_ride_list_async(self):
+        self._login(self.student_user)
+        payload = {
+            u"num_passengers": 3,
+            u"start_latitude": 37.2735,
+            u"start_longitude": -76.7196,
+            u"end_latitude": 37.2809,
+            u"end_longitude": -76.7197,
+        }
+
+        pool = FakeWorkerPool()
+        with Replacer() as r:
+            r.replace('steerclear.api.views.ride_worker_pool', pool)
+            response = self.client.post(url_for('api.rides', async='true'), data=payload)
+        self.assertEquals(response.status_code, 202)
+        self.assertEquals(response.json, {u'ride_request': {u'id': 1, u'status': u'pending', u'ride_id': None}})
+        self.assertTrue(response.headers['Location'].endswith(url_for('api.ride_request', ride_request_id=1)))
+        self.assertEquals(pool.jobs, [(process_ride_request, (1,))])
+        self.assertEquals(Ride.query.count(), 0)
+
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.json, {u'ride_request': {u'id': 1, u'status': u'pending', u'ride_id': None}})
+
+        # run the background job
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', FakeDMClient([[239]]))
+            process_ride_request(1)
+
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json[u'ride_request'], {u'id': 1, u'status': u'created', u'ride_id': 1})
+        self.assertEquals(response.json[u'ride'][u'pickup_time'], u'Sat, 13 Jun 2015 01:12:03 -0000')
+        self.assertEquals(response.json[u'ride'][u'travel_time'], 239)
+        self.assertEquals(response.json[u'ride'][u'pickup_address'], u'pickup')
+        self.assertEquals(Ride.query.get(1).user.username, 'student')
+
+    """
+    test_post_ride_list_async_failed
+    --------------------------------
+    Tests that a ride request is marked as failed if
+    the background job can not compute its etas
+    """
+    def test_post_ride_list_async_failed(self):
+        self._login(self.student_user)
+        payload = {
+            u"num_passengers": 3,
+            u"start_latitude": 37.2735,
+            u"start_longitude": -76.7196,
+            u"end_latitude": 37.2809,
+            u"end_longitude": -76.7197,
+        }
+        with Replacer() as r:
+            r.replace('steerclear.api.views.ride_worker_pool', FakeWorkerPool())
+            self.client.post(url_for('api.rides', async='true'), data=payload)
+            r.replace('steerclear.api.views.dm_client', FakeDMClient([[]]))
+            process_ride_request(1)
+
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.json, {u'ride_request': {u'id': 1, u'status': u'failed', u'ride_id': None}})
+        self.assertEquals(Ride.query.count(), 0)
+
+    """
+    test_post_ride_list_async_error
+    -------------------------------
+    Tests that a ride request is marked as failed if the
+    background job fails with an unexpected exception
+    """
+    def test_post_ride_list_async_error(self):
+        self._login(self.student_user)
+        payload = {
+            u"num_passengers": 3,
+            u"start_latitude": 37.2735,
+            u"start_longitude": -76.7196,
+            u"end_latitude": 37.2809,
+            u"end_longitude": -76.7197,
+        }
+        with Replacer() as r:
+            r.replace('steerclear.api.views.ride_worker_pool', FakeWorkerPool())
+            self.client.post(url_for('api.rides', async='true'), data=payload)
+            r.replace('steerclear.api.views.dm_client', FailingDMClient())
+            process_ride_request(1)
+
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.json, {u'ride_request': {u'id': 1, u'status': u'failed', u'ride_id': None}})
+        self.assertEquals(Ride.query.count(), 0)
+
+    """
+    test_get_ride_request_timeout
+    -----------------------------
+    Tests that a ride request left pending for longer than
+    RIDE_REQUEST_TIMEOUT (e.x. its worker was restarted) is
+    failed, and is never picked up by a background job
+    """
+    def test_get_ride_request_timeout(self):
+        ride_request = RideRequest(
+            num_passengers=1, start_latitude=37.2735, start_longitude=-76.7196,
+            end_latitude=37.2809, end_longitude=-76.7197, on_campus=True, user=self.student_user,
+            created=datetime.utcnow() - timedelta(0, 60)
+        )
+        db.session.add(ride_request)
+        db.session.commit()
+
+        self._login(self.student_user)
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.json[u'ride_request'][u'status'], u'pending')
+
+        ride_request = RideRequest.query.get(1)
+        ride_request.created = datetime.utcnow() - timedelta(0, RIDE_REQUEST_TIMEOUT + 60)
+        db.session.commit()
+        client = FakeDMClient([[239]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            process_ride_request(1)
+        self.assertEquals(client.queries, [])
+        self.assertEquals(Ride.query.count(), 0)
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.json, {u'ride_request': {u'id': 1, u'status': u'failed', u'ride_id': None}})
+
+        # a stale request nobody picked up is failed once its client polls it
+        ride_request = RideRequest(
+            num_passengers=1, start_latitude=37.2735, start_longitude=-76.7196,
+            end_latitude=37.2809, end_longitude=-76.7197, on_campus=True, user=self.student_user,
+            created=datetime.utcnow() - timedelta(0, RIDE_REQUEST_TIMEOUT + 60)
+        )
+        db.session.add(ride_request)
+        db.session.commit()
+        response = self.client.get(url_for('api.ride_request', ride_request_id=2))
+        self.assertEquals(response.json, {u'ride_request': {u'id': 2, u'status': u'failed', u'ride_id': None}})
+
+    """
+    test_get_ride_request_permissions
+    ---------------------------------
+    Tests that only the user who made a ride request
+    and admins can check on it
+    """
+    def test_get_ride_request_permissions(self):
+        ride_request = RideRequest(
+            num_passengers=1, start_latitude=1.0, start_longitude=1.0,
+            end_latitude=2.0, end_longitude=2.0, on_campus=True, user=self.student_user
+        )
+        db.session.add(ride_request)
+        db.session.commit()
+
+        self._login(self.student_user2)
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.status_code, 403)
+        response = self.client.get(url_for('api.ride_request', ride_request_id=2))
+        self.assertEquals(response.status_code, 404)
+
+        self._login(self.admin_user)
+        response = self.client.get(url_for('api.ride_request', ride_request_id=1))
+        self.assertEquals(response.status_code, 200)
+
+    """
+    test_post_ride_batch_requires_admin_permission
+    ----------------------------------------------
+    Tests that only admins can create rides in a batch
+    """
+    def test_post_ride_batch_requires_admin_permission(self):
+        self._login(self.student_user)
+        response = self.client.post(url_for('api.rides_batch'), data=json.dumps({'rides': []}), content_type='application/json')
+        self.assertEquals(response.status_code, 403)
+
+    """
+    test_post_ride_batch
+    --------------------
+    Tests that a batch of rides is chained onto the end of
+    the queue in order using a single request for the legs
+    between rides and a single request for the travel times
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,2,3, delta=0))
+    def test_post_ride_batch(self):
+        self._login(self.admin_user)
+        payload = {'rides': [
+            {'num_passengers': 3, 'start_latitude': 37.2735, 'start_longitude': -76.7196,
+             'end_latitude': 37.2809, 'end_longitude': -76.7197},
+            {'num_passengers': 1, 'start_latitude': 37.2750, 'start_longitude': -76.7200,
+             'end_latitude': 37.2800, 'end_longitude': -76.7150},
+        ]}
+
+        client = DistanceDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            response = self.client.post(url_for('api.rides_batch'), data=json.dumps(payload), content_type='application/json')
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(client.queries, [
+            ([(37.2809, -76.7197)], [(37.2735, -76.7196), (37.2750, -76.7200)]),
+            ([(37.2735, -76.7196), (37.2750, -76.7200)], [(37.2809, -76.7197), (37.2800, -76.7150)]),
+        ])
+
+        # first ride is picked up by the idle van in 10 minutes.
+        # second ride is picked up 62 seconds after the first is dropped off
+        rides = response.json['rides']
+        self.assertEquals([ride['id'] for ride in rides], [1, 2])
+        self.assertEquals(rides[0]['pickup_time'], 'Sat, 13 Jun 2015 01:12:03 -0000')
+        self.assertEquals(rides[0]['travel_time'], 75)
+        self.assertEquals(rides[0]['dropoff_time'], 'Sat, 13 Jun 2015 01:13:18 -0000')
+        self.assertEquals(rides[0]['pickup_address'], '37.273500,-76.719600')
+        self.assertEquals(rides[0]['dropoff_address'], '37.280900,-76.719700')
+        self.assertEquals(rides[1]['pickup_time'], 'Sat, 13 Jun 2015 01:14:20 -0000')
+        self.assertEquals(rides[1]['travel_time'], 100)
+        self.assertEquals(rides[1]['dropoff_time'], 'Sat, 13 Jun 2015 01:16:00 -0000')
+        self.assertEquals(Ride.query.count(), 2)
+        self.assertEquals(Ride.query.get(2).user, self.admin_user)
+        self.assertEquals(queue_tails()[None].id, 2)
+
+    """
+    test_post_ride_batch_multiple_vehicles
+    --------------------------------------
+    Tests that every ride in a batch goes to the vehicle
+    that can pick it up soonest after the rides before it
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,2,3, delta=0))
+    def test_post_ride_batch_multiple_vehicles(self):
+        v1 = Vehicle(name='van1')
+        v2 = Vehicle(name='van2')
+        db.session.add_all([v1, v2])
+        db.session.commit()
+        self._login(self.admin_user)
+        payload = {'rides': [
+            {'num_passengers': 3, 'start_latitude': 37.2735, 'start_longitude': -76.7196,
+             'end_latitude': 37.2809, 'end_longitude': -76.7197},
+            {'num_passengers': 1, 'start_latitude': 37.2750, 'start_longitude': -76.7200,
+             'end_latitude': 37.2800, 'end_longitude': -76.7150},
+        ]}
+
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', DistanceDMClient())
+            response = self.client.post(url_for('api.rides_batch'), data=json.dumps(payload), content_type='application/json')
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(Ride.query.get(1).vehicle_id, v1.id)
+        self.assertEquals(Ride.query.get(2).vehicle_id, v2.id)
+        self.assertEquals(Ride.query.get(2).pickup_time, datetime(2015,6,13,1,12,3))
+
+    """
+    test_post_ride_batch_single_vehicle
+    -----------------------------------
+    Tests that with a single vehicle only the leg from each ride
+    (or the queue tail) to the next ride in the batch is fetched,
+    rather than every leg a ride could be chained onto
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,2,3, delta=0))
+    def test_post_ride_batch_single_vehicle(self):
+        self._create_ride(self.admin_user, end_latitude=37.2735, end_longitude=-76.7196, dropoff_time=datetime(2015,6,13,1,0,0))
+        self._login(self.admin_user)
+        payload = {'rides': [
+            {'num_passengers': 1, 'start_latitude': 37.2735 + 0.0001 * i, 'start_longitude': -76.7196,
+             'end_latitude': 37.2800, 'end_longitude': -76.7150 - 0.0001 * i}
+            for i in xrange(30)
+        ]}
+
+        client = DistanceDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            response = self.client.post(url_for('api.rides_batch'), data=json.dumps(payload), content_type='application/json')
+        self.assertEquals(response.status_code, 201)
+
+        # the legs and the travel times are both the diagonal
+        # of a 30x30 matrix, fetched as three 10x10 tiles each
+        self.assertEquals(len(client.queries), 6)
+        self.assertEquals(sum(len(o) * len(d) for o, d in client.queries), 600)
+
+        # every ride is picked up right after the one before it is dropped off
+        rides = Ride.query.order_by(Ride.id).all()
+        for previous_ride, ride in zip(rides, rides[1:]):
+            leg_time = int(round(10000 * (abs(previous_ride.end_latitude - ride.start_latitude) +
+                                          abs(previous_ride.end_longitude - ride.start_longitude))))
+            self.assertEquals(ride.leg_time, leg_time)
+            self.assertEquals(ride.pickup_time, previous_ride.dropoff_time + timedelta(0, leg_time))
+
+    """
+    test_post_ride_batch_bad_ride
+    -----------------------------
+    Tests that no rides are created if any ride in the batch is invalid
+    """
+    def test_post_ride_batch_bad_ride(self):
+        self._login(self.admin_user)
+        ride = {'num_passengers': 3, 'start_latitude': 37.2735, 'start_longitude': -76.7196,
+                'end_latitude': 37.2809, 'end_longitude': -76.7197}
+        bad_payloads = [
+            {},
+            {'rides': []},
+            {'rides': [ride, {'num_passengers': 3}]},
+            {'rides': [ride, dict(ride, start_latitude=37.269850, start_longitude=-76.758869)]},
+            {'rides': [ride] * 101},
+        ]
+        client = DistanceDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            for payload in bad_payloads:
+                response = self.client.post(url_for('api.rides_batch'), data=json.dumps(payload), content_type='application/json')
+                self.assertEquals(response.status_code, 400)
+        self.assertEquals(client.queries, [])
+        self.assertEquals(Ride.query.count(), 0)
 
 """
 RideAPITestCase
@@ -524,6 +1008,109 @@ class RideAPITestCase(base.SteerClearBaseTestCase):
         self.assertEquals(Ride.query.get(2), None)
         self.assertEquals(Ride.query.get(3), None)
 
+    """
+    test_delete_ride_closes_queue_gap
+    ---------------------------------
+    Tests that deleting a ride that has not been picked up yet
+    moves up every ride after it using a single new leg
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,0,50,0, delta=0))
+    def test_delete_ride_closes_queue_gap(self):
+        self._login(self.admin_user)
+        r1 = self._create_ride(
+            self.student_user, end_latitude=1.0, end_longitude=1.0,
+            pickup_time=datetime(2015,6,13,1,0,0), dropoff_time=datetime(2015,6,13,1,10,0)
+        )
+        r2 = self._create_ride(
+            self.student_user, end_latitude=2.0, end_longitude=2.0,
+            pickup_time=datetime(2015,6,13,1,15,0), dropoff_time=datetime(2015,6,13,1,25,0)
+        )
+        r3 = self._create_ride(
+            self.student_user, start_latitude=3.0, start_longitude=3.0,
+            pickup_time=datetime(2015,6,13,1,30,0), dropoff_time=datetime(2015,6,13,1,40,0)
+        )
+        r4 = self._create_ride(
+            self.student_user,
+            pickup_time=datetime(2015,6,13,1,45,0), dropoff_time=datetime(2015,6,13,1,50,0)
+        )
+        r3_id, r4_id = r3.id, r4.id
+
+        # r1 -> r3 takes 8 minutes, so r3 and r4 move up 12 minutes
+        client = FakeDMClient([[480]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            response = self.client.delete(url_for('api.ride', ride_id=r2.id))
+        self.assertEquals(response.status_code, 204)
+        self.assertEquals(client.queries, [([(1.0, 1.0)], [(3.0, 3.0)])])
+        self.assertEquals(Ride.query.get(1).pickup_time, datetime(2015,6,13,1,0,0))
+        self.assertEquals(Ride.query.get(r3_id).pickup_time, datetime(2015,6,13,1,18,0))
+        self.assertEquals(Ride.query.get(r3_id).dropoff_time, datetime(2015,6,13,1,28,0))
+        self.assertEquals(Ride.query.get(r3_id).leg_time, 480)
+        self.assertEquals(Ride.query.get(r4_id).pickup_time, datetime(2015,6,13,1,33,0))
+
+        # deleting the first ride makes the next ride an idle pickup in 10 minutes
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', FakeDMClient())
+            response = self.client.delete(url_for('api.ride', ride_id=1))
+        self.assertEquals(Ride.query.get(r3_id).pickup_time, datetime(2015,6,13,1,0,0))
+        self.assertEquals(Ride.query.get(r3_id).leg_time, None)
+        self.assertEquals(Ride.query.get(r4_id).pickup_time, datetime(2015,6,13,1,15,0))
+
+    """
+    test_delete_ride_closes_queue_gap_after_dropoff
+    -----------------------------------------------
+    Tests that when the ride before the deleted ride was already
+    dropped off, the rides after it are only moved up to now
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,12,0, delta=0))
+    def test_delete_ride_closes_queue_gap_after_dropoff(self):
+        self._login(self.admin_user)
+        r1 = self._create_ride(
+            self.student_user, end_latitude=1.0, end_longitude=1.0,
+            pickup_time=datetime(2015,6,13,1,0,0), dropoff_time=datetime(2015,6,13,1,10,0)
+        )
+        r2 = self._create_ride(
+            self.student_user, end_latitude=2.0, end_longitude=2.0,
+            pickup_time=datetime(2015,6,13,1,15,0), dropoff_time=datetime(2015,6,13,1,25,0)
+        )
+        r3 = self._create_ride(
+            self.student_user, start_latitude=3.0, start_longitude=3.0,
+            pickup_time=datetime(2015,6,13,1,30,0), dropoff_time=datetime(2015,6,13,1,40,0)
+        )
+        r3_id = r3.id
+
+        # r1 -> r3 takes 1 minute, but r1 was dropped off 2 minutes ago
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', FakeDMClient([[60]]))
+            response = self.client.delete(url_for('api.ride', ride_id=r2.id))
+        self.assertEquals(response.status_code, 204)
+        self.assertEquals(Ride.query.get(r3_id).pickup_time, datetime(2015,6,13,1,12,0))
+        self.assertEquals(Ride.query.get(r3_id).dropoff_time, datetime(2015,6,13,1,22,0))
+        self.assertEquals(Ride.query.get(r3_id).leg_time, 60)
+
+    """
+    test_delete_ride_already_picked_up
+    ----------------------------------
+    Tests that deleting a ride that was already picked
+    up (e.x. a finished ride) does not move up the queue
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,20,0, delta=0))
+    def test_delete_ride_already_picked_up(self):
+        self._login(self.admin_user)
+        r1 = self._create_ride(
+            self.student_user, pickup_time=datetime(2015,6,13,1,0,0), dropoff_time=datetime(2015,6,13,1,10,0)
+        )
+        r2 = self._create_ride(
+            self.student_user, pickup_time=datetime(2015,6,13,1,30,0), dropoff_time=datetime(2015,6,13,1,40,0)
+        )
+        client = FakeDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            response = self.client.delete(url_for('api.ride', ride_id=1))
+        self.assertEquals(response.status_code, 204)
+        self.assertEquals(client.queries, [])
+        self.assertEquals(Ride.query.get(2).pickup_time, datetime(2015,6,13,1,30,0))
+
     """
     test_delete_ride_can_only_delete_accessible_ride
     ------------------------------------------
@@ -561,6 +1148,107 @@ class RideAPITestCase(base.SteerClearBaseTestCase):
         self.assertEquals(response.status_code, 204)
 
 
+"""
+RideEventStreamAPITestCase
+--------------------------
+Test cases for the RideEventStreamAPI class that pushes
+ride queue changes out as server-sent events
+"""
+class RideEventStreamAPITestCase(base.SteerClearBaseTestCase):
+
+    """
+    test_get_ride_events_requires_admin_permission
+    ----------------------------------------------
+    Tests that the ride event stream requires the User to be an admin
+    """
+    def test_get_ride_events_requires_admin_permission(self):
+        self._test_url_requires_roles(
+            self.client.get,
+            url_for('api.ride_events', last_event_id='foo'),
+            [self.admin_role]
+        )
+
+    """
+    test_get_ride_events_replay
+    ---------------------------
+    Tests that a client reconnecting with a Last-Event-ID
+    is replayed the events it missed in order
+    """
+    def test_get_ride_events_replay(self):
+        self._login(self.admin_user)
+        r1 = self._create_ride(self.admin_user)
+        r2 = self._create_ride(self.admin_user)
+        self.client.delete(url_for('api.ride', ride_id=r1.id))
+        self.client.delete(url_for('api.ride', ride_id=r2.id))
+
+        response = self.client.get(
+            url_for('api.ride_events'),
+            headers={'Last-Event-ID': '1'},
+            buffered=False
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.mimetype, 'text/event-stream')
+
+        chunks = iter(response.response)
+        self.assertEquals(next(chunks), 'retry: 3000\n\n')
+        self.assertEquals(next(chunks), 'id: 2\nevent: ride-deleted\ndata: {"id": 2}\n\n')
+        response.close()
+
+    """
+    test_get_ride_events_after_ride_list
+    ------------------------------------
+    Tests that a client streaming events after the last_event_id of
+    the ride queue it loaded gets the changes made since it was loaded
+    """
+    def test_get_ride_events_after_ride_list(self):
+        self._login(self.admin_user)
+        r1 = self._create_ride(self.admin_user)
+        r2 = self._create_ride(self.admin_user)
+        self.client.delete(url_for('api.ride', ride_id=r1.id))
+
+        response = self.client.get(url_for('api.rides'))
+        self.assertEquals([ride['id'] for ride in response.json['rides']], [r2.id])
+        last_event_id = response.json['last_event_id']
+        self.assertEquals(last_event_id, 1)
+
+        # changed before the stream is opened
+        self.client.delete(url_for('api.ride', ride_id=r2.id))
+
+        response = self.client.get(url_for('api.ride_events', last_event_id=last_event_id), buffered=False)
+        chunks = iter(response.response)
+        self.assertEquals(next(chunks), 'retry: 3000\n\n')
+        self.assertEquals(next(chunks), 'id: 2\nevent: ride-deleted\ndata: {"id": 2}\n\n')
+        response.close()
+
+"""
+StatsAPITestCase
+----------------
+Test case for the worker stats api
+"""
+class StatsAPITestCase(base.SteerClearBaseTestCase):
+
+    """
+    test_get_stats
+    --------------
+    Tests that admins can get the distance
+    matrix api client counters and students can not
+    """
+    def test_get_stats(self):
+        self._login(self.student_user)
+        response = self.client.get(url_for('api.stats'))
+        self.assertEquals(response.status_code, 403)
+
+        self._login(self.admin_user)
+        response = self.client.get(url_for('api.stats'))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            sorted(response.json['distance_matrix'].keys()),
+            [u'breaker_failure_ratio', u'breaker_latency', u'breaker_opened', u'breaker_state',
+             u'cache_grid_hits', u'cache_hit_ratio', u'cache_hits', u'cache_misses', u'cache_size', u'cache_store_hits',
+             u'coalesced', u'connections', u'errors', u'estimate_speed', u'estimates', u'requests', u'reused',
+             u'short_circuited']
+        )
+
 """
 NotificationAPITestCase
 -----------------------
@@ -692,3 +1380,397 @@ class ETAAPITestCase(base.SteerClearBaseTestCase):
         dropoff_loc = (0.0, 0.0)
         result = query_distance_matrix_api(pickup_loc, dropoff_loc)
         self.assertEquals(result, None)
+
+    """
+    test_queue_tails
+    ----------------
+    Tests that the cached queue tail follows rides
+    being added to and removed from the queue
+    """
+    def test_queue_tails(self):
+        self.assertEquals(queue_tails(), {None: None})
+
+        r1 = self._create_ride(self.student_user, end_latitude=1.0, dropoff_time=datetime(2015,6,13,1,2,3))
+        r2 = self._create_ride(self.student_user, end_latitude=2.0, dropoff_time=datetime(2015,6,13,2,2,3))
+        tail = queue_tails()[None]
+        self.assertEquals(tail.id, r2.id)
+        self.assertEquals(tail.end_latitude, 2.0)
+        self.assertEquals(tail.dropoff_time, datetime(2015,6,13,2,2,3))
+
+        db.session.delete(r2)
+        db.session.commit()
+        self.assertEquals(queue_tails()[None].id, r1.id)
+
+        db.session.delete(r1)
+        db.session.commit()
+        self.assertEquals(queue_tails(), {None: None})
+
+    """
+    test_queue_tails_multiple_vehicles
+    ----------------------------------
+    Tests that there is a queue tail for every active vehicle
+    """
+    def test_queue_tails_multiple_vehicles(self):
+        v1 = self._create_vehicle('van1')
+        v2 = self._create_vehicle('van2')
+        v3 = self._create_vehicle('van3', active=False)
+        r1 = self._create_ride(self.student_user, vehicle=v1)
+        r2 = self._create_ride(self.student_user, vehicle=v1)
+        r3 = self._create_ride(self.student_user, vehicle=v3)
+
+        tails = queue_tails()
+        self.assertEquals(sorted(tails.keys()), [v1.id, v2.id])
+        self.assertEquals(tails[v1.id].id, r2.id)
+        self.assertEquals(tails[v2.id], None)
+
+    """
+    test_query_distance_matrix_api_earliest_vehicle
+    -----------------------------------------------
+    Tests that a ride is assigned to the vehicle with the
+    earliest pickup time using one distance matrix request
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,2,3, delta=0))
+    def test_query_distance_matrix_api_earliest_vehicle(self):
+        v1 = self._create_vehicle('van1')
+        v2 = self._create_vehicle('van2')
+        self._create_ride(self.student_user, end_latitude=1.0, end_longitude=1.0, dropoff_time=datetime(2015,6,13,1,0,0), vehicle=v1)
+        self._create_ride(self.student_user, end_latitude=2.0, end_longitude=2.0, dropoff_time=datetime(2015,6,13,1,5,0), vehicle=v2)
+        pickup_loc = (37.273485, -76.719628)
+        dropoff_loc = (37.280893, -76.719691)
+
+        # van1 is free earlier but is much further away from pickup_loc
+        client = FakeDMClient([[900, 0], [60, 0], [0, 239]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            result = query_distance_matrix_api(pickup_loc, dropoff_loc)
+        self.assertEquals(client.queries, [([(1.0, 1.0), (2.0, 2.0), pickup_loc], [pickup_loc, dropoff_loc])])
+        self.assertEquals(result[0], (datetime(2015,6,13,1,6,0), 239, datetime(2015,6,13,1,9,59)))
+        self.assertEquals(result[1], (u'pickup', u'dropoff'))
+        self.assertEquals(result[2:], (v2.id, 60, False))
+
+        # an idle vehicle can get there in 10 minutes
+        v3 = self._create_vehicle('van3')
+        client = FakeDMClient([[900, 0], [900, 0], [0, 239]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            result = query_distance_matrix_api(pickup_loc, dropoff_loc)
+        self.assertEquals(result[0][0], datetime(2015,6,13,1,12,3))
+        self.assertEquals(result[2:], (v3.id, None, False))
+
+    """
+    test_query_cheapest_insertion
+    -----------------------------
+    Tests that a ride whose pickup lies on the route between
+    two queued rides is inserted between them
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,0,50,0, delta=0))
+    def test_query_cheapest_insertion(self):
+        r1 = self._create_ride(
+            self.student_user, end_latitude=1.0, end_longitude=1.0,
+            pickup_time=datetime(2015,6,13,1,0,0), dropoff_time=datetime(2015,6,13,1,10,0)
+        )
+        r2 = self._create_ride(
+            self.student_user, start_latitude=3.0, start_longitude=3.0,
+            end_latitude=4.0, end_longitude=4.0,
+            pickup_time=datetime(2015,6,13,1,15,0), dropoff_time=datetime(2015,6,13,1,25,0)
+        )
+        pickup_loc = (37.273485, -76.719628)
+        dropoff_loc = (37.280893, -76.719691)
+
+        # r1 -> r2 takes 300s. r1 -> pickup -> dropoff -> r2 takes 360s
+        client = FakeDMClient([[60, 0], [900, 0], [0, 120]], [[180]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            result = query_cheapest_insertion(pickup_loc, dropoff_loc)
+        self.assertEquals(client.queries, [
+            ([(1.0, 1.0), (4.0, 4.0), pickup_loc], [pickup_loc, dropoff_loc]),
+            ([dropoff_loc], [(3.0, 3.0)])
+        ])
+        self.assertEquals(result[0], (datetime(2015,6,13,1,11,0), 120, datetime(2015,6,13,1,13,0)))
+        self.assertEquals(result[2:], (None, 60, False, [r2.id], 60, 180))
+
+        # only the rides after the new ride are pushed back
+        shift_rides(result[5], result[6])
+        db.session.commit()
+        self.assertEquals(Ride.query.get(r1.id).pickup_time, datetime(2015,6,13,1,0,0))
+        self.assertEquals(Ride.query.get(r2.id).pickup_time, datetime(2015,6,13,1,16,0))
+        self.assertEquals(Ride.query.get(r2.id).dropoff_time, datetime(2015,6,13,1,26,0))
+
+    """
+    test_query_cheapest_insertion_after_dropoff
+    -------------------------------------------
+    Tests that a ride inserted right after a ride that was already
+    dropped off is picked up now instead of in the past, and that
+    the rides after it are pushed back by the wait as well
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,1,12,30, delta=0))
+    def test_query_cheapest_insertion_after_dropoff(self):
+        r1 = self._create_ride(
+            self.student_user, end_latitude=1.0, end_longitude=1.0,
+            pickup_time=datetime(2015,6,13,1,0,0), dropoff_time=datetime(2015,6,13,1,10,0)
+        )
+        r2 = self._create_ride(
+            self.student_user, start_latitude=3.0, start_longitude=3.0,
+            end_latitude=4.0, end_longitude=4.0,
+            pickup_time=datetime(2015,6,13,1,15,0), dropoff_time=datetime(2015,6,13,1,25,0)
+        )
+        pickup_loc = (37.273485, -76.719628)
+        dropoff_loc = (37.280893, -76.719691)
+
+        # r1 -> pickup takes 60s, but r1 was dropped off 150s ago
+        client = FakeDMClient([[60, 0], [900, 0], [0, 120]], [[180]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            result = query_cheapest_insertion(pickup_loc, dropoff_loc)
+        self.assertEquals(result[0], (datetime(2015,6,13,1,12,30), 120, datetime(2015,6,13,1,14,30)))
+        self.assertEquals(result[2:], (None, 60, False, [r2.id], 150, 180))
+
+    """
+    test_query_cheapest_insertion_long_queue
+    ----------------------------------------
+    Tests that in a queue longer than the api's 25 origin limit
+    only the legs to and from the places in front of rides that
+    have not been picked up yet (and the tail) are fetched
+    """
+    @replace('steerclear.api.views.datetime', test_datetime(2015,6,13,4,5,0, delta=0))
+    def test_query_cheapest_insertion_long_queue(self):
+        # a ride every 10 minutes from midnight, each taking 5 minutes.
+        # only the last 5 rides have not been picked up yet
+        rides = []
+        for i in xrange(30):
+            pickup_time = datetime(2015,6,13,0,0,0) + timedelta(0, i * 600)
+            rides.append(self._create_ride(
+                self.student_user,
+                start_latitude=37.0 + 0.01 * i, start_longitude=-76.7,
+                end_latitude=37.005 + 0.01 * i, end_longitude=-76.7,
+                pickup_time=pickup_time, dropoff_time=pickup_time + timedelta(0, 300)
+            ))
+
+        # the new ride goes from the dropoff of ride 26 to the pickup of ride 27
+        pickup_loc = (rides[26].end_latitude, rides[26].end_longitude)
+        dropoff_loc = (rides[27].start_latitude, rides[27].start_longitude)
+        client = DistanceDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            result = query_cheapest_insertion(pickup_loc, dropoff_loc)
+        self.assertEquals(client.queries, [
+            ([(ride.end_latitude, ride.end_longitude) for ride in rides[24:]] + [pickup_loc], [pickup_loc, dropoff_loc]),
+            ([dropoff_loc], [(ride.start_latitude, ride.start_longitude) for ride in rides[25:]])
+        ])
+        self.assertEquals(result[0][0], rides[26].dropoff_time)
+        self.assertEquals(result[5], [ride.id for ride in rides[27:]])
+        self.assertEquals(result[7], 0)
+
+    """
+    test_refine_estimated_rides
+    ---------------------------
+    Tests that an estimated ride gets real etas and addresses once
+    the distance matrix api is back, and that the rides after it
+    are shifted by however much its dropoff time moved
+    """
+    def test_refine_estimated_rides(self):
+        r1, r2, r3 = self._create_estimated_queue()
+
+        # r1 -> r2 really takes 2 minutes and r2 takes 15 minutes, so r2 ends 2 minutes later
+        client = FakeDMClient([[120, 0], [0, 900]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            self.assertEquals(refine_estimated_rides(), 1)
+        self.assertEquals(client.queries, [([(1.0, 1.0), (3.0, 3.0)], [(3.0, 3.0), (4.0, 4.0)])])
+
+        ride = Ride.query.get(r2)
+        self.assertFalse(ride.eta_estimated)
+        self.assertEquals(ride.leg_time, 120)
+        self.assertEquals(ride.travel_time, 900)
+        self.assertEquals(ride.pickup_time, datetime(2015,6,13,1,12,0))
+        self.assertEquals(ride.dropoff_time, datetime(2015,6,13,1,27,0))
+        self.assertEquals((ride.pickup_address, ride.dropoff_address), (u'pickup', u'dropoff'))
+        self.assertEquals(Ride.query.get(r1).pickup_time, datetime(2015,6,13,1,0,0))
+        self.assertEquals(Ride.query.get(r3).pickup_time, datetime(2015,6,13,1,32,0))
+        self.assertEquals(Ride.query.get(r3).dropoff_time, datetime(2015,6,13,1,42,0))
+
+        event = RideEvent.query.order_by(RideEvent.id.desc()).first()
+        self.assertEquals(event.event, 'rides-refined')
+        self.assertEquals(json.loads(event.data), {'ids': [r2, r3]})
+
+    """
+    test_refine_estimated_rides_still_estimated
+    -------------------------------------------
+    Tests that estimated rides are left alone while
+    the distance matrix api is still unavailable
+    """
+    def test_refine_estimated_rides_still_estimated(self):
+        r1, r2, r3 = self._create_estimated_queue()
+        client = FakeDMClient([[120, 0], [0, 900]])
+        client.estimated = True
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            self.assertEquals(refine_estimated_rides(), 0)
+        ride = Ride.query.get(r2)
+        self.assertTrue(ride.eta_estimated)
+        self.assertEquals(ride.pickup_time, datetime(2015,6,13,1,15,0))
+        self.assertEquals(Ride.query.get(r3).pickup_time, datetime(2015,6,13,1,30,0))
+
+    """
+    test_refine_estimated_rides_no_route
+    ------------------------------------
+    Tests that a ride the distance matrix api has no route for keeps
+    its estimated times and stays flagged as estimated, and that the
+    estimated rides after it are still refined
+    """
+    def test_refine_estimated_rides_no_route(self):
+        r1, r2, r3 = self._create_estimated_queue()
+        ride = Ride.query.get(r3)
+        ride.leg_time = 300
+        ride.eta_estimated = True
+        db.session.commit()
+
+        client = FakeDMClient([[]], [[120, 0], [0, 600]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            self.assertEquals(refine_estimated_rides(), 1)
+        self.assertEquals(len(client.queries), 2)
+
+        ride = Ride.query.get(r2)
+        self.assertTrue(ride.eta_estimated)
+        self.assertEquals(ride.pickup_time, datetime(2015,6,13,1,15,0))
+        self.assertEquals(ride.dropoff_time, datetime(2015,6,13,1,25,0))
+        ride = Ride.query.get(r3)
+        self.assertFalse(ride.eta_estimated)
+        self.assertEquals(ride.pickup_time, datetime(2015,6,13,1,27,0))
+
+    def test_refine_estimated_rides_no_route_attempts(self):
+        r1, r2, r3 = self._create_estimated_queue()
+
+        client = FakeDMClient([[]])
+        with Replacer() as r:
+            r.replace('steerclear.api.views.dm_client', client)
+            r.replace('steerclear.api.views.ETA_REFINE_MAX_ATTEMPTS', 2)
+            self.assertEquals(refine_estimated_rides(), 0)
+            self.assertEquals(len(client.queries), 1)
+            self.assertEquals(Ride.query.get(r2).eta_refine_attempts, 1)
+            self.assertEquals(refine_estimated_rides(), 0)
+            self.assertEquals(len(client.queries), 2)
+            self.assertEquals(Ride.query.get(r2).eta_refine_attempts, 2)
+
+            # the ride ran out of attempts so the next pass skips it
+            self.assertEquals(refine_estimated_rides(), 0)
+            self.assertEquals(len(client.queries), 2)
+
+        ride = Ride.query.get(r2)
+        self.assertTrue(ride.eta_estimated)
+        self.assertEquals(ride.pickup_time, datetime(2015,6,13,1,15,0))
+        self.assertEquals(ride.dropoff_time, datetime(2015,6,13,1,25,0))
+
+    """
+    _create_estimated_queue
+    -----------------------
+    Creates a queue of three rides where the second one is
+    estimated and returns their ids
+    """
+    def _create_estimated_queue(self):
+        r1 = self._create_ride(
+            self.student_user, end_latitude=1.0, end_longitude=1.0,
+            pickup_time=datetime(2015,6,13,1,0,0), dropoff_time=datetime(2015,6,13,1,10,0)
+        )
+        r2 = self._create_ride(
+            self.student_user, start_latitude=3.0, start_longitude=3.0,
+            end_latitude=4.0, end_longitude=4.0,
+            pickup_time=datetime(2015,6,13,1,15,0), dropoff_time=datetime(2015,6,13,1,25,0)
+        )
+        r2.leg_time = 300
+        r2.eta_estimated = True
+        r3 = self._create_ride(
+            self.student_user, start_latitude=5.0, start_longitude=5.0,
+            pickup_time=datetime(2015,6,13,1,30,0), dropoff_time=datetime(2015,6,13,1,40,0)
+        )
+        db.session.commit()
+        return r1.id, r2.id, r3.id
+
+    def _create_vehicle(self, name, active=True):
+        vehicle = Vehicle(name=name, active=active)
+        db.session.add(vehicle)
+        db.session.commit()
+        return vehicle
+
+"""
+FakeDMClient
+------------
+Stands in for SteerClearDMClient. Records every query made
+and responds with the given eta matrices in order. The last
+eta matrix is repeated for any extra queries, and every
+response is estimated if estimated is set
+"""
+class FakeDMClient():
+
+    def __init__(self, *etas):
+        self.etas = etas
+        self.queries = []
+        # respond with etas flagged as estimated
+        self.estimated = False
+
+    def query_api(self, origins, destinations):
+        self.queries.append((origins, destinations))
+        eta = self.etas[min(len(self.queries), len(self.etas)) - 1]
+        return DMResponse({
+            u'status': u'OK',
+            u'estimated': self.estimated,
+            u'origin_addresses': [u'origin'] * (len(origins) - 1) + [u'pickup'],
+            u'destination_addresses': [u'destination'] * (len(destinations) - 1) + [u'dropoff'],
+            u'rows': [
+                {u'elements': [{u'status': u'OK', u'duration': {u'value': value}} for value in row]}
+                for row in eta
+            ]
+        })
+
+"""
+DistanceDMClient
+----------------
+Stands in for SteerClearDMClient. Records every query made and
+responds with an eta of 10000 seconds per degree of manhattan distance.
+Every address is the formatted coordinates of its location
+"""
+class DistanceDMClient():
+
+    def __init__(self):
+        self.queries = []
+
+    def query_api(self, origins, destinations):
+        self.queries.append((origins, destinations))
+        return DMResponse({
+            u'status': u'OK',
+            u'origin_addresses': [u'%f,%f' % loc for loc in origins],
+            u'destination_addresses': [u'%f,%f' % loc for loc in destinations],
+            u'rows': [
+                {u'elements': [
+                    {u'status': u'OK', u'duration': {u'value': int(round(10000 * (abs(o[0] - d[0]) + abs(o[1] - d[1]))))}}
+                    for d in destinations
+                ]}
+                for o in origins
+            ]
+        })
+
+"""
+FailingDMClient
+---------------
+Stands in for SteerClearDMClient. Raises on every query,
+like a client with a bug or a broken connection would
+"""
+class FailingDMClient():
+
+    def query_api(self, origins, destinations):
+        raise ValueError('distance matrix client failed')
+
+"""
+FakeWorkerPool
+--------------
+Stands in for the ride WorkerPool. Records
+submitted jobs instead of running them
+"""
+class FakeWorkerPool():
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
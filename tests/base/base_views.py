@@ -1,6 +1,6 @@
 from flask import url_for
 from flask.ext import testing
-from steerclear import app, db
+from steerclear import app, db, ride_queue_cache, dm_client
 from steerclear.models import User, Ride, Role
 from testfixtures import Replacer
 
@@ -54,6 +54,12 @@ class SteerClearBaseTestCase(testing.TestCase):
     def tearDown(self):
         db.session.remove()
         db.drop_all()
+        ride_queue_cache.invalidate()
+        dm_client.clear()
+        # api errors in one test must not open the breaker for the next
+        breaker = getattr(dm_client.client, 'breaker', None)
+        if breaker is not None:
+            breaker.reset()
 
     """
     _login
@@ -95,7 +101,7 @@ class SteerClearBaseTestCase(testing.TestCase):
     ------------
     Helper function that creates and returns a new Ride object in the db
     """
-    def _create_ride(self, user, num_passengers=0, start_latitude=1.0, start_longitude=1.1, end_latitude=2.0, end_longitude=2.1, pickup_time=datetime(1,1,1), travel_time=10, dropoff_time=datetime(1,1,1), pickup_address='Foo', dropoff_address='Bar', on_campus=True):
+    def _create_ride(self, user, num_passengers=0, start_latitude=1.0, start_longitude=1.1, end_latitude=2.0, end_longitude=2.1, pickup_time=datetime(1,1,1), travel_time=10, dropoff_time=datetime(1,1,1), pickup_address='Foo', dropoff_address='Bar', on_campus=True, vehicle=None):
         ride = Ride(
             num_passengers=num_passengers,
             start_latitude=start_latitude,
@@ -108,7 +114,8 @@ class SteerClearBaseTestCase(testing.TestCase):
             pickup_address=pickup_address,
             dropoff_address=dropoff_address,
             on_campus=on_campus,
-            user=user
+            user=user,
+            vehicle=vehicle
         )
         db.session.add(ride)
         db.session.commit()
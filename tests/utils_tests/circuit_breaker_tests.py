@@ -0,0 +1,132 @@
+from steerclear.utils.circuit_breaker import CircuitBreaker
+from testfixtures import Replacer
+import unittest
+
+"""
+FakeTime
+--------
+Stands in for the time module with a clock that only moves when told to
+"""
+class FakeTime():
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+"""
+CircuitBreakerTestCase
+----------------------
+Test case for opening and closing the circuit breaker
+"""
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeTime()
+        self.replacer = Replacer()
+        self.replacer.replace('steerclear.utils.circuit_breaker.time', self.clock)
+        self.breaker = CircuitBreaker(window=4, min_calls=2, failure_ratio=0.5, slow_call_seconds=1.0, cooldown=30)
+
+    def tearDown(self):
+        self.replacer.restore()
+
+    """
+    test_stays_closed
+    -----------------
+    Tests that the breaker stays closed while less than
+    failure_ratio of the recent calls failed
+    """
+    def test_stays_closed(self):
+        self.breaker.record(True, 0.1)
+        self.breaker.record(True, 0.1)
+        self.breaker.record(True, 0.1)
+        self.breaker.record(False, 0.1)
+        self.assertTrue(self.breaker.allow())
+        self.assertEquals(self.breaker.stats(), {
+            'state': CircuitBreaker.CLOSED,
+            'opened': 0,
+            'failure_ratio': 0.25,
+            'latency': 0.1
+        })
+
+    """
+    test_opens_on_failures
+    ----------------------
+    Tests that the breaker opens once failure_ratio of the recent
+    calls failed, and refuses calls until the cooldown is over
+    """
+    def test_opens_on_failures(self):
+        self.breaker.record(True, 0.1)
+        self.breaker.record(False, 0.1)
+        self.assertEquals(self.breaker.state(), CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.assertEquals(self.breaker.stats()['opened'], 1)
+
+    """
+    test_opens_on_slow_calls
+    ------------------------
+    Tests that calls slower than slow_call_seconds count as failures
+    """
+    def test_opens_on_slow_calls(self):
+        self.breaker.record(True, 2.0)
+        self.breaker.record(True, 0.1)
+        self.assertEquals(self.breaker.state(), CircuitBreaker.OPEN)
+
+    """
+    test_half_open_trial_succeeds
+    -----------------------------
+    Tests that after the cooldown one trial call is let
+    through, and the breaker closes if it succeeds
+    """
+    def test_half_open_trial_succeeds(self):
+        self.breaker.record(False, 0.1)
+        self.breaker.record(False, 0.1)
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEquals(self.breaker.state(), CircuitBreaker.HALF_OPEN)
+        # only the trial call goes through
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record(True, 0.1)
+        self.assertEquals(self.breaker.state(), CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        # failures from before the outage are forgotten
+        self.assertEquals(self.breaker.stats()['failure_ratio'], None)
+
+    """
+    test_half_open_trial_fails
+    --------------------------
+    Tests that the breaker opens for another cooldown if the trial call fails
+    """
+    def test_half_open_trial_fails(self):
+        self.breaker.record(False, 0.1)
+        self.breaker.record(False, 0.1)
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 0.1)
+        self.assertEquals(self.breaker.state(), CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEquals(self.breaker.stats()['opened'], 2)
+
+    """
+    test_reset
+    ----------
+    Tests that resetting an open breaker closes it and forgets its calls
+    """
+    def test_reset(self):
+        self.breaker.record(False, 0.1)
+        self.breaker.record(False, 0.1)
+        self.breaker.reset()
+        self.assertEquals(self.breaker.state(), CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertEquals(self.breaker.stats(), {
+            'state': CircuitBreaker.CLOSED,
+            'opened': 0,
+            'failure_ratio': None,
+            'latency': None
+        })
@@ -0,0 +1,92 @@
+from steerclear.utils.dm_server import DistanceMatrixServer, HaversineDMClient, parse_locations
+from steerclear.utils.eta import SteerClearDMClient, DMResponse
+from steerclear.utils.eta_estimate import haversine_matrix
+import unittest, threading, requests
+
+"""
+DistanceMatrixServerTestCase
+----------------------------
+Test case for the local stand-in for the distancematrix api,
+queried through a SteerClearDMClient pointed at it
+"""
+class DistanceMatrixServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.origins = [(37.272042, -76.714027), (37.273485, -76.719628)]
+        self.destinations = [(37.280893, -76.719691)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def start(self, **kwargs):
+        self.server = DistanceMatrixServer(('127.0.0.1', 0), HaversineDMClient(speed=5.0, detour=1.5), **kwargs)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return SteerClearDMClient(max_retries=0, base_url=self.server.base_url())
+
+    """
+    test_query_api
+    --------------
+    Tests that the server answers with durations and
+    distances of the model in the api's format
+    """
+    def test_query_api(self):
+        dmclient = self.start()
+        response = dmclient.query_api(self.origins, self.destinations)
+        meters = haversine_matrix(self.origins, self.destinations) * 1.5
+        self.assertEquals(response.get_eta(), [[int(round(row[0] / 5.0))] for row in meters])
+        self.assertEquals(response.distance_at(1, 0), int(round(meters[1][0])))
+        self.assertEquals(response.get_addresses()[1], [u'37.280893,-76.719691'])
+        self.assertFalse(response.is_estimated())
+        self.assertEquals(self.server.requests, 1)
+
+    """
+    test_query_api_errors
+    ---------------------
+    Tests that injected errors fail the requests
+    """
+    def test_query_api_errors(self):
+        dmclient = self.start(error_rate=0.5, over_query_limit_rate=0.5, seed=1)
+        for i in xrange(4):
+            self.assertEquals(dmclient.query_api(self.origins, self.destinations), DMResponse(None))
+        self.assertEquals(self.server.errors, 4)
+        self.assertEquals(dmclient.stats()['errors'], 4)
+
+    """
+    test_query_limits
+    -----------------
+    Tests that requests over the api's limits or with bad
+    locations are rejected like the api rejects them
+    """
+    def test_query_limits(self):
+        self.start()
+        url = self.server.base_url()
+        locations = '|'.join(['1,1'] * 26)
+        response = requests.get(url, params={'origins': locations, 'destinations': '1,1'})
+        self.assertEquals(response.json()['status'], 'MAX_DIMENSIONS_EXCEEDED')
+        locations = '|'.join(['1,1'] * 11)
+        response = requests.get(url, params={'origins': locations, 'destinations': locations})
+        self.assertEquals(response.json()['status'], 'MAX_ELEMENTS_EXCEEDED')
+        response = requests.get(url, params={'origins': 'foo', 'destinations': '1,1'})
+        self.assertEquals(response.json()['status'], 'INVALID_REQUEST')
+        response = requests.get(url.replace('distancematrix', 'geocode'))
+        self.assertEquals(response.status_code, 404)
+
+"""
+ParseLocationsTestCase
+----------------------
+Test case for parsing the locations of a query
+"""
+class ParseLocationsTestCase(unittest.TestCase):
+
+    """
+    test_parse_locations
+    --------------------
+    Tests parsing the lat,long pairs of a query parameter
+    """
+    def test_parse_locations(self):
+        self.assertEquals(parse_locations('1.5,2|-3,4.25'), [(1.5, 2.0), (-3.0, 4.25)])
+        self.assertEquals(parse_locations('1,2|3'), None)
+        self.assertEquals(parse_locations(''), None)
@@ -0,0 +1,62 @@
+from steerclear.utils.eta_estimate import HaversineEstimator, haversine_matrix
+import unittest
+
+"""
+HaversineEstimatorTestCase
+--------------------------
+Test case for estimating etas from straight line distances
+"""
+class HaversineEstimatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.estimator = HaversineEstimator(speed=10.0, min_samples=2)
+        # about 1112 meters apart, due north
+        self.a = (37.27, -76.71)
+        self.b = (37.28, -76.71)
+
+    """
+    test_haversine_matrix
+    ---------------------
+    Tests the distance from every origin to every destination
+    """
+    def test_haversine_matrix(self):
+        meters = haversine_matrix([self.a, self.b], [self.a, self.b, self.b])
+        self.assertEquals(meters.shape, (2, 3))
+        self.assertEquals(meters[0][0], 0)
+        self.assertAlmostEquals(meters[0][1], 1112, delta=1)
+        self.assertAlmostEquals(meters[1][0], meters[0][1])
+
+    """
+    test_response
+    -------------
+    Tests that the estimated DMResponse has an eta for every pair,
+    coordinate addresses, and is flagged as estimated
+    """
+    def test_response(self):
+        response = self.estimator.response([self.a], [self.a, self.b])
+        self.assertTrue(response.is_estimated())
+        self.assertEquals(response.get_eta(), [[0, 111]])
+        self.assertEquals(
+            response.get_addresses(),
+            ([u'37.270000,-76.710000'], [u'37.270000,-76.710000', u'37.280000,-76.710000'])
+        )
+        self.assertEquals(self.estimator.stats(), {'estimates': 1, 'estimate_speed': 10.0})
+
+    """
+    test_calibrate
+    --------------
+    Tests that the speed is the default until min_samples long enough legs
+    have been seen, then the straight line distance over the travel time
+    """
+    def test_calibrate(self):
+        # legs shorter than MIN_CALIBRATION_METERS are not samples
+        self.estimator.calibrate([self.a], [self.a, self.b], [[30, 556]])
+        self.assertEquals(self.estimator.speed(), 10.0)
+
+        self.estimator.calibrate([self.b], [self.a], [[556]])
+        self.assertAlmostEquals(self.estimator.speed(), 2.0, places=2)
+        self.assertEquals(self.estimator.estimate([self.a], [self.b]).tolist(), [[556]])
+
+        # failed queries are ignored
+        self.estimator.calibrate([self.a], [self.b], None)
+        self.assertAlmostEquals(self.estimator.speed(), 2.0, places=2)
@@ -1,5 +1,10 @@
 from steerclear.utils.eta import *
-import unittest, urllib, vcr
+from steerclear.utils.circuit_breaker import CircuitBreaker
+from steerclear.utils.eta_estimate import HaversineEstimator
+from testfixtures import Replacer
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import unittest, urllib, urlparse, vcr, json, threading, hashlib, time
 
 # vcr object used to record api request responses or return already recorded responses
 myvcr = vcr.VCR(cassette_library_dir='tests/fixtures/vcr_cassettes/eta_tests/')
@@ -414,6 +419,89 @@ class DMResponseTestCase(unittest.TestCase):
         eta = dmr.get_eta()
         self.assertEquals(eta, None)
 
+    """
+    test_get_eta_threads
+    --------------------
+    Tests that threads reading one shared dmresponse at
+    the same time all get the etas, never a half parsed response
+    """
+    def test_get_eta_threads(self):
+        rows = [{u'elements': [{u'status': u'OK', u'duration': {u'value': 60 * r + c}} for c in xrange(25)]} for r in xrange(4)]
+        data = {u'status': u'OK', u'rows': rows}
+        expected = [[60 * r + c for c in xrange(25)] for r in xrange(4)]
+        for _ in xrange(300):
+            dmr = DMResponse(data)
+            start = threading.Event()
+            results = []
+
+            def read():
+                start.wait()
+                results.append(dmr.get_eta())
+            threads = [threading.Thread(target=read) for _ in xrange(8)]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+            self.assertEquals(results, [expected] * 8)
+
+    """
+    test_eta_at
+    -----------
+    Tests that single elements of a good response
+    can be read without building the eta lists
+    """
+    def test_eta_at(self):
+        dmr = DMResponse(self.response)
+        self.assertEquals(dmr.get_shape(), (2, 2))
+        self.assertEquals(dmr.eta_at(0, 1), 238)
+        self.assertEquals(dmr.eta_at(1, 1), 239)
+        self.assertEquals(dmr.distance_at(0, 0), 1436)
+        self.assertEquals(dmr.status_at(1, 0), u'OK')
+        self.assertRaises(IndexError, dmr.eta_at, 2, 0)
+        self.assertRaises(IndexError, dmr.eta_at, 0, -1)
+
+        # a response that is not OK has no elements
+        dmr = DMResponse(self.response3)
+        self.assertEquals(dmr.get_shape(), None)
+        self.assertEquals(dmr.eta_at(0, 0), None)
+        self.assertEquals(dmr.status_at(0, 0), None)
+
+    """
+    test_eta_at_bad_elements
+    ------------------------
+    Tests that the good elements of a partially bad response can still
+    be read, even though get_eta() returns None for the whole response
+    """
+    def test_eta_at_bad_elements(self):
+        dmr = DMResponse(self.response4)
+        self.assertEquals(dmr.get_eta(), None)
+        self.assertEquals(dmr.eta_at(0, 0), None)
+        self.assertEquals(dmr.distance_at(0, 1), None)
+        self.assertEquals(dmr.status_at(0, 1), u'ZERO_RESULTS')
+        self.assertEquals(dmr.eta_at(1, 1), 239)
+        self.assertEquals(dmr.distance_at(1, 1), 1353)
+
+        # OK elements without a duration are invalid
+        del self.response[u'rows'][1][u'elements'][0][u'duration']
+        dmr = DMResponse(self.response)
+        self.assertEquals(dmr.status_at(1, 0), u'INVALID')
+        self.assertEquals(dmr.eta_at(1, 0), None)
+        self.assertEquals(dmr.eta_at(0, 0), 267)
+
+    """
+    test_eta_at_ragged_rows
+    -----------------------
+    Tests that a response whose rows have
+    different numbers of elements is malformed
+    """
+    def test_eta_at_ragged_rows(self):
+        self.response[u'rows'][1][u'elements'].pop()
+        dmr = DMResponse(self.response)
+        self.assertEquals(dmr.get_shape(), None)
+        self.assertEquals(dmr.get_eta(), None)
+        self.assertEquals(dmr.eta_at(0, 0), None)
+
     """
     test_get_addresses_no_response
     ------------------------
@@ -688,3 +776,488 @@ class SteerClearDMClientTestCase(unittest.TestCase):
         destinations = [(37.273485, -76.719628), (37.280893, -76.719691)]
         response = self.dmclient.query_api(origins, destinations)
         self.assertEquals(response.get_eta(), [[267, 238], [0, 239]])
+
+"""
+QueryMatrixTestCase
+-------------------
+Test case for query_matrix which splits big distancematrix
+queries into tiles and stitches the results together
+"""
+class QueryMatrixTestCase(unittest.TestCase):
+
+    """
+    test_query_matrix
+    -----------------
+    Tests that a matrix with every eta needed is handed to
+    the client's query_api as a whole, to be split within its limits
+    """
+    def test_query_matrix(self):
+        client = GridDMClient()
+        origins = [(i, 0) for i in xrange(23)]
+        destinations = [(0, j) for j in xrange(12)]
+        eta, addresses, estimated = query_matrix(client, origins, destinations)
+        self.assertEquals(client.queries, [(origins, destinations)])
+        self.assertEquals(eta, [[100 * i + j for j in xrange(12)] for i in xrange(23)])
+        self.assertEquals(addresses, (map(unicode, origins), map(unicode, destinations)))
+        self.assertFalse(estimated)
+
+    """
+    test_query_matrix_needed
+    ------------------------
+    Tests that a matrix with some etas needed is split into tiles within
+    the api's limits, the tiles without any needed element are never
+    requested, and the etas end up in the right place
+    """
+    def test_query_matrix_needed(self):
+        client = GridDMClient()
+        locations = [(i, i) for i in xrange(25)]
+        eta, addresses, estimated = query_matrix(client, locations, locations, lambda i, j: i == j)
+        self.assertEquals(len(client.queries), 3)
+        for origins_tile, destinations_tile in client.queries:
+            self.assertTrue(len(origins_tile) * len(destinations_tile) <= DISTANCEMATRIX_MAX_ELEMENTS)
+        self.assertEquals([eta[i][i] for i in xrange(25)], [101 * i for i in xrange(25)])
+        self.assertEquals(eta[0][24], None)
+
+    """
+    test_tile_shape
+    ---------------
+    Tests that matrices are split into the fewest tiles within the api's limits
+    """
+    def test_tile_shape(self):
+        self.assertEquals(tile_shape(1, 1), (1, 1))
+        self.assertEquals(tile_shape(10, 10), (10, 10))
+        self.assertEquals(tile_shape(30, 30), (10, 10))
+        self.assertEquals(tile_shape(1, 200), (1, 25))
+        self.assertEquals(tile_shape(12, 30), (6, 16))
+        self.assertEquals(tile_shape(25, 25), (4, 25))
+        self.assertEquals(tile_shape(25, 25, lambda i, j: i == j), (10, 10))
+        self.assertEquals(tile_shape(25, 25, lambda i, j: i == 0), (1, 25))
+        for rows, columns in [tile_shape(n, m) for n in xrange(1, 60, 7) for m in xrange(1, 60, 5)]:
+            self.assertTrue(rows * columns <= DISTANCEMATRIX_MAX_ELEMENTS)
+            self.assertTrue(max(rows, columns) <= DISTANCEMATRIX_MAX_LOCATIONS)
+
+    """
+    test_stitch_responses
+    ---------------------
+    Tests that tiles are stitched back together in row major order, and
+    that a tile that is not the size it was asked for fails the whole matrix
+    """
+    def test_stitch_responses(self):
+        client = GridDMClient()
+        origins, destinations = [(1, 0), (2, 0), (3, 0)], [(0, 1), (0, 2)]
+        tiles = [(origins[:2], destinations[:1]), (origins[:2], destinations[1:]),
+                 (origins[2:], destinations[:1]), (origins[2:], destinations[1:])]
+        response = stitch_responses(tiles, [client.query_api(*tile) for tile in tiles], 2)
+        self.assertEquals(response.get_eta(), [[101, 102], [201, 202], [301, 302]])
+        self.assertEquals(response.get_addresses(), (map(unicode, origins), map(unicode, destinations)))
+
+        responses = [client.query_api(*tile) for tile in tiles]
+        responses[3] = client.query_api(origins[2:], destinations)
+        self.assertEquals(stitch_responses(tiles, responses, 2), DMResponse(None))
+
+    """
+    test_query_matrix_bad_response
+    ------------------------------
+    Tests that query_matrix returns None if the query or any tile fails
+    """
+    def test_query_matrix_bad_response(self):
+        client = GridDMClient(fail_after=0)
+        origins = [(i, 0) for i in xrange(15)]
+        self.assertEquals(query_matrix(client, origins, [(0, 0)]), None)
+
+        client = GridDMClient(fail_after=1)
+        locations = [(i, i) for i in xrange(25)]
+        self.assertEquals(query_matrix(client, locations, locations, lambda i, j: i == j), None)
+
+"""
+GridDMClient
+------------
+Stands in for SteerClearDMClient. Responds with an eta
+of 100 * origin latitude + destination longitude and the
+locations as addresses. Fails every query after :fail_after:
+"""
+class GridDMClient():
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.queries = []
+
+    def query_api(self, origins, destinations):
+        self.queries.append((origins, destinations))
+        if self.fail_after is not None and len(self.queries) > self.fail_after:
+            return DMResponse(None)
+        return DMResponse({
+            u'status': u'OK',
+            u'origin_addresses': map(unicode, origins),
+            u'destination_addresses': map(unicode, destinations),
+            u'rows': [
+                {u'elements': [{u'status': u'OK', u'duration': {u'value': 100 * o[0] + d[1]}} for d in destinations]}
+                for o in origins
+            ]
+        })
+
+"""
+SteerClearDMClientSessionTestCase
+---------------------------------
+Test case for the keep-alive session of SteerClearDMClient
+against a local stand-in for the distancematrix api
+"""
+class SteerClearDMClientSessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        LocalDMHandler.delay = 0
+        LocalDMHandler.duration = None
+        LocalDMHandler.body = None
+        self.server = LocalDMServer(('127.0.0.1', 0), LocalDMHandler)
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/maps/api/distancematrix/json' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    """
+    test_query_api_reuses_connection
+    --------------------------------
+    Tests that consecutive queries share one connection
+    """
+    def test_query_api_reuses_connection(self):
+        dmclient = SteerClearDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            for i in xrange(3):
+                response = dmclient.query_api([(37.272042, -76.714027)], [(37.280893, -76.719691)])
+                self.assertEquals(response.get_eta(), [[238]])
+            self.assertEquals(dmclient.stats(), {'requests': 3, 'errors': 0, 'connections': 1, 'reused': 2, 'coalesced': 0})
+
+    """
+    test_query_api_coalesces_threads
+    --------------------------------
+    Tests that identical queries made by concurrent threads share
+    one request and its response, while a different query does not
+    """
+    def test_query_api_coalesces_threads(self):
+        dmclient = SteerClearDMClient()
+        LocalDMHandler.delay = 0.2
+        origins, destinations = [(37.272042, -76.714027)], [(37.280893, -76.719691)]
+        responses = []
+        def query(destinations):
+            responses.append(dmclient.query_api(origins, destinations))
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            threads = [threading.Thread(target=query, args=(destinations,)) for i in xrange(5)]
+            threads.append(threading.Thread(target=query, args=([(37.2735, -76.7196)],)))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEquals(len(responses), 6)
+        self.assertEquals([response.get_eta() for response in responses], [[[238]]] * 6)
+        stats = dmclient.stats()
+        self.assertEquals((stats['requests'], stats['coalesced']), (2, 4))
+
+    """
+    test_query_api_coalesces_nearby_queries
+    ---------------------------------------
+    Tests that concurrent queries whose locations are a few meters
+    apart share one request when they fall in the same grid cells
+    """
+    def test_query_api_coalesces_nearby_queries(self):
+        LocalDMHandler.delay = 0.2
+        def run(dmclient):
+            responses = []
+            def query(i):
+                origins = [(37.272042 + i * 0.00001, -76.714027)]
+                destinations = [(37.280893, -76.719691 - i * 0.00001)]
+                responses.append(dmclient.query_api(origins, destinations))
+            threads = [threading.Thread(target=query, args=(i,)) for i in xrange(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEquals([response.get_eta() for response in responses], [[[238]]] * 5)
+            stats = dmclient.stats()
+            return stats['requests'], stats['coalesced']
+
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            self.assertEquals(run(SteerClearDMClient(coalesce_grid=0.0005)), (1, 4))
+            self.assertEquals(run(SteerClearDMClient()), (5, 0))
+
+    """
+    test_query_api_coalesces_workers
+    --------------------------------
+    Tests that a query another uwsgi worker is already requesting
+    waits for and uses that worker's response, and that a worker
+    making a request shares its response with the other workers
+    """
+    def test_query_api_coalesces_workers(self):
+        dmclient = SteerClearDMClient()
+        fake_uwsgi = FakeUwsgi()
+        origins, destinations = [(37.272042, -76.714027)], [(37.280893, -76.719691)]
+        key = hashlib.md5(repr(dmclient._flight_key(origins, destinations))).hexdigest()
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            r.replace('steerclear.utils.eta.uwsgi', fake_uwsgi)
+
+            # another worker has the query in flight and finishes it
+            fake_uwsgi.cache['inflight:' + key] = '1'
+            def finish():
+                time.sleep(0.1)
+                fake_uwsgi.cache['response:' + key] = json.dumps({
+                    'status': 'OK',
+                    'origin_addresses': ['origin'],
+                    'destination_addresses': ['destination'],
+                    'rows': [{'elements': [{'status': 'OK', 'duration': {'value': 100}}]}]
+                })
+                del fake_uwsgi.cache['inflight:' + key]
+            thread = threading.Thread(target=finish)
+            thread.start()
+            self.assertEquals(dmclient.query_api(origins, destinations).get_eta(), [[100]])
+            thread.join()
+            self.assertEquals(self.server.requests, 0)
+
+            # this worker makes the request and shares the response
+            del fake_uwsgi.cache['response:' + key]
+            self.assertEquals(dmclient.query_api(origins, destinations).get_eta(), [[238]])
+            self.assertEquals(self.server.requests, 1)
+            self.assertEquals(json.loads(fake_uwsgi.cache['response:' + key])['rows'][0]['elements'][0]['duration']['value'], 238)
+            self.assertFalse('inflight:' + key in fake_uwsgi.cache)
+
+        stats = dmclient.stats()
+        self.assertEquals((stats['requests'], stats['coalesced']), (1, 1))
+
+    """
+    test_query_api_connection_error
+    -------------------------------
+    Tests that a query to an api that can not be
+    reached fails with an empty DMResponse
+    """
+    def test_query_api_connection_error(self):
+        dmclient = SteerClearDMClient(max_retries=0)
+        self.server.shutdown()
+        self.server.server_close()
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            response = dmclient.query_api([(37.272042, -76.714027)], [(37.280893, -76.719691)])
+        self.assertEquals(response, DMResponse(None))
+        self.assertEquals(dmclient.stats()['errors'], 1)
+
+    """
+    test_query_api_breaker_estimates
+    --------------------------------
+    Tests that queries to an api that can not be reached get estimated
+    etas, and that once the breaker opens no more requests are made
+    """
+    def test_query_api_breaker_estimates(self):
+        breaker = CircuitBreaker(min_calls=2, cooldown=60)
+        dmclient = SteerClearDMClient(max_retries=0, breaker=breaker, estimator=HaversineEstimator())
+        self.server.shutdown()
+        self.server.server_close()
+        origins, destinations = [(37.272042, -76.714027)], [(37.280893, -76.719691)]
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            for i in xrange(3):
+                response = dmclient.query_api(origins, destinations)
+                self.assertTrue(response.is_estimated())
+                self.assertEquals(response.get_eta(), HaversineEstimator().estimate(origins, destinations).tolist())
+
+        self.assertFalse(dmclient.available())
+        stats = dmclient.stats()
+        self.assertEquals(stats['requests'], 2)
+        self.assertEquals(stats['short_circuited'], 1)
+        self.assertEquals(stats['breaker_state'], CircuitBreaker.OPEN)
+        self.assertEquals(stats['breaker_opened'], 1)
+        self.assertEquals(stats['estimates'], 3)
+
+    """
+    test_query_api_breaker_recovers
+    -------------------------------
+    Tests that after the cooldown a trial request is made, and
+    that the breaker closes and real etas are returned once it succeeds
+    """
+    def test_query_api_breaker_recovers(self):
+        breaker = CircuitBreaker(min_calls=1, cooldown=0)
+        dmclient = SteerClearDMClient(breaker=breaker, estimator=HaversineEstimator())
+        breaker.record(False, 0)
+        self.assertFalse(dmclient.available())
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            response = dmclient.query_api([(37.272042, -76.714027)], [(37.280893, -76.719691)])
+        self.assertFalse(response.is_estimated())
+        self.assertEquals(response.get_eta(), [[238]])
+        self.assertTrue(dmclient.available())
+
+    """
+    test_query_api_breaker_bad_trial
+    --------------------------------
+    Tests that a trial request answered with json that is not an object
+    counts as a failure and opens the breaker again, and that a trial
+    request that raises something unexpected does too
+    """
+    def test_query_api_breaker_bad_trial(self):
+        breaker = CircuitBreaker(min_calls=1, cooldown=0)
+        dmclient = SteerClearDMClient(breaker=breaker, estimator=HaversineEstimator())
+        breaker.record(False, 0)
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            LocalDMHandler.body = '[]'
+            response = dmclient.query_api([(37.272042, -76.714027)], [(37.280893, -76.719691)])
+        self.assertTrue(response.is_estimated())
+        self.assertEquals(breaker.state(), CircuitBreaker.OPEN)
+        self.assertEquals(breaker.stats()['opened'], 2)
+        self.assertEquals(dmclient.stats()['errors'], 1)
+
+        def get(*args, **kwargs):
+            raise RuntimeError('unexpected')
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            r.replace('requests.Session.get', get)
+            self.assertRaises(RuntimeError, dmclient.query_api, [(37.0, -76.0)], [(37.1, -76.1)])
+        self.assertEquals(breaker.state(), CircuitBreaker.OPEN)
+        self.assertEquals(breaker.stats()['opened'], 3)
+        self.assertEquals(dmclient.stats()['errors'], 2)
+
+    """
+    test_query_api_upstream_error_status
+    ------------------------------------
+    Tests that an OVER_QUERY_LIMIT response counts
+    as an error and gets estimated etas
+    """
+    def test_query_api_upstream_error_status(self):
+        dmclient = SteerClearDMClient(breaker=CircuitBreaker(), estimator=HaversineEstimator())
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            LocalDMHandler.status = 'OVER_QUERY_LIMIT'
+            try:
+                response = dmclient.query_api([(37.272042, -76.714027)], [(37.280893, -76.719691)])
+            finally:
+                LocalDMHandler.status = 'OK'
+        self.assertTrue(response.is_estimated())
+        self.assertEquals(dmclient.stats()['errors'], 1)
+
+    """
+    test_query_api_tiles
+    --------------------
+    Tests that a query over the api's limits is requested in tiles
+    and stitched back together in the order of the query
+    """
+    def test_query_api_tiles(self):
+        # eta is 100 * the origin's latitude + the destination's longitude
+        LocalDMHandler.duration = staticmethod(lambda o, d: int(100 * float(o.split(',')[0]) + float(d.split(',')[1])))
+        origins = [(i, 0) for i in xrange(12)]
+        destinations = [(0, j) for j in xrange(30)]
+        dmclient = SteerClearDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            response = dmclient.query_api(origins, destinations)
+
+        # 12 x 30 goes out as four 6 x 16 tiles
+        self.assertEquals(self.server.requests, 4)
+        self.assertEquals(response.get_shape(), (12, 30))
+        self.assertEquals(response.get_eta(), [[100 * i + j for j in xrange(30)] for i in xrange(12)])
+        self.assertEquals(
+            response.get_addresses(),
+            (['%f,%f' % o for o in origins], ['%f,%f' % d for d in destinations])
+        )
+        self.assertFalse(response.is_estimated())
+
+    """
+    test_query_api_tiles_fail
+    -------------------------
+    Tests that a tiled query fails if any of its tiles fails
+    """
+    def test_query_api_tiles_fail(self):
+        dmclient = SteerClearDMClient()
+        with Replacer() as r:
+            r.replace('steerclear.utils.eta.DISTANCEMATRIX_BASE_URL', self.url)
+            LocalDMHandler.status = 'OVER_QUERY_LIMIT'
+            try:
+                response = dmclient.query_api([(i, 0) for i in xrange(11)], [(0, j) for j in xrange(10)])
+            finally:
+                LocalDMHandler.status = 'OK'
+        self.assertEquals(response, DMResponse(None))
+        self.assertEquals(self.server.requests, 2)
+
+class LocalDMServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+"""
+LocalDMHandler
+--------------
+Keep-alive request handler answering every query with an eta of
+238 seconds (or duration(origin, destination)) between every origin
+and destination. Addresses are the coordinates of the locations
+"""
+class LocalDMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # seconds to wait before answering
+    delay = 0
+
+    # top level status of the answers
+    status = 'OK'
+
+    # function (origin, destination) -> eta of the answers
+    duration = None
+
+    # body answered instead of the etas, if set
+    body = None
+
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.delay)
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        origins = query['origins'][0].split('|')
+        destinations = query['destinations'][0].split('|')
+        duration = LocalDMHandler.duration or (lambda o, d: 238)
+        body = LocalDMHandler.body or json.dumps({
+            'status': self.status,
+            'origin_addresses': origins,
+            'destination_addresses': destinations,
+            'rows': [
+                {'elements': [{'status': 'OK', 'duration': {'value': duration(o, d)}} for d in destinations]}
+                for o in origins
+            ]
+        })
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+"""
+FakeUwsgi
+---------
+Stands in for the uwsgi module's cache functions with a dictionary
+"""
+class FakeUwsgi():
+
+    def __init__(self):
+        self.cache = {}
+
+    def cache_set(self, key, value, expires, cache_name):
+        if key in self.cache:
+            return None
+        self.cache[key] = value
+        return True
+
+    def cache_update(self, key, value, expires, cache_name):
+        self.cache[key] = value
+        return True
+
+    def cache_get(self, key, cache_name):
+        return self.cache.get(key)
+
+    def cache_exists(self, key, cache_name):
+        return key in self.cache
+
+    def cache_del(self, key, cache_name):
+        self.cache.pop(key, None)
@@ -0,0 +1,49 @@
+from steerclear.utils.insertion import cheapest_insertion
+import unittest
+
+"""
+CheapestInsertionTestCase
+-------------------------
+Test case for finding where in a queue a new
+ride adds the least travel time
+"""
+class CheapestInsertionTestCase(unittest.TestCase):
+
+    """
+    test_cheapest_insertion_empty_queue
+    -----------------------------------
+    Tests that there is no place to insert into an empty queue
+    """
+    def test_cheapest_insertion_empty_queue(self):
+        self.assertEquals(cheapest_insertion([], [], [], 100), None)
+
+    """
+    test_cheapest_insertion_append
+    ------------------------------
+    Tests that the ride is appended when every
+    detour costs more than going to the end of the queue
+    """
+    def test_cheapest_insertion_append(self):
+        result = cheapest_insertion([100, 100], [500, 500, 50], [None, 500, 500], 60)
+        self.assertEquals(result, (2, 110))
+
+    """
+    test_cheapest_insertion_on_route
+    --------------------------------
+    Tests that a ride lying on the route between two
+    queued rides is inserted between them
+    """
+    def test_cheapest_insertion_on_route(self):
+        # ride 1 -> ride 2 takes 300s. ride 1 -> pickup -> dropoff -> ride 2 takes 320s
+        result = cheapest_insertion([600, 300], [900, 100, 900], [None, 900, 120], 100)
+        self.assertEquals(result, (1, 20))
+
+    """
+    test_cheapest_insertion_not_in_front_of_picked_up_ride
+    ------------------------------------------------------
+    Tests that the ride is never placed in front of
+    a ride that was already picked up
+    """
+    def test_cheapest_insertion_not_in_front_of_picked_up_ride(self):
+        result = cheapest_insertion([300], [100, 900], [None, None], 100)
+        self.assertEquals(result, (1, 1000))
@@ -0,0 +1,239 @@
+from steerclear.utils.leg_cache import LRUCache, CachingDMClient
+from steerclear.utils.eta import DMResponse
+from testfixtures import Replacer
+import unittest
+import numpy as np
+
+"""
+LRUCacheTestCase
+----------------
+Test case for the in-memory tier of the leg cache
+"""
+class LRUCacheTestCase(unittest.TestCase):
+
+    """
+    test_eviction
+    -------------
+    Tests that the least recently used entry is evicted once the cache is full
+    """
+    def test_eviction(self):
+        cache = LRUCache(2, 60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEquals(cache.get('a'), 1)
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('c'), 3)
+        self.assertEquals(len(cache), 2)
+
+    """
+    test_ttl
+    --------
+    Tests that entries expire ttl seconds after they are set
+    """
+    def test_ttl(self):
+        cache = LRUCache(2, 60)
+        with Replacer() as r:
+            r.replace('steerclear.utils.leg_cache.time.time', lambda: 1000.0)
+            cache.set('a', 1)
+            r.replace('steerclear.utils.leg_cache.time.time', lambda: 1059.0)
+            self.assertEquals(cache.get('a'), 1)
+            r.replace('steerclear.utils.leg_cache.time.time', lambda: 1060.0)
+            self.assertEquals(cache.get('a'), None)
+
+"""
+CachingDMClientTestCase
+-----------------------
+Test case for the CachingDMClient that only
+requests uncached legs from the distance matrix api
+"""
+class CachingDMClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.inner = RecordingDMClient()
+        self.store = DictLegStore()
+        self.client = CachingDMClient(self.inner, grid=0.001, store=self.store)
+
+    """
+    test_query_api_caches_legs
+    --------------------------
+    Tests that a repeated query (even for slightly different
+    coordinates in the same grid cells) is served from memory
+    """
+    def test_query_api_caches_legs(self):
+        origins = [(37.2720, -76.7140), (37.2734, -76.7196)]
+        destinations = [(37.2809, -76.7197)]
+        response = self.client.query_api(origins, destinations)
+        self.assertEquals(response.get_eta(), [[self.inner.eta(o, destinations[0])] for o in origins])
+        self.assertEquals(len(self.inner.queries), 1)
+
+        response = self.client.query_api([(37.27201, -76.71401), (37.27341, -76.71959)], destinations)
+        self.assertEquals(response.get_eta(), [[self.inner.eta(o, destinations[0])] for o in origins])
+        self.assertEquals(response.get_addresses(), ([u'37.2720,-76.7140', u'37.2734,-76.7196'], [u'37.2809,-76.7197']))
+        self.assertEquals(len(self.inner.queries), 1)
+
+        stats = self.client.stats()
+        self.assertEquals((stats['cache_hits'], stats['cache_store_hits'], stats['cache_misses']), (2, 0, 2))
+        self.assertEquals(stats['cache_hit_ratio'], 0.5)
+
+    """
+    test_query_api_only_requests_misses
+    -----------------------------------
+    Tests that only the origins and destinations with
+    uncached legs are sent to the api
+    """
+    def test_query_api_only_requests_misses(self):
+        a, b, c = (37.2720, -76.7140), (37.2735, -76.7196), (37.2809, -76.7197)
+        self.client.query_api([a], [c])
+        response = self.client.query_api([a, b], [c])
+        self.assertEquals(self.inner.queries, [([a], [c]), ([b], [c])])
+        self.assertEquals(response.get_eta(), [[self.inner.eta(a, c)], [self.inner.eta(b, c)]])
+
+    """
+    test_query_api_uses_store
+    -------------------------
+    Tests that legs cached by another process are read from the store
+    """
+    def test_query_api_uses_store(self):
+        origins, destinations = [(37.2720, -76.7140)], [(37.2809, -76.7197)]
+        self.client.query_api(origins, destinations)
+        self.client.clear()
+
+        response = self.client.query_api(origins, destinations)
+        self.assertEquals(response.get_eta(), [[self.inner.eta(origins[0], destinations[0])]])
+        self.assertEquals(len(self.inner.queries), 1)
+        self.assertEquals(self.client.stats()['cache_store_hits'], 1)
+
+    """
+    test_query_api_uses_travel_times
+    --------------------------------
+    Tests that legs the travel time grid has are not requested from
+    the api, and only the addresses missing from the cache are
+    """
+    def test_query_api_uses_travel_times(self):
+        self.client.travel_times = FakeTravelTimeGrid()
+        a, b, c = (37.2720, -76.7140), (37.2735, -76.7196), (37.2809, -76.7197)
+        self.client.query_api([a], [c])
+        self.assertEquals(self.inner.queries, [([a], [c])])
+
+        # a -> c was cached in memory when it was requested for the
+        # addresses of a and c, and b -> c comes from the grid.
+        # nothing to d has a grid time, so those legs are requested
+        d = (37.2900, -76.7000)
+        response = self.client.query_api([a, b], [c, d])
+        self.assertEquals(response.get_eta(), [[self.inner.eta(a, c), self.inner.eta(a, d)], [42, self.inner.eta(b, d)]])
+        self.assertEquals(self.inner.queries[1], ([a, b], [d]))
+        self.assertEquals(len(self.inner.queries), 2)
+        self.assertEquals(self.client.stats()['cache_grid_hits'], 2)
+
+        # grid times are not copied into the store
+        self.assertEquals(self.store.legs.get((self.client.quantize(b), self.client.quantize(c))), None)
+
+    """
+    test_query_api_bad_response
+    ---------------------------
+    Tests that a failed request for the missing legs
+    fails the query and caches nothing
+    """
+    def test_query_api_bad_response(self):
+        self.inner.fail = True
+        response = self.client.query_api([(37.2720, -76.7140)], [(37.2809, -76.7197)])
+        self.assertEquals(response, DMResponse(None))
+        self.assertEquals(len(self.client.legs), 0)
+        self.assertEquals(self.store.legs, {})
+
+    """
+    test_query_api_estimated
+    ------------------------
+    Tests that estimated legs make the response estimated but are
+    never cached, so the next query once the api is back gets real legs
+    """
+    def test_query_api_estimated(self):
+        a, b = (37.2720, -76.7140), (37.2809, -76.7197)
+        self.inner.estimated = True
+        self.assertFalse(self.client.available())
+        response = self.client.query_api([a], [b])
+        self.assertTrue(response.is_estimated())
+        self.assertEquals(response.get_eta(), [[self.inner.eta(a, b)]])
+        self.assertEquals(len(self.client.legs), 0)
+        self.assertEquals(len(self.client.addresses), 0)
+        self.assertEquals(self.store.legs, {})
+
+        self.inner.estimated = False
+        self.assertTrue(self.client.available())
+        response = self.client.query_api([a], [b])
+        self.assertFalse(response.is_estimated())
+        self.assertEquals(len(self.inner.queries), 2)
+        self.assertEquals(len(self.client.legs), 1)
+
+"""
+FakeTravelTimeGrid
+------------------
+Stands in for a TravelTimeGrid that has a travel time of 42 seconds
+for every leg to a destination with latitude below 37.285
+"""
+class FakeTravelTimeGrid():
+
+    def lookup(self, origins, destinations):
+        return np.array([[42 if d[0] < 37.285 else -1 for d in destinations] for o in origins])
+
+"""
+RecordingDMClient
+-----------------
+Stands in for SteerClearDMClient. Records every query and responds
+with an eta of 10000 seconds per degree of manhattan distance
+"""
+class RecordingDMClient():
+
+    def __init__(self):
+        self.queries = []
+        self.fail = False
+        self.estimated = False
+
+    def eta(self, o, d):
+        return int(round(10000 * (abs(o[0] - d[0]) + abs(o[1] - d[1]))))
+
+    def query_api(self, origins, destinations):
+        self.queries.append((origins, destinations))
+        if self.fail:
+            return DMResponse(None)
+        return DMResponse({
+            u'status': u'OK',
+            u'estimated': self.estimated,
+            u'origin_addresses': [u'%.4f,%.4f' % point for point in origins],
+            u'destination_addresses': [u'%.4f,%.4f' % point for point in destinations],
+            u'rows': [
+                {u'elements': [{u'status': u'OK', u'duration': {u'value': self.eta(o, d)}} for d in destinations]}
+                for o in origins
+            ]
+        })
+
+    def available(self):
+        return not self.estimated
+
+    def stats(self):
+        return {}
+
+"""
+DictLegStore
+------------
+In-memory stand-in for the DBLegStore
+"""
+class DictLegStore():
+
+    def __init__(self):
+        self.legs = {}
+        self.addresses = {}
+
+    def get_legs(self, keys):
+        return dict((key, self.legs[key]) for key in keys if key in self.legs)
+
+    def set_legs(self, items):
+        self.legs.update(items)
+
+    def get_addresses(self, keys):
+        return dict((key, self.addresses[key]) for key in keys if key in self.addresses)
+
+    def set_addresses(self, items):
+        self.addresses.update(items)
@@ -1,6 +1,8 @@
-from steerclear.utils.polygon import SteerClearGISClient
+from steerclear.utils.polygon import SteerClearGISClient, compile_polygon
 import unittest
+import random
 import os
+import numpy as np
 
 # build path to campus shapefiles
 cur_dirname = os.path.join(os.path.dirname(__file__), os.pardir)
@@ -130,6 +132,85 @@ class SteerClearGISClientTestCase(unittest.TestCase):
         # test point on matoaka court
         self._test_point((37.276803, -76.721015), False)
 
+    """
+    test_is_in_polygon_matches_point_in_poly
+    ----------------------------------------
+    Tests that the precompiled index classifies random points
+    around the campus, its vertices, points on its horizontal
+    edges, and points level with or in line with vertices the
+    same way point_in_poly() does
+    """
+    def test_is_in_polygon_matches_point_in_poly(self):
+        polygon = self.gis_client.polygon
+        longitudes = [point[0] for point in polygon]
+        latitudes = [point[1] for point in polygon]
+        rand = random.Random(0)
+        points = [
+            (rand.uniform(min(longitudes) - 0.001, max(longitudes) + 0.001),
+             rand.uniform(min(latitudes) - 0.001, max(latitudes) + 0.001))
+            for i in xrange(2000)
+        ]
+        points += polygon
+        points += [((p1[0] + p2[0]) / 2, p1[1]) for p1, p2 in zip(polygon, polygon[1:]) if p1[1] == p2[1]]
+        points += [(rand.choice(longitudes), y) for x, y in points[:500]]
+        points += [(x, rand.choice(latitudes)) for x, y in points[:500]]
+
+        for x, y in points:
+            expected = self.gis_client.point_in_poly(x, y, polygon)
+            self.assertEqual(self.gis_client.is_in_polygon((y, x)), expected)
+
+    """
+    test_is_in_polygon_many
+    -----------------------
+    Tests that is_in_polygon_many() classifies random points,
+    vertices, and points level with vertices the same as is_in_polygon()
+    """
+    def test_is_in_polygon_many(self):
+        polygon = np.array(self.gis_client.polygon)
+        rand = np.random.RandomState(0)
+        points = np.column_stack([
+            rand.uniform(polygon[:, 1].min() - 0.001, polygon[:, 1].max() + 0.001, 5000),
+            rand.uniform(polygon[:, 0].min() - 0.001, polygon[:, 0].max() + 0.001, 5000)
+        ])
+        points[:300] = polygon[rand.randint(len(polygon), size=300)][:, ::-1]
+        points[300:600, 0] = polygon[rand.randint(len(polygon), size=300), 1]
+
+        result = self.gis_client.is_in_polygon_many(points)
+        self.assertEqual(result.dtype, bool)
+        self.assertEqual(result.tolist(), [self.gis_client.is_in_polygon(tuple(point)) for point in points])
+
+        # takes lists of lat/long tuples and empty input
+        self.assertEqual(self.gis_client.is_in_polygon_many([(37.272433, -76.716922), (37.264771, -76.719619)]).tolist(), [True, False])
+        self.assertEqual(self.gis_client.is_in_polygon_many([]).tolist(), [])
+
+    """
+    test_polygon_index_edge_cases
+    -----------------------------
+    Tests the precompiled index on a polygon with horizontal
+    and vertical edges and a notch, on its vertices, boundary,
+    and points outside its bounding box
+    """
+    def test_polygon_index_edge_cases(self):
+        polygon = [(0, 0), (4, 0), (4, 4), (3, 4), (2, 2), (1, 4), (0, 4), (0, 0)]
+        index = compile_polygon(polygon)
+        points = [(x / 2.0, y / 2.0) for x in xrange(-2, 11) for y in xrange(-2, 11)]
+        for x, y in points:
+            expected = self.gis_client.point_in_poly(x, y, polygon)
+            self.assertEqual(index.contains(x, y), expected)
+        x, y = np.array(points).T
+        self.assertEqual(index.contains_many(x, y).tolist(), [index.contains(*point) for point in points])
+
+        # vertices and points on horizontal edges are inside
+        self.assertTrue(index.contains(2, 2))
+        self.assertTrue(index.contains(2, 0))
+        self.assertTrue(index.contains(0.5, 4))
+
+        # bounding box rejects
+        self.assertFalse(index.contains(5, 2))
+        self.assertFalse(index.contains(2, -1))
+        self.assertFalse(index.contains(2, 5))
+        self.assertFalse(index.contains(-1, 2))
+
     """
     _test_point
     -----------
@@ -0,0 +1,115 @@
+from steerclear.utils.road_graph import RoadGraph, RoadGraphDMClient, SNAP_SPEED
+import unittest, tempfile, json, os
+
+# road graph with four corners of a square 0.01 degrees (about 1 km) wide,
+# a fast road a-b-c, a slow road a-d-c, a one way road c->a, and a road
+# e->f that is not connected to the rest
+A, B, C, D, E, F = (37.27, -76.72), (37.28, -76.72), (37.28, -76.71), (37.27, -76.71), (37.30, -76.70), (37.301, -76.70)
+ROAD_GRAPH = {
+    'nodes': [A, B, C, D, E, F],
+    'names': ['Jamestown Road', 'Richmond Road'],
+    'edges': [
+        [0, 1, 60, 1000, 0, 0],
+        [1, 2, 60, 1000, 0, None],
+        [0, 3, 200, 1000, 0, 1],
+        [3, 2, 200, 1000, 0, None],
+        [2, 0, 30, 1400, 1, None],
+        [4, 5, 10, 100, 0, None]
+    ]
+}
+
+"""
+RoadGraphDMClientTestCase
+-------------------------
+Test case for the distance matrix client that routes on a local road graph
+"""
+class RoadGraphDMClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(ROAD_GRAPH, f)
+        self.client = RoadGraphDMClient(self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    """
+    test_snap
+    ---------
+    Tests that points snap to the closest node that is on a
+    road, and points far away from every road do not snap
+    """
+    def test_snap(self):
+        graph = self.client.graph
+        node, meters = graph.snap((37.2701, -76.7201))
+        self.assertEquals(node, 0)
+        self.assertTrue(0 < meters < 20)
+        self.assertEquals(graph.snap(C), (2, 0))
+        self.assertEquals(graph.snap((38.0, -77.0)), None)
+
+    """
+    test_query_api
+    --------------
+    Tests that query_api() returns the fastest route between every
+    origin and destination in the format of the distancematrix api,
+    including taking one way roads and not driving up them backwards
+    """
+    def test_query_api(self):
+        response = self.client.query_api([A, C], [C, B])
+        # a->c takes the fast road since the one way road only goes c->a
+        self.assertEquals(response.get_eta(), [[120, 60], [0, 60]])
+        response = self.client.query_api([C, B], [A])
+        self.assertEquals(response.get_eta(), [[30], [60]])
+
+        # distances are returned along with durations
+        element = response.data[u'rows'][0][u'elements'][0]
+        self.assertEquals(element[u'distance'][u'value'], 1400)
+
+    """
+    test_query_api_snap_time
+    ------------------------
+    Tests that getting to and from the road network adds time
+    """
+    def test_query_api_snap_time(self):
+        origin = (37.2701, -76.72)
+        meters = self.client.graph.snap(origin)[1]
+        response = self.client.query_api([origin], [B])
+        self.assertEquals(response.get_eta(), [[int(round(60 + meters / SNAP_SPEED))]])
+
+    """
+    test_query_api_addresses
+    ------------------------
+    Tests that addresses are the name of the
+    street a location is on and its coordinates
+    """
+    def test_query_api_addresses(self):
+        response = self.client.query_api([A], [D, C])
+        self.assertEquals(response.get_addresses(), (
+            [u'Jamestown Road (37.270000,-76.720000)'],
+            [u'Richmond Road (37.270000,-76.710000)', u'37.280000,-76.710000']
+        ))
+
+    """
+    test_query_api_no_route
+    -----------------------
+    Tests that get_eta() returns None when there is no route
+    between a pair of locations, the same as the distancematrix api
+    """
+    def test_query_api_no_route(self):
+        response = self.client.query_api([A], [E])
+        self.assertEquals(response.get_eta(), None)
+        self.assertEquals(response.data[u'rows'][0][u'elements'][0][u'status'], u'ZERO_RESULTS')
+        response = self.client.query_api([(38.0, -77.0)], [A])
+        self.assertEquals(response.get_eta(), None)
+
+    """
+    test_query_api_bad_request
+    --------------------------
+    Tests that a request without origins or destinations fails
+    """
+    def test_query_api_bad_request(self):
+        self.assertEquals(self.client.query_api([], [A]).data, None)
+        self.assertEquals(self.client.stats(), {
+            'requests': 1, 'errors': 1, 'connections': 0, 'reused': 0, 'coalesced': 0
+        })
@@ -0,0 +1,67 @@
+from steerclear.utils.single_flight import SingleFlight
+import unittest, threading, time
+
+"""
+SingleFlightTestCase
+--------------------
+Test case for coalescing concurrent calls that share a key
+"""
+class SingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = []
+
+    def slow_call(self, value):
+        def fn():
+            self.calls.append(value)
+            self.release.wait()
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return fn
+
+    def run_concurrently(self, n, key, fn):
+        results = []
+        def call():
+            try:
+                results.append(self.flight.do(key, fn))
+            except Exception as e:
+                results.append(e)
+        threads = [threading.Thread(target=call) for i in xrange(n)]
+        for thread in threads:
+            thread.start()
+        # wait for every thread to join the call in flight
+        while self.flight.shared < n - 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    """
+    test_do_coalesces
+    -----------------
+    Tests that concurrent calls with the same key make one call and share its result
+    """
+    def test_do_coalesces(self):
+        result = object()
+        results = self.run_concurrently(4, 'key', self.slow_call(result))
+        self.assertEquals(results, [result] * 4)
+        self.assertEquals(len(self.calls), 1)
+        self.assertEquals(self.flight.shared, 3)
+
+        # once the call is done, the next call with the key makes its own
+        self.assertEquals(self.flight.do('key', lambda: 2), 2)
+
+    """
+    test_do_shares_exception
+    ------------------------
+    Tests that an exception raised by the call is raised in every waiting caller
+    """
+    def test_do_shares_exception(self):
+        error = ValueError('bad')
+        results = self.run_concurrently(3, 'key', self.slow_call(error))
+        self.assertEquals(results, [error] * 3)
+        self.assertEquals(len(self.calls), 1)
@@ -0,0 +1,123 @@
+from steerclear.utils.travel_time_grid import TravelTimeGrid, open_travel_time_grid, \
+    create_travel_time_grid, update_travel_time_grid
+from steerclear.utils.eta import DMResponse
+from testfixtures import Replacer
+import unittest, tempfile, shutil, os
+import numpy as np
+
+"""
+SquareGISClient
+---------------
+Stands in for SteerClearGISClient with a square service
+area 0.01 degrees wide. polygon points are long/lat like a shapefile's
+"""
+class SquareGISClient():
+
+    polygon = [(-76.72, 37.27), (-76.72, 37.28), (-76.71, 37.28), (-76.71, 37.27)]
+
+    def is_in_polygon(self, point):
+        return 37.27 <= point[0] <= 37.28 and -76.72 <= point[1] <= -76.71
+
+    def is_in_polygon_many(self, points):
+        return np.array([self.is_in_polygon(point) for point in points], dtype=bool)
+
+"""
+ManhattanDMClient
+-----------------
+Stands in for SteerClearDMClient. Responds with an eta of
+100000 seconds per degree of manhattan distance. Fails every
+query that has an origin in :fail_origins:
+"""
+class ManhattanDMClient():
+
+    def __init__(self):
+        self.queries = 0
+        self.fail_origins = []
+
+    def eta(self, o, d):
+        return int(round(100000 * (abs(o[0] - d[0]) + abs(o[1] - d[1]))))
+
+    def query_api(self, origins, destinations):
+        self.queries += 1
+        if any(o in self.fail_origins for o in origins):
+            return DMResponse(None)
+        return DMResponse({
+            u'status': u'OK',
+            u'origin_addresses': [u'' for o in origins],
+            u'destination_addresses': [u'' for d in destinations],
+            u'rows': [
+                {u'elements': [{u'status': u'OK', u'duration': {u'value': self.eta(o, d)}} for d in destinations]}
+                for o in origins
+            ]
+        })
+
+"""
+TravelTimeGridTestCase
+----------------------
+Test case for building and looking up the precomputed travel time grid
+"""
+class TravelTimeGridTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.client = ManhattanDMClient()
+        # 5x5 cells of 0.002 degrees
+        self.grid = create_travel_time_grid(self.dirname, SquareGISClient(), 0.002)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    """
+    test_create
+    -----------
+    Tests that every cell inside the service area gets an index
+    and every cell pair starts out missing
+    """
+    def test_create(self):
+        self.assertEquals(self.grid.cells.shape, (5, 5))
+        self.assertEquals(sorted(self.grid.cells.ravel()), range(25))
+        self.assertEquals(self.grid.times.shape, (25, 25))
+        self.assertTrue(self.grid.stale().all())
+        self.assertEquals(open_travel_time_grid(tempfile.gettempdir() + '/no-grid-here'), None)
+
+    """
+    test_update_and_lookup
+    ----------------------
+    Tests that updating fills in the travel time between every
+    pair of cell centers, in tiles within the api's limits,
+    and that lookups return the travel time between the cells
+    """
+    def test_update_and_lookup(self):
+        self.assertEquals(update_travel_time_grid(self.grid, self.client), (625, 0))
+        self.assertEquals(self.client.queries, 7)
+        self.assertFalse(self.grid.stale().any())
+
+        grid = open_travel_time_grid(self.dirname)
+        a, b = (37.2705, -76.7195), (37.2791, -76.7103)
+        times = grid.lookup([a, b], [b])
+        self.assertEquals(times.tolist(), [[self.client.eta((37.271, -76.719), (37.279, -76.711))], [0]])
+
+        # nothing left to update
+        self.assertEquals(update_travel_time_grid(self.grid, self.client), (0, 0))
+        self.assertEquals(self.client.queries, 7)
+
+    """
+    test_lookup_missing
+    -------------------
+    Tests that pairs outside the service area, pairs that failed
+    to update, and pairs older than max_age are looked up as -1
+    """
+    def test_lookup_missing(self):
+        self.client.fail_origins = [(37.271, -76.719)]
+        with Replacer() as r:
+            r.replace('steerclear.utils.travel_time_grid.time.time', lambda: 1000.0)
+            self.assertEquals(update_travel_time_grid(self.grid, self.client), (525, 1))
+
+        grid = TravelTimeGrid(self.dirname, max_age=60)
+        inside, failed, outside = (37.2791, -76.7103), (37.2705, -76.7195), (37.29, -76.7103)
+        with Replacer() as r:
+            r.replace('steerclear.utils.travel_time_grid.time.time', lambda: 1059.0)
+            self.assertEquals(grid.lookup([inside, failed, outside], [inside]).tolist(), [[0], [-1], [-1]])
+            self.assertEquals(grid.stale().sum(), 100)
+            r.replace('steerclear.utils.travel_time_grid.time.time', lambda: 1061.0)
+            self.assertEquals(grid.lookup([inside], [inside]).tolist(), [[-1]])
@@ -0,0 +1,61 @@
+from steerclear.utils.workers import WorkerPool
+import unittest, threading
+
+"""
+WorkerPoolTestCase
+------------------
+Test case for the WorkerPool that runs jobs in background threads
+"""
+class WorkerPoolTestCase(unittest.TestCase):
+
+    """
+    test_submit
+    -----------
+    Tests that every submitted job is run on one of the pool's threads
+    """
+    def test_submit(self):
+        pool = WorkerPool(3)
+        results = []
+        threads = set()
+        def job(value):
+            results.append(value * 2)
+            threads.add(threading.current_thread().name)
+        for i in xrange(20):
+            pool.submit(job, i)
+        pool.join()
+        self.assertEquals(sorted(results), [i * 2 for i in xrange(20)])
+        self.assertTrue(threads <= set(['worker-0', 'worker-1', 'worker-2']))
+
+    """
+    test_failing_job
+    ----------------
+    Tests that a failing job does not stop the pool from running later jobs
+    """
+    def test_failing_job(self):
+        pool = WorkerPool(1)
+        results = []
+        def job(value):
+            if value == 0:
+                raise ValueError(value)
+            results.append(value)
+        for i in xrange(3):
+            pool.submit(job, i)
+        pool.join()
+        self.assertEquals(results, [1, 2])
+
+    """
+    test_map
+    --------
+    Tests that map returns the results in order and
+    raises the exception of a failing call
+    """
+    def test_map(self):
+        pool = WorkerPool(3)
+        self.assertEquals(pool.map(lambda value: value * 2, xrange(20)), [i * 2 for i in xrange(20)])
+        self.assertEquals(pool.map(lambda value: value, []), [])
+
+        def call(value):
+            if value == 5:
+                raise ValueError(value)
+            return value
+        self.assertRaises(ValueError, pool.map, call, xrange(10))
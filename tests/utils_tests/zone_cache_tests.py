@@ -0,0 +1,111 @@
+from steerclear.utils.zone_cache import zone_cache_filename, save_zone_cache, load_zone_cache
+from steerclear.utils.polygon import SteerClearGISClient, compile_polygon, read_polygon
+import unittest, tempfile, shutil, os
+import numpy as np
+
+# build path to campus shapefiles
+cur_dirname = os.path.join(os.path.dirname(__file__), os.pardir)
+shapefile_dirname = cur_dirname + '/fixtures/shapefiles/campus_map'
+
+"""
+ZoneCacheTestCase
+-----------------
+Test case for compiling shapefiles into zone cache
+files and memory mapping them back
+"""
+class ZoneCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # copy the shapefile so its mtime can be changed
+        self.dirname = tempfile.mkdtemp()
+        shutil.copytree(shapefile_dirname, os.path.join(self.dirname, 'campus_map'))
+        self.shapefilename = os.path.join(self.dirname, 'campus_map', 'campus_map.shp')
+        self.cache_dirname = os.path.join(self.dirname, 'zone_cache')
+        self.filename = zone_cache_filename(self.shapefilename, self.cache_dirname)
+        self.index = compile_polygon(read_polygon(self.shapefilename))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    """
+    test_save_load
+    --------------
+    Tests that the arrays of a PolygonIndex are memory
+    mapped back from the zone cache file unchanged
+    """
+    def test_save_load(self):
+        self.assertEqual(self.filename, os.path.join(self.cache_dirname, 'campus_map.zone.npy'))
+        self.assertIsNone(load_zone_cache(self.filename, [self.shapefilename]))
+
+        save_zone_cache(self.filename, [self.shapefilename], 1, *self.index.arrays)
+        self.assertEqual(os.listdir(self.cache_dirname), ['campus_map.zone.npy'])
+        loaded = load_zone_cache(self.filename, [self.shapefilename])
+        self.assertEqual(len(loaded), 5)
+        self.assertEqual(loaded[0], 1)
+        for array, expected in zip(loaded[1:], self.index.arrays):
+            self.assertIsInstance(array, np.memmap)
+            self.assertEqual(array.shape, expected.shape)
+            self.assertTrue((array == expected).all())
+
+    """
+    test_load_stale
+    ---------------
+    Tests that a zone cache file is not loaded once the
+    shapefile it was built from changes, or if it is corrupt
+    """
+    def test_load_stale(self):
+        save_zone_cache(self.filename, [self.shapefilename], 1, *self.index.arrays)
+        stat = os.stat(self.shapefilename)
+        os.utime(self.shapefilename, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNone(load_zone_cache(self.filename, [self.shapefilename]))
+
+        save_zone_cache(self.filename, [self.shapefilename], 1, *self.index.arrays)
+        self.assertIsNotNone(load_zone_cache(self.filename, [self.shapefilename]))
+        np.save(self.filename, np.arange(20, dtype=np.float64))
+        self.assertIsNone(load_zone_cache(self.filename, [self.shapefilename]))
+        with open(self.filename, 'wb') as f:
+            f.write('not a zone cache')
+        self.assertIsNone(load_zone_cache(self.filename, [self.shapefilename]))
+
+    """
+    test_gis_client
+    ---------------
+    Tests that a SteerClearGISClient with a zone cache builds
+    the cache file, classifies points the same as one without,
+    and rebuilds the cache file when the shapefile changes
+    """
+    def test_gis_client(self):
+        gis_client = SteerClearGISClient(self.shapefilename, self.cache_dirname)
+        self.assertTrue(os.path.exists(self.filename))
+        self.assertIsInstance(gis_client.index.slab_max_x, np.memmap)
+        self.assertEqual(gis_client.polygon, self.index.polygon)
+        self.assertEqual(gis_client.index.slabs, self.index.slabs)
+        self.assertEqual(gis_client.index.horizontal, self.index.horizontal)
+
+        uncached = SteerClearGISClient(self.shapefilename)
+        rand = np.random.RandomState(0)
+        points = np.column_stack([rand.uniform(37.26, 37.28, 2000), rand.uniform(-76.73, -76.70, 2000)])
+        self.assertEqual(gis_client.is_in_polygon_many(points).tolist(), uncached.is_in_polygon_many(points).tolist())
+        for point in points[:200]:
+            self.assertEqual(gis_client.is_in_polygon(tuple(point)), uncached.is_in_polygon(tuple(point)))
+
+        # a changed shapefile gets its cache file rebuilt
+        stat = os.stat(self.shapefilename)
+        os.utime(self.shapefilename, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNone(load_zone_cache(self.filename, [self.shapefilename]))
+        SteerClearGISClient(self.shapefilename, self.cache_dirname)
+        self.assertIsNotNone(load_zone_cache(self.filename, [self.shapefilename]))
+
+    """
+    test_gis_client_unwritable_cache
+    --------------------------------
+    Tests that a SteerClearGISClient whose zone cache
+    can not be written compiles its polygon in memory
+    """
+    def test_gis_client_unwritable_cache(self):
+        # a file where the cache directory should be
+        open(self.cache_dirname, 'w').close()
+        gis_client = SteerClearGISClient(self.shapefilename, self.cache_dirname)
+        self.assertNotIsInstance(gis_client.index.slab_max_x, np.memmap)
+        self.assertTrue(gis_client.is_in_polygon((37.272433, -76.716922)))
+        self.assertFalse(gis_client.is_in_polygon((37.264771, -76.719619)))
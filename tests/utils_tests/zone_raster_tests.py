@@ -0,0 +1,115 @@
+from steerclear.utils.zone_raster import ZoneRaster, BOUNDARY
+from steerclear.utils.polygon import compile_zones, compile_polygon, read_polygon
+from steerclear.utils.zones import ZoneRegistry
+import unittest, os
+import numpy as np
+
+# build path to campus shapefiles
+cur_dirname = os.path.join(os.path.dirname(__file__), os.pardir)
+shapefiles_dirname = cur_dirname + '/fixtures/shapefiles'
+shapefile_filename = shapefiles_dirname + '/campus_map/campus_map.shp'
+
+# a square zone with a square hole, a zone of a triangle and a square,
+# and a zone whose ring is not closed and ends with a horizontal edge
+ZONES = [
+    [[(0, 0), (0, 4), (4, 4), (4, 0), (0, 0)], [(1, 1), (3, 1), (3, 3), (1, 3), (1, 1)]],
+    [[(3.5, 3.5), (4.25, 5), (5, 3.5), (3.5, 3.5)], [(6, 0), (6, 1), (7, 1), (7, 0), (6, 0)]],
+    [[(2, 2), (2.5, 6), (0.5, 6)]]
+]
+
+"""
+ZoneRasterTestCase
+------------------
+Test case for the bitmap over the zones, making sure it
+always answers the same as the exact PolygonIndex lookup
+"""
+class ZoneRasterTestCase(unittest.TestCase):
+
+    """
+    _test_same_answers
+    ------------------
+    Helper method that checks a ZoneRaster of :index: with :cell_size:
+    degree cells answers the same as :index: for random points around the
+    zones, points on vertex latitudes and longitudes, and points on cell
+    edges. Returns the raster
+    """
+    def _test_same_answers(self, index, cell_size):
+        raster = ZoneRaster(index, cell_size)
+        vertices = index.arrays[0]
+        rand = np.random.RandomState(0)
+        min_x, max_x = vertices[:, 0].min(), vertices[:, 0].max()
+        min_y, max_y = vertices[:, 1].min(), vertices[:, 1].max()
+        x = rand.uniform(min_x - cell_size, max_x + cell_size, 5000)
+        y = rand.uniform(min_y - cell_size, max_y + cell_size, 5000)
+        x[:500] = vertices[rand.randint(len(vertices), size=500), 0]
+        y[:1000] = vertices[rand.randint(len(vertices), size=1000), 1]
+        x[1000:1500] = raster.min_x + rand.randint(raster.columns + 1, size=500) * cell_size
+        y[1500:2000] = raster.min_y + rand.randint(raster.rows + 1, size=500) * cell_size
+
+        self.assertEqual(raster.lookup_many(x, y).tolist(), index.lookup_many(x, y).tolist())
+        for a, b in zip(x.tolist(), y.tolist()):
+            self.assertEqual(raster.lookup(a, b), index.lookup(a, b))
+        self.assertTrue(raster.hits(x, y).any())
+        return raster
+
+    """
+    test_campus
+    -----------
+    Tests that rasters of the campus polygon of different
+    cell sizes answer the same as the exact lookup
+    """
+    def test_campus(self):
+        index = compile_polygon(read_polygon(shapefile_filename))
+        for cell_size in [0.002, 0.0005, 0.0001]:
+            raster = self._test_same_answers(index, cell_size)
+            self.assertTrue(raster.contains(-76.716922, 37.272433))
+            self.assertFalse(raster.contains(-76.719619, 37.264771))
+            self.assertEqual(raster.contains_many([-76.716922, -76.719619], [37.272433, 37.264771]).tolist(), [True, False])
+
+    """
+    test_zones
+    ----------
+    Tests that rasters of zones with holes, multiple parts, overlaps
+    and horizontal edges answer the same as the exact lookup
+    """
+    def test_zones(self):
+        index = compile_zones(ZONES)
+        for cell_size in [1, 0.5, 0.3, 0.05]:
+            self._test_same_answers(index, cell_size)
+
+        # a cell inside the hole is outside every zone, and the cells
+        # the unclosed ring's horizontal edge and closing edge cross fall back
+        raster = ZoneRaster(index, 0.25)
+        self.assertEqual(raster.stats()['rows'], 24)
+        self.assertEqual(raster.stats()['columns'], 28)
+        self.assertEqual(raster.cells[5, 5], 0)
+        self.assertEqual(raster.cells[2, 2], 1)
+        self.assertEqual(raster.cells[23, 6], BOUNDARY)
+        self.assertEqual(raster.cells[16, 4], BOUNDARY)
+        self.assertEqual(raster.lookup(1.6, 6), 4)
+        self.assertFalse(raster.hits([1.6], [6])[0])
+
+    """
+    test_too_many_zones
+    -------------------
+    Tests that a raster can not hold more zones than fit in its cells
+    """
+    def test_too_many_zones(self):
+        square = [(0, 0), (0, 1), (1, 1), (1, 0), (0, 0)]
+        self.assertRaises(ValueError, ZoneRaster, compile_zones([[square]] * 64), 0.5)
+        ZoneRaster(compile_zones([[square]] * 63), 0.5)
+
+    """
+    test_registry
+    -------------
+    Tests that a ZoneRegistry with a raster_cell_size
+    answers lookups from a raster
+    """
+    def test_registry(self):
+        registry = ZoneRegistry(shapefiles_dirname, raster_cell_size=0.0005)
+        self.assertIsInstance(registry.raster, ZoneRaster)
+        self.assertIsNone(ZoneRegistry(shapefiles_dirname).raster)
+        self.assertEqual(registry.zones_at((37.272433, -76.716922)), [registry.zone('campus_map')])
+        self.assertEqual(registry.zones_at((37.264771, -76.719619)), [])
+        self.assertEqual(registry.zones_at_many([(37.272433, -76.716922), (37.264771, -76.719619)]).tolist(), [[True], [False]])
+        self.assertTrue(registry.zone('campus_map').is_in_polygon((37.272433, -76.716922)))
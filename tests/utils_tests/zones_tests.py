@@ -0,0 +1,131 @@
+from steerclear.utils.zones import ZoneRegistry
+from steerclear.utils.polygon import SteerClearGISClient
+import unittest, tempfile, shutil, os
+import shapefile
+import numpy as np
+
+# build path to campus shapefiles
+cur_dirname = os.path.join(os.path.dirname(__file__), os.pardir)
+shapefile_dirname = cur_dirname + '/fixtures/shapefiles/campus_map'
+
+"""
+ZoneRegistryTestCase
+--------------------
+Test case for loading every zone of a directory
+of shapefiles and looking up which zones contain a point
+"""
+class ZoneRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.shapefiles_dirname = os.path.join(self.dirname, 'shapefiles')
+        self.cache_dirname = os.path.join(self.dirname, 'zone_cache')
+        shutil.copytree(shapefile_dirname, os.path.join(self.shapefiles_dirname, 'campus_map'))
+
+        # a square zone with a square hole, a zone of two
+        # parts, and a zone without a Name. long/lat like the campus
+        w = shapefile.Writer(shapefile.POLYGON)
+        w.field('Name', 'C', 40)
+        w.field('Price', 'N', 10, 2)
+        w.poly(parts=[
+            [[0, 0], [0, 4], [4, 4], [4, 0], [0, 0]],
+            [[1, 1], [3, 1], [3, 3], [1, 3], [1, 1]]
+        ])
+        w.record('donut', 2.5)
+        w.poly(parts=[
+            [[3.5, 3.5], [3.5, 5], [5, 5], [5, 3.5], [3.5, 3.5]],
+            [[6, 0], [6, 1], [7, 1], [7, 0], [6, 0]]
+        ])
+        w.record('islands', 1)
+        w.poly(parts=[[[2, 2], [2, 6], [2.5, 6], [2.5, 2], [2, 2]]])
+        w.record('', 0)
+        w.save(os.path.join(self.shapefiles_dirname, 'pricing'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    """
+    test_zones
+    ----------
+    Tests that every record of every shapefile is a named
+    zone with its .dbf attributes
+    """
+    def test_zones(self):
+        registry = ZoneRegistry(self.shapefiles_dirname)
+        self.assertEqual([zone.name for zone in registry.zones],
+            ['campus_map', 'pricing/donut', 'pricing/islands', 'pricing/2'])
+        self.assertEqual([zone.column for zone in registry.zones], [0, 1, 2, 3])
+        self.assertEqual(registry.zone('pricing/donut').attributes, {'Name': 'donut', 'Price': 2.5})
+        self.assertEqual(registry.zone('pricing/2').attributes, {'Name': '', 'Price': 0})
+        self.assertEqual(registry.zone('campus_map').attributes['Name'], '465-0A-00-058')
+        self.assertEqual(len(registry.zone('pricing/donut').polygon), 10)
+        self.assertRaises(KeyError, registry.zone, 'pricing')
+
+    """
+    test_zones_at
+    -------------
+    Tests finding the zones lat/long points are in,
+    with holes, multiple parts, and overlapping zones
+    """
+    def test_zones_at(self):
+        registry = ZoneRegistry(self.shapefiles_dirname)
+        zones_at = lambda point: [zone.name for zone in registry.zones_at(point)]
+        self.assertEqual(zones_at((0.5, 0.5)), ['pricing/donut'])
+        self.assertEqual(zones_at((1.5, 1.5)), [])
+        self.assertEqual(zones_at((2.5, 2.25)), ['pricing/2'])
+        self.assertEqual(zones_at((3.75, 3.75)), ['pricing/donut', 'pricing/islands'])
+        self.assertEqual(zones_at((0.5, 6.5)), ['pricing/islands'])
+        self.assertEqual(zones_at((4.5, 2.25)), ['pricing/2'])
+        self.assertEqual(zones_at((10, 10)), [])
+        self.assertEqual(zones_at((37.272433, -76.716922)), ['campus_map'])
+
+        # vertices and horizontal edges, including of holes, are inside
+        self.assertEqual(zones_at((1, 1)), ['pricing/donut'])
+        self.assertEqual(zones_at((3, 1.5)), ['pricing/donut'])
+        self.assertEqual(zones_at((0, 6.5)), ['pricing/islands'])
+
+    """
+    test_zones_at_many
+    ------------------
+    Tests that zones_at_many() finds the same zones as zones_at(),
+    and that zones classify points like a SteerClearGISClient
+    """
+    def test_zones_at_many(self):
+        registry = ZoneRegistry(self.shapefiles_dirname)
+        rand = np.random.RandomState(0)
+        points = np.column_stack([rand.uniform(-1, 6, 3000), rand.uniform(-1, 8, 3000)])
+        points[:1000] = np.round(points[:1000] * 2) / 2
+        result = registry.zones_at_many(points)
+        self.assertEqual(result.shape, (3000, 4))
+        for point, row in zip(points, result):
+            zones = registry.zones_at(tuple(point))
+            self.assertEqual(row.tolist(), [zone in zones for zone in registry.zones])
+
+        gis_client = SteerClearGISClient(os.path.join(self.shapefiles_dirname, 'campus_map', 'campus_map.shp'))
+        campus = registry.zone('campus_map')
+        self.assertEqual(campus.polygon, gis_client.polygon)
+        points = np.column_stack([rand.uniform(37.26, 37.28, 2000), rand.uniform(-76.73, -76.70, 2000)])
+        self.assertEqual(campus.is_in_polygon_many(points).tolist(), gis_client.is_in_polygon_many(points).tolist())
+        for point in points[:200]:
+            self.assertEqual(campus.is_in_polygon(tuple(point)), gis_client.is_in_polygon(tuple(point)))
+
+    """
+    test_zone_cache
+    ---------------
+    Tests that a ZoneRegistry with a zone cache memory maps
+    its zones from one cache file, which is rebuilt when
+    a shapefile is added
+    """
+    def test_zone_cache(self):
+        registry = ZoneRegistry(self.shapefiles_dirname, self.cache_dirname)
+        self.assertEqual(os.listdir(self.cache_dirname), ['shapefiles.zone.npy'])
+        self.assertIsInstance(registry.index.slab_max_x, np.memmap)
+        self.assertEqual([zone.name for zone in registry.zones_at((0.5, 0.5))], ['pricing/donut'])
+
+        w = shapefile.Writer(shapefile.POLYGON)
+        w.field('Name', 'C', 40)
+        w.poly(parts=[[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]])
+        w.record('excluded')
+        w.save(os.path.join(self.shapefiles_dirname, 'excluded'))
+        registry = ZoneRegistry(self.shapefiles_dirname, self.cache_dirname)
+        self.assertEqual([zone.name for zone in registry.zones_at((0.5, 0.5))], ['excluded', 'pricing/donut'])